@@ -3,14 +3,46 @@ ASGI config for app project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Streaming endpoints and the recipe read endpoints are served natively by
+this callable, every other request is handed to Django.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
 """
 
 import os
+import re
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from recipe.asgi import accepts_json_read, change_feed, \
+    read_endpoint  # noqa: E402
+
+routes = [
+    (re.compile(r'^/api/recipe/changes/$'), None, change_feed),
+]
+
+if settings.ASGI_ASYNC_READS:
+    routes += [
+        (re.compile(r'^/api/recipe/(?P<collection>tags|ingredients)/$'),
+         accepts_json_read, read_endpoint),
+        (re.compile(r'^/api/recipe/(?P<collection>recipes)/$'),
+         accepts_json_read, read_endpoint),
+        (re.compile(r'^/api/recipe/(?P<collection>recipes)/(?P<pk>\d+)/$'),
+         accepts_json_read, read_endpoint),
+    ]
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http':
+        for pattern, accepts, handler in routes:
+            match = pattern.match(scope['path'])
+            if match and (accepts is None or accepts(scope)):
+                await handler(scope, receive, send, **match.groupdict())
+                return
+    await django_application(scope, receive, send)
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/3.0/ref/settings/
 
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -41,10 +43,13 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'core',
     'user',
-    'recipe'
+    'recipe',
+    'job'
 ]
 
 MIDDLEWARE = [
+    'core.middleware.TrafficCaptureMiddleware',
+    'core.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,15 +85,40 @@ WSGI_APPLICATION = 'app.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.backends.postgresql_pool',
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
-        'PASSWORD': os.environ.get('DB_PASS')
+        'PASSWORD': os.environ.get('DB_PASS'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0)),
+        'POOL': {
+            'MIN_SIZE': int(os.environ.get('DB_POOL_MIN_SIZE', 0)),
+            'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+            'MAX_LIFETIME': float(os.environ.get('DB_POOL_MAX_LIFETIME', 1800)),
+            'PRE_PING': os.environ.get('DB_POOL_PRE_PING', '1') == '1',
+        }
     }
 }
 
 
+# Read replicas, copies of the default database on other hosts
+
+REPLICA_DATABASES = []
+for index, host in enumerate(filter(None, os.environ.get(
+        'DB_REPLICA_HOSTS', '').split(','))):
+    alias = f'replica_{index}'
+    DATABASES[alias] = dict(DATABASES['default'], HOST=host.strip(),
+                            TEST={'MIRROR': 'default'})
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.environ.get('DB_REPLICA_PIN_SECONDS', 5))
+REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG', 2))
+REPLICA_LAG_CHECK_INTERVAL = float(
+    os.environ.get('DB_REPLICA_LAG_CHECK_INTERVAL', 5))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -131,4 +161,185 @@ MEDIA_URL = '/media/'
 STATIC_ROOT = '/vol/web/static'
 MEDIA_ROOT = '/vol/web/media'
 
-AUTH_USER_MODEL = 'core.User'
\ No newline at end of file
+AUTH_USER_MODEL = 'core.User'
+
+# Cache shared by every web, ASGI and worker process. Replica pins,
+# idempotency keys and data versions must be seen by all of them, so a
+# per-process cache is not an option. The database cache needs
+# `manage.py createcachetable`, Memcached can be configured instead with
+# CACHE_BACKEND and CACHE_LOCATION. Once MAX_ENTRIES is reached the
+# database cache deletes entries in key order, whatever their age, so keep
+# it well above the number of live keys. Throttle buckets are kept in
+# their own table, see core.throttling.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'django_cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 100000)),
+        },
+    }
+}
+
+# Change feed
+# Recipe, Tag and Ingredient writes are fanned out over LISTEN/NOTIFY
+
+CHANGEFEED_CHANNEL = os.environ.get('CHANGEFEED_CHANNEL', 'recipe_changes')
+CHANGEFEED_QUEUE_SIZE = int(os.environ.get('CHANGEFEED_QUEUE_SIZE', 100))
+CHANGEFEED_HEARTBEAT = int(os.environ.get('CHANGEFEED_HEARTBEAT', 15))
+CHANGEFEED_POLL_TIMEOUT = int(os.environ.get('CHANGEFEED_POLL_TIMEOUT', 25))
+
+
+# ASGI
+# Read endpoints served natively by app.asgi, sharing a bounded number of
+# database worker threads
+
+ASGI_ASYNC_READS = os.environ.get('ASGI_ASYNC_READS', '1') == '1'
+ASGI_DB_CONCURRENCY = int(os.environ.get('ASGI_DB_CONCURRENCY', 10))
+
+
+# Performance instrumentation
+
+PERF_SAMPLE_RATE = float(os.environ.get('PERF_SAMPLE_RATE', 1))
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.perf.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'core.throttling.UserTokenBucketThrottle',
+        'core.throttling.ScopedTokenBucketThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'user': os.environ.get('THROTTLE_USER_RATE', '2000/hour'),
+        'anon': os.environ.get('THROTTLE_ANON_RATE', '200/hour'),
+        'recipes': os.environ.get('THROTTLE_RECIPES_RATE', '600/min'),
+        'recipe_attrs': os.environ.get('THROTTLE_RECIPE_ATTRS_RATE',
+                                       '600/min'),
+        'uploads': os.environ.get('THROTTLE_UPLOADS_RATE', '60/hour'),
+        'token': os.environ.get('THROTTLE_TOKEN_RATE', '20/min'),
+    },
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'core.perf': {
+            'handlers': ['console'],
+            'level': os.environ.get('PERF_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
+
+# Traffic capture, sanitized request records for load test replays
+
+TRAFFIC_CAPTURE_FILE = os.environ.get('TRAFFIC_CAPTURE_FILE')
+
+
+# Recipes
+
+RECIPE_BATCH_MAX_IDS = int(os.environ.get('RECIPE_BATCH_MAX_IDS', 100))
+SHOPPING_LIST_CACHE_TTL = int(os.environ.get('SHOPPING_LIST_CACHE_TTL', 300))
+
+
+# Pagination
+# Counts of paginated lists and admin changelists: exact, capped, estimated
+# or none
+
+PAGINATION_COUNT_MODE = os.environ.get('PAGINATION_COUNT_MODE', 'capped')
+PAGINATION_COUNT_CAP = int(os.environ.get('PAGINATION_COUNT_CAP', 1000))
+ADMIN_COUNT_MODE = os.environ.get('ADMIN_COUNT_MODE', 'estimated')
+ADMIN_COUNT_CAP = int(os.environ.get('ADMIN_COUNT_CAP', 10000))
+
+
+# Background jobs
+# Deferred work is stored in the core.Job table and run by run_jobs workers
+
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 5))
+JOB_RETRY_BASE_DELAY = float(os.environ.get('JOB_RETRY_BASE_DELAY', 5))
+JOB_RETRY_MAX_DELAY = float(os.environ.get('JOB_RETRY_MAX_DELAY', 600))
+JOB_LOCK_TIMEOUT = int(os.environ.get('JOB_LOCK_TIMEOUT', 900))
+JOB_HEARTBEAT_INTERVAL = float(os.environ.get('JOB_HEARTBEAT_INTERVAL', 60))
+JOB_STATUS_TOKEN_MAX_AGE = int(
+    os.environ.get('JOB_STATUS_TOKEN_MAX_AGE', 7 * 86400)
+)
+
+
+# Idempotency keys
+# Responses to POST requests with an Idempotency-Key header are replayed
+# to retries for IDEMPOTENCY_TTL seconds
+
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', 86400))
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT', 60))
+
+
+# Similar recipes
+# MinHash signatures of SIMILARITY_BANDS * SIMILARITY_ROWS hashes, changing
+# the bands, rows or seed requires running index_similarity again
+
+SIMILARITY_BANDS = int(os.environ.get('SIMILARITY_BANDS', 16))
+SIMILARITY_ROWS = int(os.environ.get('SIMILARITY_ROWS', 4))
+SIMILARITY_SEED = int(os.environ.get('SIMILARITY_SEED', 1))
+SIMILARITY_MAX_CANDIDATES = int(
+    os.environ.get('SIMILARITY_MAX_CANDIDATES', 200)
+)
+SIMILARITY_MAX_RESULTS = int(os.environ.get('SIMILARITY_MAX_RESULTS', 50))
+
+
+# Recipe images
+# Uploads get a tiny JPEG placeholder whose longest side is
+# IMAGE_PLACEHOLDER_SIZE pixels. Images other than JPEG of more than
+# IMAGE_INLINE_MAX_PIXELS pixels get it from a job instead of the request,
+# as they are decoded at full size
+
+IMAGE_PLACEHOLDER_SIZE = int(os.environ.get('IMAGE_PLACEHOLDER_SIZE', 16))
+IMAGE_PLACEHOLDER_QUALITY = int(
+    os.environ.get('IMAGE_PLACEHOLDER_QUALITY', 50)
+)
+IMAGE_INLINE_MAX_PIXELS = int(
+    os.environ.get('IMAGE_INLINE_MAX_PIXELS', 4000000)
+)
+
+
+def parse_signing_keys(value):
+    '''Return the (id, secret) pairs of a "id:secret,id:secret" list'''
+    keys = []
+    for entry in value.split(','):
+        key_id, sep, secret = entry.strip().partition(':')
+        if not sep or not key_id or not secret:
+            raise ImproperlyConfigured(
+                'MEDIA_SIGNING_KEYS entries must be formatted as '
+                '"id:secret", separated by commas, got %r. Secrets cannot '
+                'contain commas.' % entry
+            )
+        if key_id in dict(keys):
+            raise ImproperlyConfigured(
+                'MEDIA_SIGNING_KEYS lists the key id %r twice.' % key_id
+            )
+        keys.append((key_id, secret))
+    return keys
+
+
+# Image URLs are signed with the first of MEDIA_SIGNING_KEYS and valid for
+# at least MEDIA_URL_TTL seconds. Older keys stay listed during a rotation,
+# formatted as "id:secret,id:secret". Ids and secrets cannot contain commas
+# and ids cannot contain colons. SECRET_KEY is used when none are set.
+if 'MEDIA_SIGNING_KEYS' in os.environ:
+    MEDIA_SIGNING_KEYS = parse_signing_keys(os.environ['MEDIA_SIGNING_KEYS'])
+else:
+    MEDIA_SIGNING_KEYS = [('default', SECRET_KEY)]
+MEDIA_URL_TTL = int(os.environ.get('MEDIA_URL_TTL', 3600))
+MEDIA_URL_BUCKET = int(os.environ.get('MEDIA_URL_BUCKET', 900))
@@ -3,11 +3,16 @@ from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.translation import gettext_lazy as _
 
 from . import models
+from .pagination import CountModePaginator
 
 
 class UserAdmin(BaseUserAdmin):
+    paginator = CountModePaginator
+    show_full_result_count = False
+    search_fields = ['^email']
     ordering = ['id']
-    list_display = ['email', 'name']
+    list_display = ['email', 'name', 'recipe_count']
+    list_select_related = ['summary']
     fieldsets = (
         (None,
             {'fields': ('email', 'password')}),
@@ -25,8 +30,34 @@ class UserAdmin(BaseUserAdmin):
             }),
     )
 
+    def recipe_count(self, obj):
+        summary = getattr(obj, 'summary', None)
+        return summary.recipe_count if summary else None
+
+
+class CountModeAdmin(admin.ModelAdmin):
+    '''Admin counting changelist rows with ADMIN_COUNT_MODE
+
+    Searches are prefix matches, served by the indexes of migration 0010.
+    '''
+    paginator = CountModePaginator
+    show_full_result_count = False
+    list_select_related = ['user']
+    raw_id_fields = ['user']
+
+
+class RecipeAttrAdmin(CountModeAdmin):
+    list_display = ['name', 'user', 'recipe_count']
+    search_fields = ['^name']
+
+
+class RecipeAdmin(CountModeAdmin):
+    list_display = ['title', 'user', 'time_minutes', 'price']
+    search_fields = ['^title']
+    autocomplete_fields = ['tags', 'ingredients']
+
 
 admin.site.register(models.User, UserAdmin)
-admin.site.register(models.Tag)
-admin.site.register(models.Ingredient)
-admin.site.register(models.Recipe)
+admin.site.register(models.Tag, RecipeAttrAdmin)
+admin.site.register(models.Ingredient, RecipeAttrAdmin)
+admin.site.register(models.Recipe, RecipeAdmin)
@@ -0,0 +1,105 @@
+import functools
+import json
+from urllib.parse import parse_qsl
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from rest_framework.authtoken.models import Token
+
+from core import perf
+
+
+def database_sync_to_async(func):
+    '''Run an ORM function in a worker thread, recycling stale connections
+
+    Calls run concurrently on the thread pool of the event loop, each worker
+    thread holding its own database connection. The queries are recorded in
+    the metrics of the request, when it is instrumented.
+    '''
+    def wrapper(metrics, *args, **kwargs):
+        close_old_connections()
+        try:
+            if metrics is None:
+                return func(*args, **kwargs)
+            with perf.collect(metrics):
+                return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    run = sync_to_async(wrapper, thread_sensitive=False)
+
+    @functools.wraps(func)
+    async def call(*args, **kwargs):
+        return await run(perf.current(), *args, **kwargs)
+
+    return call
+
+
+def get_header(scope, name):
+    '''Return the decoded value of a request header or None'''
+    name = name.lower().encode('latin1')
+    for key, value in scope.get('headers', []):
+        if key == name:
+            return value.decode('latin1')
+    return None
+
+
+def get_query_params(scope):
+    '''Return the query string parameters of the request as a dict'''
+    return dict(parse_qsl(scope.get('query_string', b'').decode('latin1')))
+
+
+@database_sync_to_async
+def _get_token_user(key):
+    try:
+        token = Token.objects.select_related('user').get(key=key)
+    except Token.DoesNotExist:
+        return None
+    return token.user if token.user.is_active else None
+
+
+async def authenticate(scope, query_token=False):
+    '''Resolve the token of the request into an active user or None
+
+    The token is read from the ``Authorization: Token <key>`` header. With
+    query_token the ``token`` query parameter is accepted too, for
+    clients such as ``EventSource`` that can not set headers; it ends up
+    in URLs and access logs, so only streaming endpoints allow it.
+    '''
+    key = None
+    header = get_header(scope, 'authorization')
+    if header:
+        parts = header.split()
+        if len(parts) == 2 and parts[0].lower() == 'token':
+            key = parts[1]
+    if key is None and query_token:
+        key = get_query_params(scope).get('token')
+    if not key:
+        return None
+    return await _get_token_user(key)
+
+
+async def send_json(send, status, data, headers=()):
+    '''Send a complete JSON response'''
+    await send_body(send, status, json.dumps(data).encode('utf-8'), headers)
+
+
+async def send_body(send, status, body, headers=()):
+    '''Send a complete response with an already rendered JSON body'''
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode('latin1')),
+        ] + list(headers)
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def wait_for_disconnect(receive):
+    '''Consume request messages until the client goes away'''
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
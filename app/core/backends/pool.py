@@ -0,0 +1,162 @@
+import threading
+import time
+from collections import deque
+
+from django.db.utils import OperationalError
+
+
+class PoolTimeout(OperationalError):
+    '''No connection became available within the pool timeout'''
+
+
+class ConnectionPool:
+    '''Thread safe pool of database connections
+
+    ``connect`` opens a new connection, ``ping`` checks an idle connection
+    before it is handed out and ``reset`` prepares a returned connection
+    for reuse. Connections older than ``max_lifetime`` seconds are closed
+    instead of being reused.
+    '''
+
+    def __init__(self, connect, min_size=0, max_size=10, timeout=30,
+                 max_lifetime=None, ping=None, reset=None):
+        self._connect = connect
+        self._ping = ping
+        self._reset = reset
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._born = {}
+        self._size = 0
+        self._stats = {
+            'connections_opened': 0,
+            'connections_discarded': 0,
+            'checkouts': 0,
+            'waits': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+            'timeouts': 0,
+        }
+
+        for _ in range(min_size):
+            with self._cond:
+                self._size += 1
+            self._idle.append(self._open())
+
+    def _open(self):
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._born[id(conn)] = time.monotonic()
+            self._stats['connections_opened'] += 1
+        return conn
+
+    def _expired(self, conn):
+        if self.max_lifetime is None:
+            return False
+        born = self._born.get(id(conn), 0)
+        return time.monotonic() - born > self.max_lifetime
+
+    def _discard(self, conn):
+        '''Close a connection and free its slot in the pool'''
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._born.pop(id(conn), None)
+            self._size -= 1
+            self._stats['connections_discarded'] += 1
+            self._cond.notify()
+
+    def getconn(self):
+        '''Check out a healthy connection, waiting for a free slot'''
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        while True:
+            conn = None
+            with self._cond:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(
+                            'No database connection available within '
+                            '%s seconds' % self.timeout
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+                if self._idle:
+                    conn = self._idle.pop()
+                else:
+                    self._size += 1
+
+            if conn is None:
+                conn = self._open()
+            elif self._expired(conn) or not self._healthy(conn):
+                self._discard(conn)
+                continue
+
+            with self._cond:
+                self._stats['checkouts'] += 1
+                if waited:
+                    elapsed = time.monotonic() - start
+                    self._stats['waits'] += 1
+                    self._stats['wait_seconds_total'] += elapsed
+                    self._stats['wait_seconds_max'] = max(
+                        self._stats['wait_seconds_max'], elapsed
+                    )
+            return conn
+
+    def _healthy(self, conn):
+        if self._ping is None:
+            return True
+        try:
+            self._ping(conn)
+        except Exception:
+            return False
+        return True
+
+    def putconn(self, conn, discard=False):
+        '''Return a connection to the pool'''
+        if not discard and not self._expired(conn):
+            try:
+                if self._reset is not None:
+                    self._reset(conn)
+            except Exception:
+                discard = True
+        else:
+            discard = True
+
+        if discard:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def closeall(self):
+        '''Close every idle connection'''
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+        for conn in idle:
+            self._discard(conn)
+
+    def stats(self):
+        '''Return the sizing and wait time metrics of the pool'''
+        with self._cond:
+            stats = dict(self._stats)
+            stats['size'] = self._size
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._size - len(self._idle)
+        return stats
@@ -0,0 +1,91 @@
+import threading
+
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from core.backends.pool import ConnectionPool
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pools():
+    '''Return (alias, pool) pairs for the connection pools of this process'''
+    with _pools_lock:
+        return [(key[0], pool) for key, pool in _pools.items()]
+
+
+def _ping(conn):
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    # Outside autocommit the ping opened a transaction, and Django can not
+    # change the autocommit mode of a connection inside one
+    if not conn.autocommit:
+        conn.rollback()
+
+
+def _reset(conn):
+    if conn.closed:
+        raise base.Database.InterfaceError('connection already closed')
+    status = conn.get_transaction_status()
+    if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        raise base.Database.InterfaceError('connection is broken')
+    if status != extensions.TRANSACTION_STATUS_IDLE:
+        conn.rollback()
+    if not conn.autocommit:
+        conn.autocommit = True
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    '''PostgreSQL backend that borrows its connections from a pool
+
+    The pool is configured by the ``POOL`` dictionary of the database
+    settings, with the keys ``MIN_SIZE``, ``MAX_SIZE``, ``TIMEOUT``,
+    ``MAX_LIFETIME`` and ``PRE_PING``. A ``MAX_SIZE`` of 0 disables pooling.
+    Closing the connection at the end of a request, or when ``CONN_MAX_AGE``
+    expires, hands it back to the pool.
+    '''
+
+    pool = None
+
+    def _get_pool(self, conn_params):
+        options = self.settings_dict.get('POOL') or {}
+        if not options.get('MAX_SIZE'):
+            return None
+        # The parameters are part of the key so that a renamed database,
+        # such as the test database, never reuses connections of another
+        key = (self.alias, tuple(sorted(conn_params.items())))
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(
+                    connect=lambda: base.Database.connect(**conn_params),
+                    min_size=options.get('MIN_SIZE', 0),
+                    max_size=options['MAX_SIZE'],
+                    timeout=options.get('TIMEOUT', 30),
+                    max_lifetime=options.get('MAX_LIFETIME'),
+                    ping=_ping if options.get('PRE_PING', True) else None,
+                    reset=_reset
+                )
+        return pool
+
+    @base.async_unsafe
+    def get_new_connection(self, conn_params):
+        self.pool = self._get_pool(conn_params)
+        if self.pool is None:
+            return super().get_new_connection(conn_params)
+
+        connection = self.pool.getconn()
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get(
+            'isolation_level', connection.isolation_level
+        )
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is None or self.pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            self.pool.putconn(self.connection)
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+# NOTIFY payloads must be shorter than 8000 bytes
+MAX_PAYLOAD = 7900
+
+
+def publish(user_id, model, pk, op):
+    '''Publish a change notification for the objects of a user'''
+    _send(json.dumps({
+        'user': user_id,
+        'model': model,
+        'id': pk,
+        'op': op
+    }))
+
+
+def publish_batch(user_id, model, pks, op):
+    '''Publish a single notification for many objects of a user
+
+    Subscribers get one event listing the ``ids``, or a resync when the
+    list does not fit in a notification.
+    '''
+    payload = json.dumps({
+        'user': user_id,
+        'model': model,
+        'ids': list(pks),
+        'op': op
+    })
+    if len(payload.encode('utf-8')) > MAX_PAYLOAD:
+        payload = json.dumps({'user': user_id, 'op': 'resync'})
+    _send(payload)
+
+
+def _send(payload):
+    connection = connections['default']
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_notify(%s, %s)',
+                [settings.CHANGEFEED_CHANNEL, payload]
+            )
+    else:
+        # Without LISTEN/NOTIFY only subscribers in this process are reached
+        broker.dispatch(payload)
+
+
+class Subscription:
+    '''Bounded queue of change events for a single feed connection'''
+
+    def __init__(self, user_id, loop, maxsize):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def put(self, event):
+        '''Queue an event, collapsing the backlog into a resync on overflow'''
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            event = {'user': self.user_id, 'op': 'resync'}
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout):
+        '''Wait for the next event, returning None on timeout'''
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def drain(self):
+        '''Return all the events queued so far'''
+        events = []
+        while not self.queue.empty():
+            events.append(self.queue.get_nowait())
+        return events
+
+
+class ChangeFeedBroker:
+    '''Fan out change notifications to the feed connections of a process'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._listener = None
+
+    def subscribe(self, user_id, loop):
+        '''Register a feed connection for the given user'''
+        subscription = Subscription(
+            user_id, loop, settings.CHANGEFEED_QUEUE_SIZE
+        )
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        self._ensure_listener()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        '''Remove a feed connection'''
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscribers[subscription.user_id]
+
+    def dispatch(self, payload):
+        '''Deliver a notification payload to the subscribers of its user'''
+        try:
+            event = json.loads(payload)
+            user_id = event['user']
+        except (ValueError, KeyError, TypeError):
+            logger.warning('Ignoring malformed change payload %r', payload)
+            return
+        with self._lock:
+            subscriptions = list(self._subscribers.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(subscription.put, event)
+
+    def _ensure_listener(self):
+        '''Start the LISTEN thread of this process if it is not running'''
+        if connections['default'].vendor != 'postgresql':
+            return
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(
+                target=self._listen,
+                name='changefeed-listener',
+                daemon=True
+            )
+            self._listener.start()
+
+    def _listen(self):
+        '''Relay notifications from a single LISTEN connection, forever'''
+        import psycopg2
+
+        params = connections['default'].get_connection_params()
+        delay = 1
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(**params)
+                conn.set_session(autocommit=True)
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        'LISTEN "%s"' % settings.CHANGEFEED_CHANNEL
+                    )
+                delay = 1
+                while True:
+                    ready, _, _ = select.select([conn], [], [], 5)
+                    if not ready:
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self.dispatch(conn.notifies.pop(0).payload)
+            except psycopg2.Error:
+                logger.exception('Change feed listener lost its connection')
+                if conn is not None:
+                    conn.close()
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+
+
+broker = ChangeFeedBroker()
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+# Backends that keep their data in the process that wrote it
+PROCESS_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def shared_cache_check(app_configs, **kwargs):
+    '''Warn when the default cache is not shared between processes
+
+    Replica pins, idempotency keys and data versions only hold across
+    workers when every process sees the same cache.
+    '''
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend in PROCESS_CACHES:
+        return [Warning(
+            'The default cache is not shared between processes.',
+            hint='Use the database cache or Memcached, see CACHES.',
+            id='core.W001',
+        )]
+    return []
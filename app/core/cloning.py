@@ -0,0 +1,92 @@
+from functools import partial
+
+from django.db import connection, transaction
+
+from core import changefeed, counters, images, similarity
+from core.dataversion import bump_data_version
+from core.models import Recipe
+
+COPIED_FIELDS = ('time_minutes', 'price', 'link', 'image') + \
+    images.METADATA_FIELDS
+
+
+def _insert_copy(cursor, recipe_id, user_id, title):
+    '''Copy a recipe row with INSERT ... SELECT and return the new id'''
+    qn = connection.ops.quote_name
+    opts = Recipe._meta
+    columns = [opts.get_field(name).column for name in COPIED_FIELDS]
+    title_column = qn(opts.get_field('title').column)
+    user_column = qn(opts.get_field('user').column)
+    sql = (
+        'INSERT INTO {table} ({user}, {title}, {columns}) '
+        'SELECT {user}, COALESCE(%s, {title}), {columns} FROM {table} '
+        'WHERE {pk} = %s AND {user} = %s'
+    ).format(
+        table=qn(opts.db_table),
+        user=user_column,
+        title=title_column,
+        columns=', '.join(qn(column) for column in columns),
+        pk=qn(opts.pk.column),
+    )
+    params = [title, recipe_id, user_id]
+    if connection.features.can_return_columns_from_insert:
+        cursor.execute(sql + ' RETURNING ' + qn(opts.pk.column), params)
+        row = cursor.fetchone()
+        return row[0] if row else None
+    cursor.execute(sql, params)
+    return cursor.lastrowid if cursor.rowcount else None
+
+
+def _copy_links(cursor, through, mapping):
+    '''Copy the M2M rows of the recipes in mapping in one statement'''
+    qn = connection.ops.quote_name
+    opts = through._meta
+    recipe_column = qn(opts.get_field('recipe').column)
+    other = [f for f in opts.fields if f.is_relation
+             and f.name != 'recipe'][0]
+    cases = ' '.join(['WHEN %s THEN %s'] * len(mapping))
+    sql = (
+        'INSERT INTO {table} ({recipe}, {other}) '
+        'SELECT CASE {recipe} {cases} END, {other} FROM {table} '
+        'WHERE {recipe} IN ({ids})'
+    ).format(
+        table=qn(opts.db_table),
+        recipe=recipe_column,
+        other=qn(other.column),
+        cases=cases,
+        ids=', '.join(['%s'] * len(mapping)),
+    )
+    params = [value for pair in mapping.items() for value in pair]
+    cursor.execute(sql, params + list(mapping))
+
+
+def clone_recipes(user, recipe_ids, title=None):
+    '''Copy recipes of a user with their tags and ingredients
+
+    Rows are copied inside the database with INSERT ... SELECT, without
+    loading the recipes. Copies share the image file of their original.
+    Recipes that do not belong to the user are skipped. Returns a dict
+    mapping original recipe ids to the ids of their copies.
+    '''
+    mapping = {}
+    with transaction.atomic(), connection.cursor() as cursor:
+        for recipe_id in recipe_ids:
+            new_id = _insert_copy(cursor, recipe_id, user.pk, title)
+            if new_id is not None:
+                mapping[recipe_id] = new_id
+        if mapping:
+            _copy_links(cursor, Recipe.tags.through, mapping)
+            _copy_links(cursor, Recipe.ingredients.through, mapping)
+            similarity.update_recipes(mapping.values())
+            for model in counters.RELATIONS:
+                counters.adjust_recipe_counts(
+                    model, counters.linked(model, mapping.values())
+                )
+            counters.adjust_summary(user.pk, Recipe, len(mapping))
+        if mapping:
+            transaction.on_commit(partial(bump_data_version, user.pk))
+        for new_id in mapping.values():
+            transaction.on_commit(partial(
+                changefeed.publish, user.pk, 'recipe', new_id, 'created'
+            ))
+    return mapping
@@ -0,0 +1,110 @@
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, \
+    Value
+from django.db.models.functions import Coalesce, Greatest
+
+from core.models import Tag, Ingredient, Recipe, UserSummary
+
+RELATIONS = {
+    Tag: (Recipe.tags.through, 'tag_id'),
+    Ingredient: (Recipe.ingredients.through, 'ingredient_id'),
+}
+
+SUMMARY_FIELDS = {
+    Recipe: 'recipe_count',
+    Tag: 'tag_count',
+    Ingredient: 'ingredient_count',
+}
+
+
+def _shift(field, delta):
+    '''Return an expression adding delta to a counter, never below 0'''
+    if delta >= 0:
+        return F(field) + delta
+    return Greatest(F(field) + delta, Value(0))
+
+
+def adjust_recipe_counts(model, deltas):
+    '''Add to the recipe_count of tags or ingredients
+
+    deltas maps ids to the number of recipes gained, or lost when
+    negative. The counters are changed in place with one UPDATE per
+    distinct delta, so concurrent writers never overwrite each other.
+    '''
+    by_delta = defaultdict(list)
+    for pk, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(pk)
+    for delta, ids in by_delta.items():
+        model.objects.filter(pk__in=ids).update(
+            recipe_count=_shift('recipe_count', delta)
+        )
+
+
+def linked(model, recipe_ids=None, ids=None):
+    '''Return a Counter of the links of tags or ingredients to recipes
+
+    The links are those of the given recipes, of the given tags or
+    ingredients, or both.
+    '''
+    through, field = RELATIONS[model]
+    links = through.objects.all()
+    if recipe_ids is not None:
+        links = links.filter(recipe_id__in=list(recipe_ids))
+    if ids is not None:
+        links = links.filter(**{f'{field}__in': list(ids)})
+    return Counter(links.values_list(field, flat=True))
+
+
+def adjust_summary(user_id, model, delta):
+    '''Add to the count of recipes, tags or ingredients of a user'''
+    field = SUMMARY_FIELDS[model]
+    if delta:
+        UserSummary.objects.filter(user_id=user_id).update(
+            **{field: _shift(field, delta)}
+        )
+
+
+def _count(queryset, field):
+    '''Return a subquery counting the rows of queryset per outer pk'''
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by()
+        .values(field).annotate(count=Count('*')).values('count'),
+        output_field=IntegerField()
+    ), Value(0))
+
+
+def refresh_recipe_counts(model, ids):
+    '''Recompute the recipe_count of tags or ingredients from scratch
+
+    This scans the links of every object, it repairs drift and fills the
+    counters of bulk inserted data, writes use adjust_recipe_counts.
+    '''
+    ids = list(set(ids))
+    if ids:
+        through, field = RELATIONS[model]
+        model.objects.filter(pk__in=ids).update(
+            recipe_count=_count(through.objects.all(), field)
+        )
+
+
+def refresh_summaries(user_ids, create=False):
+    '''Recompute the summary rows of users from scratch
+
+    Missing rows are only created with create=True, so a refresh never
+    recreates the row of a user being deleted.
+    '''
+    user_ids = list(set(user_ids))
+    if not user_ids:
+        return
+    if create:
+        UserSummary.objects.bulk_create(
+            [UserSummary(user_id=user_id) for user_id in user_ids],
+            ignore_conflicts=True
+        )
+    UserSummary.objects.filter(user_id__in=user_ids).update(
+        recipe_count=_count(Recipe.objects.all(), 'user_id'),
+        tag_count=_count(Tag.objects.all(), 'user_id'),
+        ingredient_count=_count(Ingredient.objects.all(), 'user_id'),
+    )
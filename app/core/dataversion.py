@@ -0,0 +1,27 @@
+import uuid
+
+from django.core.cache import cache
+
+
+def _key(user_id):
+    return f'data-version:{user_id}'
+
+
+def data_version(user_id):
+    '''Return a token that changes whenever the data of a user changes
+
+    Cached results derived from the data of a user include the token in
+    their key, so bumping it invalidates all of them at once.
+    '''
+    version = cache.get(_key(user_id))
+    if version is None:
+        # A random start keeps entries of an evicted version unreachable
+        version = uuid.uuid4().hex
+        if not cache.add(_key(user_id), version, None):
+            version = cache.get(_key(user_id), version)
+    return version
+
+
+def bump_data_version(user_id):
+    '''Invalidate the cached results derived from the data of a user'''
+    cache.set(_key(user_id), uuid.uuid4().hex, None)
@@ -0,0 +1,149 @@
+import logging
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from core import changefeed, counters, jobs
+from core.dataversion import bump_data_version
+from core.models import Tag, Ingredient, Recipe, RecipeBucket, \
+    RecipeSignature
+
+logger = logging.getLogger(__name__)
+
+RecipeTag = Recipe.tags.through
+RecipeIngredient = Recipe.ingredients.through
+
+
+def _raw_delete(queryset, using=DEFAULT_DB_ALIAS):
+    '''Delete the rows of a queryset with a single DELETE statement
+
+    Unlike QuerySet.delete() the rows are not loaded, so no cascades or
+    signals run. Callers delete the dependent rows themselves. Only the
+    models with signals need this, the dependent rows of models without
+    any are deleted by QuerySet.delete() in one statement as well.
+    '''
+    return queryset._raw_delete(using)
+
+
+def delete_files(names):
+    '''Delete files from the media storage, logging failures'''
+    for name in names:
+        try:
+            default_storage.delete(name)
+        except OSError:
+            logger.exception('Could not delete %s', name)
+
+
+def unreferenced_files(names):
+    '''Return the names that no recipe uses as its image anymore
+
+    Cloned recipes share the image file of their original, so a file can
+    only go once the last recipe referencing it is deleted.
+    '''
+    referenced = set(Recipe.objects.filter(image__in=names)
+                     .values_list('image', flat=True))
+    return [name for name in names if name not in referenced]
+
+
+def delete_files_later(names):
+    '''Queue a job deleting the files once nothing references them
+
+    The job is part of the current transaction, so it only runs if the
+    rows referencing the files are gone for good.
+    '''
+    names = list(dict.fromkeys(name for name in names if name))
+    if names:
+        jobs.enqueue('delete_files', {'names': names})
+
+
+def delete_recipe_attr(instance):
+    '''Delete a tag or ingredient without loading the recipes using it
+
+    A popular tag can be used by many recipes, so their similarity index
+    is recomputed by a job and the change feed gets one notification.
+    '''
+    through, field = counters.RELATIONS[type(instance)]
+    links = through.objects.filter(**{field: instance.pk})
+    with transaction.atomic():
+        recipe_ids = list(links.values_list('recipe_id', flat=True))
+        links.delete()
+        instance.delete()
+        if recipe_ids:
+            jobs.enqueue('update_similarity', {'recipe_ids': recipe_ids})
+            transaction.on_commit(partial(
+                changefeed.publish_batch, instance.user_id, 'recipe',
+                recipe_ids, 'updated'
+            ))
+
+
+def _delete_in_batches(model, through_links, user_id, batch_size,
+                       collect=None):
+    '''Delete the objects of a user and their M2M rows, batch by batch
+
+    Every batch runs in its own transaction, so locks are held briefly.
+    Returns the number of deleted objects.
+    '''
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            batch = list(model.objects.filter(user_id=user_id)
+                         .order_by('pk')
+                         .values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                return deleted
+            if collect is not None:
+                collect(batch)
+            for through, field in through_links:
+                through.objects.filter(**{field: batch}).delete()
+            _raw_delete(model.objects.filter(pk__in=batch))
+        deleted += len(batch)
+
+
+def purge_user(user, batch_size=1000):
+    '''Delete a user and everything it owns with set based statements
+
+    Recipes, tags and ingredients are deleted in batches of batch_size
+    with their M2M rows, without going through the collector of Django.
+    The recipe_count of the tags and ingredients linked to the deleted
+    recipes is decremented, as no m2m_changed signal runs. Image files are
+    deleted afterwards by a background job.
+    '''
+    images = []
+
+    def collect_recipes(recipe_ids):
+        images.extend(
+            Recipe.objects.filter(pk__in=recipe_ids)
+            .exclude(image='').values_list('image', flat=True)
+        )
+        for model in (Tag, Ingredient):
+            counters.adjust_recipe_counts(model, {
+                pk: -count for pk, count in
+                counters.linked(model, recipe_ids=recipe_ids).items()
+            })
+
+    counts = {
+        'recipes': _delete_in_batches(
+            Recipe,
+            [(RecipeTag, 'recipe_id__in'),
+             (RecipeIngredient, 'recipe_id__in'),
+             (RecipeBucket, 'recipe_id__in'),
+             (RecipeSignature, 'recipe_id__in')],
+            user.pk, batch_size, collect_recipes
+        ),
+        'tags': _delete_in_batches(
+            Tag, [(RecipeTag, 'tag_id__in')], user.pk, batch_size
+        ),
+        'ingredients': _delete_in_batches(
+            Ingredient, [(RecipeIngredient, 'ingredient_id__in')],
+            user.pk, batch_size
+        ),
+    }
+    with transaction.atomic():
+        # Only the rows without dedicated handling are left to cascade
+        get_user_model().objects.filter(pk=user.pk).delete()
+        delete_files_later(images)
+        # The raw deletes bypass the signals that bump the version
+        transaction.on_commit(partial(bump_data_version, user.pk))
+    return counts
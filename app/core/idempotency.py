@@ -0,0 +1,163 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import UploadedFile
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+STORED_HEADERS = ('Location',)
+
+
+class IdempotencyConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'A request with this Idempotency-Key is in progress.'
+    default_code = 'idempotency_conflict'
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'This Idempotency-Key was used for another request.'
+    default_code = 'idempotency_key_reused'
+
+
+class Replay(Exception):
+    '''Raised to answer a request with a stored response'''
+
+    def __init__(self, response):
+        self.response = response
+
+
+def fingerprint(request):
+    '''Return a digest of the method, path and parsed body of a request'''
+    digest = hashlib.sha256(
+        f'{request.method} {request.path}\n'.encode()
+    )
+    digest.update(json.dumps(_canonical(request.data), sort_keys=True,
+                             default=str).encode())
+    return digest.hexdigest()
+
+
+def _canonical(data):
+    '''Return a JSON serializable form of a parsed body of any type'''
+    if hasattr(data, 'lists'):
+        return {name: _canonical(values) for name, values in data.lists()}
+    if isinstance(data, dict):
+        return {name: _canonical(value) for name, value in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [_canonical(item) for item in data]
+    if isinstance(data, UploadedFile):
+        return _file_digest(data)
+    return data
+
+
+def _file_digest(upload):
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    upload.seek(0)
+    return digest.hexdigest()
+
+
+class IdempotencyStore:
+    '''Responses of requests with an Idempotency-Key, kept in the shared cache
+
+    A request takes a lock in the cache before running, so concurrent
+    duplicates are rejected instead of executed twice. Completed
+    responses are kept for IDEMPOTENCY_TTL seconds.
+    '''
+
+    def _key(self, scope, key):
+        digest = hashlib.sha256(f'{scope}:{key}'.encode()).hexdigest()
+        return f'idempotency:{digest}'
+
+    def _check(self, record, digest):
+        if record['fingerprint'] != digest:
+            raise IdempotencyKeyReused()
+        response = Response(record['data'], status=record['status'],
+                            headers=record['headers'])
+        response[REPLAYED_HEADER] = 'true'
+        raise Replay(response)
+
+    def begin(self, scope, key, digest):
+        '''Lock the key for a new request, or raise Replay for a known one'''
+        record_key = self._key(scope, key)
+        record = cache.get(record_key)
+        if record is not None:
+            self._check(record, digest)
+        if not cache.add(f'{record_key}:lock', digest,
+                         settings.IDEMPOTENCY_LOCK_TIMEOUT):
+            raise IdempotencyConflict()
+        # The response may have been stored between the get and the add
+        record = cache.get(record_key)
+        if record is not None:
+            cache.delete(f'{record_key}:lock')
+            self._check(record, digest)
+        return record_key
+
+    def finish(self, record_key, digest, response):
+        '''Store the response of a request and release its lock
+
+        Only successful responses are stored. A client error stored under
+        the key would be replayed forever, leaving no way to retry with a
+        corrected request, and server errors are worth retrying as is.
+        '''
+        try:
+            if status.is_success(response.status_code):
+                cache.set(record_key, {
+                    'fingerprint': digest,
+                    'status': response.status_code,
+                    'data': response.data,
+                    'headers': {name: response[name]
+                                for name in STORED_HEADERS
+                                if response.has_header(name)},
+                }, settings.IDEMPOTENCY_TTL)
+        finally:
+            cache.delete(f'{record_key}:lock')
+
+
+store = IdempotencyStore()
+
+
+class IdempotencyMixin:
+    '''Execute POST requests with the same Idempotency-Key only once
+
+    Retries of a completed request get the stored response back, retries
+    of a request still running get a 409 and reusing a key for another
+    request gets a 422. Keys are scoped to the user.
+    '''
+    idempotent_methods = ('POST',)
+    _idempotency = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        key = request.headers.get(HEADER)
+        if not key or request.method not in self.idempotent_methods:
+            return
+        if len(key) > 255:
+            raise ValidationError(
+                {HEADER: ['Ensure this value has at most 255 characters.']}
+            )
+        scope = request.user.pk if request.user.is_authenticated \
+            else 'anon'
+        digest = fingerprint(request)
+        self._idempotency = (store.begin(scope, key, digest), digest)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, Replay):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if self._idempotency is not None:
+            record_key, digest = self._idempotency
+            self._idempotency = None
+            store.finish(record_key, digest, response)
+        return response
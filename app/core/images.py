@@ -0,0 +1,70 @@
+import base64
+from io import BytesIO
+
+from django.conf import settings
+from PIL import Image, ImageOps
+
+# Fields of Recipe filled from its image, see metadata()
+METADATA_FIELDS = ('image_width', 'image_height', 'image_size',
+                   'image_color', 'image_placeholder')
+
+EXIF_ORIENTATION = 0x0112
+# EXIF orientations that rotate the image by a quarter turn
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def dominant_color(image):
+    '''Return the most common color of an RGB image as #rrggbb'''
+    sample = image.copy()
+    sample.thumbnail((64, 64))
+    quantized = sample.quantize(colors=8)
+    count, index = max(quantized.getcolors())
+    palette = quantized.getpalette()[index * 3:index * 3 + 3]
+    return '#%02x%02x%02x' % tuple(palette)
+
+
+def placeholder(image):
+    '''Return a tiny JPEG of an RGB image as a base64 data URI'''
+    size = settings.IMAGE_PLACEHOLDER_SIZE
+    thumbnail = image.copy()
+    thumbnail.thumbnail((size, size))
+    buffer = BytesIO()
+    thumbnail.save(buffer, format='JPEG',
+                   quality=settings.IMAGE_PLACEHOLDER_QUALITY, optimize=True)
+    return 'data:image/jpeg;base64,' + \
+        base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def metadata(file, max_pixels=None):
+    '''Return the values of METADATA_FIELDS for an image file
+
+    The file is decoded once, at a reduced size where the format allows
+    it, and turned upright following its EXIF orientation. Only JPEG can be
+    decoded at a reduced size: other images of more than max_pixels pixels
+    get their dimensions only, image_color and image_placeholder are left
+    empty for the image_metadata job. A missing file clears the values.
+    '''
+    if not file:
+        return {'image_width': None, 'image_height': None,
+                'image_size': None, 'image_color': '',
+                'image_placeholder': ''}
+    file.seek(0)
+    with Image.open(file) as image:
+        width, height = image.size
+        if image.getexif().get(EXIF_ORIENTATION) \
+                in TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+        if max_pixels is not None and image.format != 'JPEG' \
+                and width * height > max_pixels:
+            rgb = None
+        else:
+            image.draft('RGB', (256, 256))
+            rgb = ImageOps.exif_transpose(image).convert('RGB')
+    file.seek(0)
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_size': file.size,
+        'image_color': dominant_color(rgb) if rgb else '',
+        'image_placeholder': placeholder(rgb) if rgb else '',
+    }
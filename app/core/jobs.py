@@ -0,0 +1,207 @@
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.models import Job
+
+logger = logging.getLogger(__name__)
+
+STATUS_TOKEN_SALT = 'core.jobs.status'
+
+_handlers = {}
+
+
+def register(name):
+    '''Register a function as the handler of the jobs with the given name
+
+    Handlers receive the decoded payload and return a JSON serializable
+    result. They may run more than once for the same job, after a crash
+    or a retry, so they must be idempotent.
+    '''
+    def decorator(func):
+        _handlers[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, user=None, idempotency_key=None,
+            max_attempts=None, delay=0):
+    '''Queue a job, or return the job already queued for idempotency_key'''
+    if name not in _handlers:
+        raise ValueError(f'Unknown job {name}')
+    if idempotency_key is not None:
+        job = Job.objects.filter(idempotency_key=idempotency_key).first()
+        if job is not None:
+            return job
+    try:
+        with transaction.atomic():
+            return Job.objects.create(
+                name=name,
+                payload=json.dumps(payload or {}, cls=DjangoJSONEncoder),
+                user=user,
+                idempotency_key=idempotency_key,
+                max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+                run_at=timezone.now() + timedelta(seconds=delay),
+            )
+    except IntegrityError:
+        if idempotency_key is None:
+            raise
+        return Job.objects.get(idempotency_key=idempotency_key)
+
+
+def worker_name():
+    '''Return an identifier for the worker running in this process'''
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def retry_delay(attempts):
+    '''Return the seconds to wait before retrying a failed attempt'''
+    return min(
+        settings.JOB_RETRY_MAX_DELAY,
+        settings.JOB_RETRY_BASE_DELAY * 2 ** (attempts - 1)
+    ) * random.uniform(0.5, 1)  # nosec
+
+
+def claim(worker):
+    '''Lock the next due job for a worker, returning None when idle
+
+    Running jobs refresh their lock every JOB_HEARTBEAT_INTERVAL seconds.
+    Jobs whose lock is older than JOB_LOCK_TIMEOUT belong to a worker that
+    died; they are queued again, or failed once they used up their
+    attempts. Claims are conditional updates, so concurrent workers never
+    run the same job.
+    '''
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=Job.RUNNING,
+        locked_at__lt=now - timedelta(seconds=settings.JOB_LOCK_TIMEOUT)
+    )
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, locked_at=None, locked_by='', updated_at=now,
+        error='The worker running the job stopped responding'
+    )
+    stale.update(status=Job.QUEUED, locked_at=None, locked_by='',
+                 updated_at=now)
+    due = Job.objects.filter(status=Job.QUEUED, run_at__lte=now) \
+        .order_by('run_at', 'pk').values_list('pk', flat=True)[:10]
+    for pk in due:
+        claimed = Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+            status=Job.RUNNING,
+            locked_at=now,
+            locked_by=worker,
+            attempts=F('attempts') + 1,
+            updated_at=now,
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def heartbeat(job):
+    '''Refresh the lock of a running job so no other worker reclaims it'''
+    return Job.objects.filter(
+        pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by
+    ).update(locked_at=timezone.now())
+
+
+class Heartbeat(threading.Thread):
+    '''Call heartbeat() for a job at an interval until stopped'''
+
+    def __init__(self, job, interval):
+        super().__init__(name=f'job-heartbeat-{job.pk}', daemon=True)
+        self.job = job
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                try:
+                    heartbeat(self.job)
+                except Exception:
+                    logger.exception('Heartbeat of job %s failed', self.job)
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run(job):
+    '''Run a claimed job and record its outcome
+
+    Failed attempts are retried with exponential backoff until
+    max_attempts is reached.
+    '''
+    handler = _handlers.get(job.name)
+    beat = Heartbeat(job, settings.JOB_HEARTBEAT_INTERVAL)
+    beat.start()
+    try:
+        if handler is None:
+            raise LookupError(f'No handler for job {job.name}')
+        result = handler(json.loads(job.payload))
+    except Exception:
+        logger.exception('Job %s failed on attempt %d', job, job.attempts)
+        fields = {'status': Job.FAILED, 'error': traceback.format_exc()}
+        if handler is not None and job.attempts < job.max_attempts:
+            fields.update(status=Job.QUEUED, run_at=timezone.now()
+                          + timedelta(seconds=retry_delay(job.attempts)))
+    else:
+        fields = {
+            'status': Job.SUCCEEDED,
+            'result': json.dumps(result, cls=DjangoJSONEncoder),
+            'error': '',
+        }
+    finally:
+        beat.stop()
+    Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+        locked_at=None, locked_by='', updated_at=timezone.now(), **fields
+    )
+    for name, value in fields.items():
+        setattr(job, name, value)
+    return job
+
+
+def run_pending(worker=None, limit=None):
+    '''Run due jobs until the queue is empty, returning how many ran'''
+    worker = worker or worker_name()
+    count = 0
+    while limit is None or count < limit:
+        job = claim(worker)
+        if job is None:
+            break
+        run(job)
+        count += 1
+    return count
+
+
+def status_token(job):
+    '''Return a signed token granting read access to the status of a job
+
+    The token outlives the session of the user, so the status of a job
+    purging the user stays readable.
+    '''
+    return signing.dumps(job.pk, salt=STATUS_TOKEN_SALT)
+
+
+def job_for_token(token):
+    '''Return the job of a status token, raising Job.DoesNotExist'''
+    try:
+        pk = signing.loads(token, salt=STATUS_TOKEN_SALT,
+                           max_age=settings.JOB_STATUS_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        raise Job.DoesNotExist('Invalid job status token')
+    return Job.objects.get(pk=pk)
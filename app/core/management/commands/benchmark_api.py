@@ -0,0 +1,325 @@
+import json
+import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import jobs
+from core.models import Tag, Ingredient, Recipe, Job
+from core.perf import percentile
+
+QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+PREFIX = 'bench-'
+
+
+def sample_image():
+    '''Return the bytes of a small JPEG image'''
+    buffer = BytesIO()
+    Image.new('RGB', (20, 20)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+class InProcessClient:
+    '''Drive the API through the Django test client'''
+
+    def __init__(self, token):
+        self.client = APIClient()
+        self.token = token
+
+    def request(self, method, path, data=None, image=False, token=None):
+        kwargs = {}
+        if image:
+            upload = BytesIO(data.pop('image'))
+            upload.name = 'bench.jpg'
+            kwargs = {'data': dict(data, image=upload),
+                      'format': 'multipart'}
+        elif data is not None:
+            kwargs = {'data': data, 'format': 'json'}
+        kwargs['HTTP_AUTHORIZATION'] = f'Token {token or self.token}'
+        start = time.perf_counter()
+        res = getattr(self.client, method.lower())(path, **kwargs)
+        elapsed = time.perf_counter() - start
+        return res.status_code, res.get('Server-Timing', ''), elapsed
+
+
+class LiveClient:
+    '''Drive the API of a running server over HTTP'''
+
+    def __init__(self, base_url, token):
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+
+    def _multipart(self, data):
+        boundary = uuid.uuid4().hex
+        parts = []
+        for name, value in data.items():
+            if name == 'image':
+                parts.append((
+                    f'--{boundary}\r\nContent-Disposition: form-data; '
+                    f'name="image"; filename="bench.jpg"\r\n'
+                    f'Content-Type: image/jpeg\r\n\r\n'
+                ).encode() + value + b'\r\n')
+            else:
+                parts.append((
+                    f'--{boundary}\r\nContent-Disposition: form-data; '
+                    f'name="{name}"\r\n\r\n{value}\r\n'
+                ).encode())
+        parts.append(f'--{boundary}--\r\n'.encode())
+        return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+    def request(self, method, path, data=None, image=False, token=None):
+        headers = {'Authorization': f'Token {token or self.token}',
+                   'Accept': 'application/json'}
+        body = None
+        if image:
+            body, headers['Content-Type'] = self._multipart(data)
+        elif data is not None:
+            body = json.dumps(data).encode()
+            headers['Content-Type'] = 'application/json'
+        request = Request(self.base_url + path, data=body, headers=headers,
+                          method=method)
+        start = time.perf_counter()
+        try:
+            with urlopen(request) as res:  # nosec
+                res.read()
+                status, timing = res.status, res.headers['Server-Timing']
+        except HTTPError as exc:
+            exc.read()
+            status, timing = exc.code, exc.headers['Server-Timing']
+        return status, timing or '', time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    '''Django command to benchmark every route of the recipe and user API'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', default='perf-user-0@example.com',
+                            help='User to benchmark as, see seed_perf_data')
+        parser.add_argument('--password', default='perf password 1234')
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--url',
+                            help='Base URL of a running server, the test '
+                                 'client is used when omitted')
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='Concurrent requests against a server')
+        parser.add_argument('--output', help='File to write the JSON to')
+
+    def scenarios(self, user, options):
+        '''Return (name, method, setup) for every route
+
+        ``setup`` runs before each request, outside of the measurement, and
+        returns the path, the payload, whether it is an image upload and
+        optionally the token of another user to authenticate with.
+        '''
+        recipe = Recipe.objects.create(
+            user=user, title=f'{PREFIX}scratch', time_minutes=10, price=5
+        )
+        tag_ids = list(Tag.objects.filter(user=user)
+                       .values_list('id', flat=True)[:2])
+        detail_id = Recipe.objects.filter(user=user) \
+            .exclude(pk=recipe.pk).values_list('id', flat=True).first() \
+            or recipe.pk
+        recipe_ids = list(Recipe.objects.filter(user=user)
+                          .values_list('id', flat=True)[:20])
+        ids_query = '?ids=' + ','.join(map(str, recipe_ids))
+        token_payload = {'email': user.email,
+                         'password': options['password']}
+        status_job = jobs.enqueue('update_similarity', {'recipe_ids': []},
+                                  user=user)
+        self.created_jobs.append(status_job.pk)
+
+        def name():
+            return f'{PREFIX}{uuid.uuid4().hex[:12]}'
+
+        def new_user():
+            email = f'{name()}@example.com'
+            self.created_emails.append(email)
+            return reverse('user:create'), \
+                {'email': email, 'password': 'bench 12345',
+                 'name': 'Bench'}, False
+
+        def new_recipe():
+            return {'title': name(), 'time_minutes': 10, 'price': '5.00',
+                    'tags': tag_ids, 'ingredients': []}
+
+        def tag():
+            return Tag.objects.create(user=user, name=name()).id
+
+        def ingredient():
+            return Ingredient.objects.create(user=user, name=name()).id
+
+        def scratch_recipe():
+            return Recipe.objects.create(
+                user=user, title=name(), time_minutes=1, price=1
+            ).id
+
+        def deleted_user():
+            email = f'{name()}@example.com'
+            self.created_emails.append(email)
+            token = Token.objects.create(
+                user=get_user_model().objects.create_user(email)
+            )
+            return reverse('user:me'), None, False, token.key
+
+        return [
+            ('user:create', 'POST', new_user),
+            ('user:token', 'POST',
+             lambda: (reverse('user:token'), token_payload, False)),
+            ('user:me', 'GET', lambda: (reverse('user:me'), None, False)),
+            ('user:me', 'PATCH',
+             lambda: (reverse('user:me'), {'name': user.name}, False)),
+            ('recipe:tag-list', 'GET',
+             lambda: (reverse('recipe:tag-list'), None, False)),
+            ('recipe:tag-list', 'POST',
+             lambda: (reverse('recipe:tag-list'), {'name': name()}, False)),
+            ('recipe:tag-detail', 'DELETE',
+             lambda: (reverse('recipe:tag-detail', args=[tag()]),
+                      None, False)),
+            ('recipe:ingredient-list', 'GET',
+             lambda: (reverse('recipe:ingredient-list'), None, False)),
+            ('recipe:ingredient-list', 'POST',
+             lambda: (reverse('recipe:ingredient-list'), {'name': name()},
+                      False)),
+            ('recipe:ingredient-detail', 'DELETE',
+             lambda: (reverse('recipe:ingredient-detail',
+                              args=[ingredient()]), None, False)),
+            ('recipe:recipe-list', 'GET',
+             lambda: (reverse('recipe:recipe-list'), None, False)),
+            ('recipe:recipe-list?tags', 'GET',
+             lambda: (reverse('recipe:recipe-list') + '?tags=' +
+                      ','.join(map(str, tag_ids)), None, False)),
+            ('recipe:recipe-list', 'POST',
+             lambda: (reverse('recipe:recipe-list'), new_recipe(), False)),
+            ('recipe:recipe-detail', 'GET',
+             lambda: (reverse('recipe:recipe-detail', args=[detail_id]),
+                      None, False)),
+            ('recipe:recipe-detail', 'PATCH',
+             lambda: (reverse('recipe:recipe-detail', args=[recipe.pk]),
+                      {'title': f'{PREFIX}scratch'}, False)),
+            ('recipe:recipe-detail', 'PUT',
+             lambda: (reverse('recipe:recipe-detail', args=[recipe.pk]),
+                      dict(new_recipe(), title=f'{PREFIX}scratch'), False)),
+            ('recipe:recipe-detail', 'DELETE',
+             lambda: (reverse('recipe:recipe-detail',
+                              args=[scratch_recipe()]), None, False)),
+            ('recipe:recipe-batch', 'GET',
+             lambda: (reverse('recipe:recipe-batch') + ids_query,
+                      None, False)),
+            ('recipe:recipe-batch', 'POST',
+             lambda: (reverse('recipe:recipe-batch'), {'ids': recipe_ids},
+                      False)),
+            ('recipe:recipe-clone', 'POST',
+             lambda: (reverse('recipe:recipe-clone', args=[recipe.pk]),
+                      {}, False)),
+            ('recipe:recipe-bulk_clone', 'POST',
+             lambda: (reverse('recipe:recipe-bulk_clone'),
+                      {'ids': [recipe.pk, scratch_recipe()]}, False)),
+            ('recipe:recipe-similar', 'GET',
+             lambda: (reverse('recipe:recipe-similar', args=[detail_id]),
+                      None, False)),
+            ('recipe:recipe-shopping_list', 'GET',
+             lambda: (reverse('recipe:recipe-shopping_list') + ids_query,
+                      None, False)),
+            ('recipe:recipe-upload_image', 'POST',
+             lambda: (reverse('recipe:recipe-upload_image',
+                              args=[scratch_recipe()]),
+                      {'image': sample_image()}, True)),
+            ('user:me', 'DELETE', deleted_user),
+            ('job:job-status', 'GET',
+             lambda: (reverse('job:job-status',
+                              args=[jobs.status_token(status_job)]),
+                      None, False)),
+        ]
+
+    def run_scenario(self, client, method, setup, options):
+        requests = [setup() for _ in range(options['iterations'])]
+
+        def send(request):
+            return client.request(method, *request)
+
+        start = time.perf_counter()
+        if options['concurrency'] > 1:
+            with ThreadPoolExecutor(options['concurrency']) as executor:
+                results = list(executor.map(send, requests))
+        else:
+            results = [send(request) for request in requests]
+        wall = time.perf_counter() - start
+
+        latencies = [elapsed * 1000 for _, _, elapsed in results]
+        queries = [int(match.group(1)) for match in (
+            QUERIES_RE.search(timing) for _, timing, _ in results
+        ) if match]
+        return {
+            'requests': len(results),
+            'errors': sum(1 for status, _, _ in results if status >= 400),
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'mean_ms': sum(latencies) / len(latencies),
+            'throughput_rps': len(results) / wall,
+            'queries_mean': sum(queries) / len(queries) if queries else None,
+        }
+
+    def cleanup(self, user):
+        '''Remove the objects created by the benchmark'''
+        recipes = Recipe.objects.filter(user=user, title__startswith=PREFIX)
+        for recipe in recipes.exclude(image=''):
+            recipe.image.delete(save=False)
+        recipes.delete()
+        Tag.objects.filter(user=user, name__startswith=PREFIX).delete()
+        Ingredient.objects.filter(user=user, name__startswith=PREFIX) \
+            .delete()
+        Job.objects.filter(pk__in=self.created_jobs).delete()
+        Job.objects.filter(user__email__in=self.created_emails).delete()
+        get_user_model().objects.filter(email__in=self.created_emails) \
+            .delete()
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(
+                f"User {options['email']} does not exist, "
+                'run seed_perf_data first'
+            )
+        token, _ = Token.objects.get_or_create(user=user)
+        if options['url']:
+            client = LiveClient(options['url'], token.key)
+        else:
+            client = InProcessClient(token.key)
+            options['concurrency'] = 1
+
+        self.created_emails = []
+        self.created_jobs = []
+        results = {}
+        with override_settings(PERF_SAMPLE_RATE=1):
+            try:
+                for name, method, setup in self.scenarios(user, options):
+                    results[f'{method} {name}'] = self.run_scenario(
+                        client, method, setup, options
+                    )
+            finally:
+                self.cleanup(user)
+
+        report = json.dumps({
+            'mode': 'live' if options['url'] else 'test-client',
+            'iterations': options['iterations'],
+            'concurrency': options['concurrency'],
+            'results': results,
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report)
+        else:
+            self.stdout.write(report)
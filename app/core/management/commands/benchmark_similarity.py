@@ -0,0 +1,72 @@
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core import similarity
+from core.models import Recipe
+from core.perf import percentile
+
+
+class Command(BaseCommand):
+    '''Django command to measure recall and latency of similar recipes
+
+    The LSH index is compared with the exact, quadratic computation on a
+    sample of the recipes of a user, see seed_perf_data.
+    '''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', default='perf-user-0@example.com')
+        parser.add_argument('--samples', type=int, default=20)
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--output', help='File to write the JSON to')
+
+    def measure(self, func, recipe, limit):
+        start = time.perf_counter()
+        result = func(recipe, limit)
+        return result, (time.perf_counter() - start) * 1000
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(
+                f"User {options['email']} does not exist, "
+                'run seed_perf_data first'
+            )
+        recipes = list(Recipe.objects.filter(user=user)
+                       .order_by('?')[:options['samples']])
+        indexed, exact, recalls = [], [], []
+        for recipe in recipes:
+            found, elapsed = self.measure(
+                similarity.similar, recipe, options['limit']
+            )
+            indexed.append(elapsed)
+            ranked, elapsed = self.measure(
+                similarity.exact_similar, recipe, None
+            )
+            exact.append(elapsed)
+            if ranked:
+                # Recipes tied with the last of the top results count too
+                expected = ranked[:options['limit']]
+                relevant = {pk for pk, score in ranked
+                            if score >= expected[-1][1]}
+                hits = sum(1 for pk, _ in found if pk in relevant)
+                recalls.append(min(1, hits / len(expected)))
+
+        report = json.dumps({
+            'recipes': Recipe.objects.filter(user=user).count(),
+            'samples': len(recipes),
+            'limit': options['limit'],
+            'recall_mean': sum(recalls) / len(recalls) if recalls else None,
+            'index_p50_ms': percentile(indexed, 50),
+            'index_p95_ms': percentile(indexed, 95),
+            'exact_p50_ms': percentile(exact, 50),
+            'exact_p95_ms': percentile(exact, 95),
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report)
+        else:
+            self.stdout.write(report)
@@ -0,0 +1,104 @@
+import json
+import os
+import socket
+import subprocess  # nosec
+import sys
+import tempfile
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+SERVERS = [
+    ('wsgi', ['--interface', 'wsgi', 'app.wsgi:application']),
+    ('asgi', ['app.asgi:application']),
+]
+COLUMNS = ['p50_ms', 'p95_ms', 'throughput_rps', 'errors']
+# Rate limits would turn most of the load into 429 responses
+UNTHROTTLED = {
+    f'THROTTLE_{scope}_RATE': '1000000/min' for scope in
+    ['USER', 'ANON', 'RECIPES', 'RECIPE_ATTRS', 'UPLOADS', 'TOKEN']
+}
+
+
+def wait_for_port(host, port, timeout):
+    '''Wait until a server accepts connections on host:port'''
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+class Command(BaseCommand):
+    '''Django command to load test the WSGI and the ASGI application
+
+    Both applications are served in turn by a single uvicorn worker on the
+    same database, and benchmark_api runs against each of them.
+    '''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', default='perf-user-0@example.com',
+                            help='User to benchmark as, see seed_perf_data')
+        parser.add_argument('--password', default='perf password 1234')
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8100)
+        parser.add_argument('--startup-timeout', type=float, default=30)
+        parser.add_argument('--output', help='File to write the JSON to')
+
+    def benchmark(self, interface, args, options):
+        '''Serve the application with uvicorn and benchmark it'''
+        command = [sys.executable, '-m', 'uvicorn', '--host',
+                   options['host'], '--port', str(options['port']),
+                   '--no-access-log', *args]
+        server = subprocess.Popen(  # nosec
+            command, env=dict(os.environ, **UNTHROTTLED)
+        )
+        try:
+            if not wait_for_port(options['host'], options['port'],
+                                 options['startup_timeout']):
+                raise CommandError(f'The {interface} server did not start')
+            with tempfile.TemporaryDirectory() as tmp:
+                output = os.path.join(tmp, f'{interface}.json')
+                call_command(
+                    'benchmark_api',
+                    url=f"http://{options['host']}:{options['port']}",
+                    email=options['email'], password=options['password'],
+                    iterations=options['iterations'],
+                    concurrency=options['concurrency'], output=output,
+                )
+                with open(output) as report:
+                    return json.load(report)['results']
+        finally:
+            server.terminate()
+            server.wait()
+
+    def handle(self, *args, **options):
+        results = {
+            interface: self.benchmark(interface, server_args, options)
+            for interface, server_args in SERVERS
+        }
+
+        header = f"{'route':44}" + ''.join(
+            f'{interface} {column}'.rjust(22)
+            for column in COLUMNS for interface, _ in SERVERS
+        )
+        self.stdout.write(header)
+        for route in results['wsgi']:
+            self.stdout.write(f'{route:44}' + ''.join(
+                f"{results[interface][route][column]:22.1f}"
+                for column in COLUMNS for interface, _ in SERVERS
+            ))
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump({
+                    'iterations': options['iterations'],
+                    'concurrency': options['concurrency'],
+                    'results': results,
+                }, output, indent=2)
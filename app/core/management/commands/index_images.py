@@ -0,0 +1,39 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from core import images
+from core.models import Recipe
+
+
+class Command(BaseCommand):
+    '''Django command to compute the metadata of images uploaded before it
+    was stored'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        indexed = failed = 0
+        pending = Recipe.objects.exclude(image='').exclude(image=None) \
+            .filter(image_width=None)
+        skipped = set()
+        while True:
+            # Clones share their image file, so every name is decoded once
+            names = list(pending.exclude(image__in=skipped).order_by('image')
+                         .values_list('image', flat=True).distinct()
+                         [:options['batch_size']])
+            if not names:
+                break
+            for name in names:
+                try:
+                    with default_storage.open(name) as file:
+                        values = images.metadata(file)
+                except (OSError, SyntaxError, ValueError) as exc:
+                    self.stderr.write(f'Skipping {name}: {exc}')
+                    skipped.add(name)
+                    failed += 1
+                    continue
+                indexed += pending.filter(image=name).update(**values)
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {indexed} recipes, skipped {failed} images'
+        ))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import similarity
+from core.models import Recipe
+
+
+class Command(BaseCommand):
+    '''Django command to rebuild the similar recipes index'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        last = 0
+        indexed = 0
+        while True:
+            batch = list(Recipe.objects.filter(pk__gt=last).order_by('pk')
+                         .values_list('pk', flat=True)
+                         [:options['batch_size']])
+            if not batch:
+                break
+            with transaction.atomic():
+                similarity.update_recipes(batch)
+            last = batch[-1]
+            indexed += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} recipes'))
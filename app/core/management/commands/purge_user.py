@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core import jobs
+from core.deletion import purge_user
+
+
+class Command(BaseCommand):
+    '''Django command to delete a user and all of its data in batches'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='E-mail address of the user')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--background', action='store_true',
+                            help='Queue a job instead of purging inline')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"User {options['email']} does not exist")
+
+        if options['background']:
+            job = jobs.enqueue(
+                'purge_user',
+                {'user_id': user.pk, 'batch_size': options['batch_size']},
+                idempotency_key=f'purge_user:{user.pk}'
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"Queued job {job.pk} to delete {options['email']}"
+            ))
+            return
+
+        counts = purge_user(user, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            'Deleted %s with %d recipes, %d tags and %d ingredients' % (
+                options['email'], counts['recipes'], counts['tags'],
+                counts['ingredients']
+            )
+        ))
@@ -0,0 +1,41 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import counters
+from core.models import Tag, Ingredient
+
+
+class Command(BaseCommand):
+    '''Django command to recompute the denormalized counters in batches'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def batches(self, model, batch_size):
+        '''Yield the primary keys of a model, batch by batch'''
+        last = None
+        while True:
+            queryset = model.objects.order_by('pk')
+            if last is not None:
+                queryset = queryset.filter(pk__gt=last)
+            batch = list(queryset.values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                return
+            last = batch[-1]
+            yield batch
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for model in (Tag, Ingredient):
+            for batch in self.batches(model, batch_size):
+                with transaction.atomic():
+                    counters.refresh_recipe_counts(model, batch)
+        users = 0
+        for batch in self.batches(get_user_model(), batch_size):
+            with transaction.atomic():
+                counters.refresh_summaries(batch, create=True)
+            users += len(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Recomputed the counters of {users} users'
+        ))
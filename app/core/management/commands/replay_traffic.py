@@ -0,0 +1,174 @@
+import asyncio
+import json
+import ssl
+import time
+from collections import defaultdict
+from urllib.parse import quote, urlencode, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from core.perf import percentile
+
+PLACEHOLDERS = {
+    'str': 'replay',
+    'int': 1,
+    'float': 1.0,
+    'bool': True,
+    'null': None,
+}
+
+
+def synthesize(shape):
+    '''Build a request body with placeholder values from a body shape'''
+    if isinstance(shape, dict):
+        return {key: synthesize(item) for key, item in shape.items()}
+    if isinstance(shape, list):
+        return [synthesize(item) for item in shape]
+    return PLACEHOLDERS.get(shape)
+
+
+async def http_request(base, method, target, headers, body, timeout):
+    '''Send a single HTTP/1.1 request and return its status code'''
+    port = base.port or (443 if base.scheme == 'https' else 80)
+    context = ssl.create_default_context() if base.scheme == 'https' \
+        else None
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(base.hostname, port, ssl=context), timeout
+    )
+    try:
+        lines = [f'{method} {target} HTTP/1.1', f'Host: {base.netloc}',
+                 'Connection: close', f'Content-Length: {len(body)}']
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin1'))
+        writer.write(body)
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        await asyncio.wait_for(reader.read(), timeout)
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+class Command(BaseCommand):
+    '''Django command to replay captured traffic against a server'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('capture', help='JSONL file of captured requests')
+        parser.add_argument('--url', required=True,
+                            help='Base URL of the target server')
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--speedup', type=float, default=1,
+                            help='Replay speed factor, 0 for no pauses')
+        parser.add_argument('--methods', default='GET,HEAD',
+                            help='Comma separated methods to replay')
+        parser.add_argument('--token',
+                            help='Token used for every captured user, the '
+                                 'users own tokens are used when omitted')
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--output', help='File to write the JSON to')
+
+    def load(self, path, methods):
+        records = []
+        with open(path) as capture:
+            for line in capture:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record['method'] in methods:
+                    records.append(record)
+        records.sort(key=lambda record: record['ts'])
+        return records
+
+    def tokens(self, records, token):
+        subjects = {r['subject'] for r in records if r['subject'] is not None}
+        if token:
+            return {subject: token for subject in subjects}
+        return dict(Token.objects.filter(user_id__in=subjects)
+                    .values_list('user_id', 'key'))
+
+    def prepare(self, record, tokens):
+        # Captured paths are decoded, the request line must not be
+        target = quote(record['path'], safe='/?&=%')
+        if record['query']:
+            target += '?' + urlencode(record['query'])
+        headers = {'Accept': 'application/json'}
+        if record['subject'] in tokens:
+            headers['Authorization'] = f"Token {tokens[record['subject']]}"
+        body = b''
+        if isinstance(record.get('body'), (dict, list)) \
+                and record.get('content_type') == 'application/json':
+            body = json.dumps(synthesize(record['body'])).encode()
+            headers['Content-Type'] = 'application/json'
+        return target, headers, body
+
+    async def replay(self, records, tokens, options):
+        base = urlsplit(options['url'])
+        semaphore = asyncio.Semaphore(options['concurrency'])
+        results = defaultdict(list)
+        first_ts = records[0]['ts']
+        started = time.monotonic()
+
+        async def send(record):
+            target, headers, body = self.prepare(record, tokens)
+            async with semaphore:
+                start = time.monotonic()
+                try:
+                    status = await http_request(
+                        base, record['method'], target, headers, body,
+                        options['timeout']
+                    )
+                except (OSError, asyncio.TimeoutError, ValueError,
+                        IndexError):
+                    status = None
+                elapsed = (time.monotonic() - start) * 1000
+            endpoint = record.get('endpoint') or record['path']
+            results[f"{record['method']} {endpoint}"].append(
+                (status, elapsed)
+            )
+
+        tasks = []
+        for record in records:
+            if options['speedup'] > 0:
+                due = (record['ts'] - first_ts) / options['speedup']
+                delay = due - (time.monotonic() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(send(record)))
+        await asyncio.gather(*tasks)
+        return results, time.monotonic() - started
+
+    def handle(self, *args, **options):
+        methods = {m.strip().upper() for m in options['methods'].split(',')}
+        records = self.load(options['capture'], methods)
+        if not records:
+            raise CommandError('No requests to replay')
+        tokens = self.tokens(records, options['token'])
+
+        results, wall = asyncio.run(self.replay(records, tokens, options))
+
+        report = {}
+        for endpoint, outcomes in sorted(results.items()):
+            latencies = [elapsed for _, elapsed in outcomes]
+            errors = sum(1 for status, _ in outcomes
+                         if status is None or status >= 400)
+            report[endpoint] = {
+                'requests': len(outcomes),
+                'errors': errors,
+                'error_rate': errors / len(outcomes),
+                'p50_ms': percentile(latencies, 50),
+                'p95_ms': percentile(latencies, 95),
+                'p99_ms': percentile(latencies, 99),
+                'mean_ms': sum(latencies) / len(latencies),
+            }
+        output = json.dumps({
+            'requests': len(records),
+            'duration_s': wall,
+            'throughput_rps': len(records) / wall if wall else None,
+            'endpoints': report,
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output)
+        else:
+            self.stdout.write(output)
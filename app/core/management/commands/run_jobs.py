@@ -0,0 +1,71 @@
+import multiprocessing
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import jobs
+
+
+class Command(BaseCommand):
+    '''Django command to run background jobs until stopped'''
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=1,
+            help='Number of worker processes to start'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=None,
+            help='Seconds to wait when the queue is empty'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit once no job is due instead of polling'
+        )
+
+    def work(self, poll_interval, once):
+        '''Claim and run jobs in this process until asked to stop'''
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda *args: stopping.append(True))
+        worker = jobs.worker_name()
+        count = 0
+        while not stopping:
+            job = jobs.claim(worker)
+            if job is not None:
+                jobs.run(job)
+                count += 1
+            elif once:
+                break
+            else:
+                time.sleep(poll_interval)
+        return count
+
+    def handle(self, *args, **options):
+        poll_interval = options['poll_interval']
+        if poll_interval is None:
+            poll_interval = settings.JOB_POLL_INTERVAL
+        if options['processes'] <= 1:
+            count = self.work(poll_interval, options['once'])
+            self.stdout.write(self.style.SUCCESS(f'Ran {count} jobs'))
+            return
+
+        # Children must not share the connections of the parent
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(
+                target=self.work, args=(poll_interval, options['once'])
+            )
+            for _ in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
+                worker.join()
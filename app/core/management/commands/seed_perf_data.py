@@ -0,0 +1,148 @@
+import random
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from PIL import Image
+
+from core import counters, similarity
+from core.models import Tag, Ingredient, Recipe
+
+PLACEHOLDER_IMAGE = 'uploads/recipe/perf-placeholder.jpg'
+
+
+class Command(BaseCommand):
+    '''Django command to generate synthetic data for performance tests'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--recipes-per-user', type=int, default=50,
+                            help='Mean number of recipes per user')
+        parser.add_argument('--distribution', default='uniform',
+                            choices=('fixed', 'uniform', 'pareto'),
+                            help='Distribution of the recipes per user')
+        parser.add_argument('--tags-per-user', type=int, default=20)
+        parser.add_argument('--ingredients-per-user', type=int, default=50)
+        parser.add_argument('--tags-per-recipe', type=int, default=3)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=6)
+        parser.add_argument('--image-ratio', type=float, default=0.2,
+                            help='Fraction of the recipes with an image')
+        parser.add_argument('--email-prefix', default='perf-user')
+        parser.add_argument('--password', default='perf password 1234')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def _recipe_count(self, rng, options):
+        mean = options['recipes_per_user']
+        if options['distribution'] == 'fixed':
+            return mean
+        if options['distribution'] == 'uniform':
+            return rng.randint(0, 2 * mean)
+        # Pareto with shape 2 has a mean of twice its minimum
+        return int(rng.paretovariate(2) * mean / 2)
+
+    def _ensure_placeholder_image(self):
+        if not default_storage.exists(PLACEHOLDER_IMAGE):
+            buffer = BytesIO()
+            Image.new('RGB', (64, 64), (200, 120, 40)).save(buffer, 'JPEG')
+            default_storage.save(PLACEHOLDER_IMAGE,
+                                 ContentFile(buffer.getvalue()))
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        if options['image_ratio'] > 0:
+            self._ensure_placeholder_image()
+
+        User = get_user_model()
+        password = make_password(options['password'])
+        emails = [
+            f"{options['email_prefix']}-{i}@example.com"
+            for i in range(options['users'])
+        ]
+        existing = set(
+            User.objects.filter(email__in=emails)
+            .values_list('email', flat=True)
+        )
+        User.objects.bulk_create([
+            User(email=email, name=email.split('@')[0], password=password)
+            for email in emails if email not in existing
+        ], batch_size=batch_size)
+        users = User.objects.filter(email__in=emails) \
+            .exclude(email__in=existing).order_by('id')
+
+        totals = {'users': 0, 'recipes': 0}
+        for user in users:
+            with transaction.atomic():
+                self._seed_user(user, rng, options)
+            totals['users'] += 1
+
+        totals['recipes'] = Recipe.objects.filter(user__in=users).count()
+        self.stdout.write(self.style.SUCCESS(
+            'Seeded %(users)d users with %(recipes)d recipes' % totals
+        ))
+
+    def _seed_user(self, user, rng, options):
+        batch_size = options['batch_size']
+        Tag.objects.bulk_create([
+            Tag(user=user, name=f'Tag {i}')
+            for i in range(options['tags_per_user'])
+        ], batch_size=batch_size)
+        Ingredient.objects.bulk_create([
+            Ingredient(user=user, name=f'Ingredient {i}')
+            for i in range(options['ingredients_per_user'])
+        ], batch_size=batch_size)
+        # Backends such as SQLite do not return the ids of bulk inserts
+        tag_ids = list(Tag.objects.filter(user=user)
+                       .values_list('id', flat=True))
+        ingredient_ids = list(Ingredient.objects.filter(user=user)
+                              .values_list('id', flat=True))
+
+        Recipe.objects.bulk_create([
+            Recipe(
+                user=user,
+                title=f'Recipe {i}',
+                time_minutes=rng.randint(5, 180),
+                price=round(rng.uniform(1, 100), 2),
+                image=PLACEHOLDER_IMAGE
+                if rng.random() < options['image_ratio'] else None
+            )
+            for i in range(self._recipe_count(rng, options))
+        ], batch_size=batch_size)
+        recipe_ids = Recipe.objects.filter(user=user) \
+            .values_list('id', flat=True)
+
+        RecipeTag = Recipe.tags.through
+        RecipeIngredient = Recipe.ingredients.through
+        recipe_tags = []
+        recipe_ingredients = []
+        for recipe_id in recipe_ids:
+            for tag_id in rng.sample(tag_ids, min(
+                    options['tags_per_recipe'], len(tag_ids))):
+                recipe_tags.append(
+                    RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+                )
+            for ingredient_id in rng.sample(ingredient_ids, min(
+                    options['ingredients_per_recipe'], len(ingredient_ids))):
+                recipe_ingredients.append(RecipeIngredient(
+                    recipe_id=recipe_id, ingredient_id=ingredient_id
+                ))
+        RecipeTag.objects.bulk_create(recipe_tags, batch_size=batch_size)
+        RecipeIngredient.objects.bulk_create(
+            recipe_ingredients, batch_size=batch_size
+        )
+        # Bulk inserts skip the signals maintaining the similarity index
+        # and the counters
+        recipe_ids = list(recipe_ids)
+        for start in range(0, len(recipe_ids), batch_size):
+            similarity.update_recipes(recipe_ids[start:start + batch_size])
+        for model, ids in ((Tag, tag_ids), (Ingredient, ingredient_ids)):
+            for start in range(0, len(ids), batch_size):
+                counters.refresh_recipe_counts(
+                    model, ids[start:start + batch_size]
+                )
+        counters.refresh_summaries([user.pk], create=True)
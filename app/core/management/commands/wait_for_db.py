@@ -1,21 +1,64 @@
+import random
 import time
 
-from django.db import connections
+from django.db import DEFAULT_DB_ALIAS, connections
 from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 
 class Command(BaseCommand):
     '''Django command to pause execution until database is available'''
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Alias of the database to wait for'
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=60,
+            help='Seconds to wait before giving up'
+        )
+        parser.add_argument(
+            '--base-delay', type=float, default=0.5,
+            help='Seconds to wait after the first failed attempt'
+        )
+        parser.add_argument(
+            '--max-delay', type=float, default=5,
+            help='Maximum seconds to wait between attempts'
+        )
+
+    def probe(self, alias):
+        '''Open a connection to the database and run a trivial query'''
+        connection = connections[alias]
+        connection.ensure_connection()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+
     def handle(self, *args, **options):
         self.stdout.write('Waiting for database...')
-        db_conn = None
-        while not db_conn:
+        deadline = time.monotonic() + options['timeout']
+        attempt = 0
+        while True:
             try:
-                db_conn = connections['default']
+                self.probe(options['database'])
+                break
             except OperationalError:
-                self.stdout.write('Database unavailable, waiting 1 second...')
-                time.sleep(1)
+                connections[options['database']].close()
+                # Exponential backoff with jitter, so that many containers
+                # starting at once do not hit the database in lockstep
+                delay = min(
+                    options['max_delay'],
+                    options['base_delay'] * 2 ** attempt
+                ) * random.uniform(0.5, 1)  # nosec
+                attempt += 1
+                if time.monotonic() + delay > deadline:
+                    raise CommandError(
+                        'Database unavailable after %s seconds'
+                        % options['timeout']
+                    )
+                self.stdout.write(
+                    'Database unavailable, waiting %.1f seconds...' % delay
+                )
+                time.sleep(delay)
 
         self.stdout.write(self.style.SUCCESS('Database available!'))
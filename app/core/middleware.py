@@ -0,0 +1,131 @@
+import json
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from core import perf
+
+
+class PerformanceMiddleware:
+    '''Record query counts, database, serializer and render time
+
+    A PERF_SAMPLE_RATE fraction of the requests is instrumented. Their
+    metrics are returned in a Server-Timing header, logged as a JSON line
+    and aggregated into per-endpoint histograms for the /metrics endpoint.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.PERF_SAMPLE_RATE:  # nosec
+            return self.get_response(request)
+
+        metrics = perf.RequestMetrics()
+        start = time.perf_counter()
+        with perf.collect(metrics):
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        match = request.resolver_match
+        endpoint = match.view_name if match else 'unmatched'
+        response['Server-Timing'] = metrics.server_timing(total)
+        perf.record(endpoint, request.method, response.status_code, metrics,
+                    total)
+        return response
+
+
+SENSITIVE_PARAMS = {'token', 'key', 'password', 'secret', 'signature'}
+
+_capture_lock = threading.Lock()
+
+
+def sanitize_query(params):
+    '''Mask the values of query parameters that may carry credentials'''
+    return {
+        key: '***' if key.lower() in SENSITIVE_PARAMS else value
+        for key, value in params.items()
+    }
+
+
+def capture_traffic(record):
+    '''Append a request record to TRAFFIC_CAPTURE_FILE'''
+    line = json.dumps(record) + '\n'
+    with _capture_lock:
+        with open(settings.TRAFFIC_CAPTURE_FILE, 'a') as capture:
+            capture.write(line)
+
+
+def body_shape(value):
+    '''Describe the structure of a request body without its values'''
+    if isinstance(value, dict):
+        return {key: body_shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [body_shape(item) for item in value]
+    if value is None:
+        return 'null'
+    return type(value).__name__
+
+
+class TrafficCaptureMiddleware:
+    '''Append a sanitized record of every request to TRAFFIC_CAPTURE_FILE
+
+    Records hold the method, path, query, body shape, authenticated user id
+    and timing of a request, never credentials or body values. They can be
+    replayed with the replay_traffic command.
+    '''
+    MAX_JSON_BODY = 64 * 1024
+
+    def __init__(self, get_response):
+        if not settings.TRAFFIC_CAPTURE_FILE:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def _json_shape(self, request):
+        if request.content_type != 'application/json' \
+                or len(request.body) > self.MAX_JSON_BODY:
+            return None
+        try:
+            return body_shape(json.loads(request.body or b'null'))
+        except ValueError:
+            return 'invalid'
+
+    def _form_shape(self, request):
+        # Form bodies are only parsed by the views, which leave the result
+        # on the request
+        post = getattr(request, '_post', None)
+        files = getattr(request, '_files', None)
+        if not post and not files:
+            return None
+        shape = {key: ['str'] * len(post.getlist(key)) for key in post}
+        for key in files or ():
+            shape[key] = 'file'
+        return shape
+
+    def __call__(self, request):
+        json_shape = self._json_shape(request)
+        start = time.time()
+        response = self.get_response(request)
+        duration = time.time() - start
+
+        user = getattr(request, 'user', None)
+        match = request.resolver_match
+        record = {
+            'ts': round(start, 3),
+            'method': request.method,
+            'path': request.path,
+            'endpoint': match.view_name if match else None,
+            'query': sanitize_query(request.GET),
+            'content_type': request.content_type,
+            'body': json_shape if json_shape is not None
+            else self._form_shape(request),
+            'subject': user.pk if user is not None
+            and user.is_authenticated else None,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 1),
+        }
+        capture_traffic(record)
+        return response
@@ -0,0 +1,45 @@
+from django.db import migrations
+
+
+def merge_duplicates(apps, schema_editor):
+    '''Merge tags and ingredients whose names only differ by case'''
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, through, field in (
+        ('Tag', Recipe.tags.through, 'tag_id'),
+        ('Ingredient', Recipe.ingredients.through, 'ingredient_id'),
+    ):
+        model = apps.get_model('core', model_name)
+        kept = {}
+        for pk, user_id, name in model.objects.order_by('pk') \
+                .values_list('pk', 'user_id', 'name'):
+            keep = kept.setdefault((user_id, name.lower()), pk)
+            if keep == pk:
+                continue
+            linked = through.objects.filter(**{field: keep}) \
+                .values_list('recipe_id', flat=True)
+            through.objects.filter(**{field: pk}) \
+                .exclude(recipe_id__in=list(linked)) \
+                .update(**{field: keep})
+            through.objects.filter(**{field: pk}).delete()
+            model.objects.filter(pk=pk).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX core_tag_user_lower_name '
+            'ON core_tag (user_id, LOWER(name))',
+            'DROP INDEX core_tag_user_lower_name',
+        ),
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX core_ingredient_user_lower_name '
+            'ON core_ingredient (user_id, LOWER(name))',
+            'DROP INDEX core_ingredient_user_lower_name',
+        ),
+    ]
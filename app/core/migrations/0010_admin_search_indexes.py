@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# Admin searches are prefix matches, which Django runs as
+# UPPER(column) LIKE UPPER(%s) on PostgreSQL
+INDEXES = (
+    ('core_user_email_prefix', 'core_user', 'email'),
+    ('core_tag_name_prefix', 'core_tag', 'name'),
+    ('core_ingredient_name_prefix', 'core_ingredient', 'name'),
+    ('core_recipe_title_prefix', 'core_recipe', 'title'),
+)
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX {name} ON {table} '
+            f'(UPPER({column}) text_pattern_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in INDEXES:
+        schema_editor.execute(f'DROP INDEX {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_recipe_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 3.0.14 on 2026-10-18 23:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _count(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by()
+        .values(field).annotate(count=Count('*')).values('count'),
+        output_field=IntegerField()
+    ), Value(0))
+
+
+def fill_counters(apps, schema_editor):
+    '''Compute the counters of existing data, see also repair_counters'''
+    User = apps.get_model('core', 'User')
+    Tag = apps.get_model('core', 'Tag')
+    Ingredient = apps.get_model('core', 'Ingredient')
+    Recipe = apps.get_model('core', 'Recipe')
+    UserSummary = apps.get_model('core', 'UserSummary')
+
+    Tag.objects.update(
+        recipe_count=_count(Recipe.tags.through.objects.all(), 'tag_id')
+    )
+    Ingredient.objects.update(recipe_count=_count(
+        Recipe.ingredients.through.objects.all(), 'ingredient_id'
+    ))
+    UserSummary.objects.bulk_create([
+        UserSummary(user_id=pk)
+        for pk in User.objects.values_list('pk', flat=True).iterator()
+    ], batch_size=1000)
+    UserSummary.objects.update(
+        recipe_count=_count(Recipe.objects.all(), 'user_id'),
+        tag_count=_count(Tag.objects.all(), 'user_id'),
+        ingredient_count=_count(Ingredient.objects.all(), 'user_id'),
+    )
+
+
+def restore_name_indexes(apps, schema_editor):
+    '''Recreate the indexes of 0007 that sqlite drops on a table rebuild'''
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in ('core_tag', 'core_ingredient'):
+        schema_editor.execute(
+            f'CREATE UNIQUE INDEX IF NOT EXISTS {table}_user_lower_name '
+            f'ON {table} (user_id, LOWER(name))'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('recipe_count', models.PositiveIntegerField(default=0)),
+                ('tag_count', models.PositiveIntegerField(default=0)),
+                ('ingredient_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'recipe_count', 'id'], name='core_ingredient_user_count'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'recipe_count', 'id'], name='core_tag_user_count'),
+        ),
+        migrations.RunPython(restore_name_indexes, migrations.RunPython.noop),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.0.14 on 2026-10-18 23:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_recipe_image_metadata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThrottleBucket',
+            fields=[
+                ('key', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('tokens', models.FloatField()),
+                ('capacity', models.FloatField()),
+                ('rate', models.FloatField()),
+                ('allowed', models.BooleanField()),
+                ('updated', models.FloatField()),
+                ('expires', models.FloatField(db_index=True)),
+            ],
+        ),
+    ]
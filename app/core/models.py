@@ -1,8 +1,10 @@
 from django.db import models
+from django.db.models.functions import Lower
 from django.contrib.auth.models import \
     AbstractBaseUser, \
     BaseUserManager, \
     PermissionsMixin
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 
@@ -61,6 +63,48 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
 
 
+class NamedObjectManager(models.Manager):
+    '''Manager for objects with a name unique per user, ignoring case'''
+
+    def get_or_create_by_names(self, user, names):
+        '''Return the objects of a user with the given names
+
+        Missing objects are created with a single bulk insert. Names
+        inserted concurrently by another request are skipped by the
+        unique (user_id, lower(name)) index and picked up afterwards.
+        '''
+        wanted = {}
+        for name in names:
+            name = name.strip()
+            if name:
+                wanted.setdefault(name.lower(), name)
+        if not wanted:
+            return []
+
+        def lookup():
+            return {
+                obj.lower_name: obj for obj in
+                self.annotate(lower_name=Lower('name'))
+                .filter(user=user, lower_name__in=list(wanted))
+            }
+
+        found = lookup()
+        missing = [self.model(user=user, name=name)
+                   for key, name in wanted.items() if key not in found]
+        if missing:
+            from core import counters
+
+            existing = len(found)
+            self.bulk_create(missing, ignore_conflicts=True)
+            found = lookup()
+            # Bulk inserts send no post_save. A name inserted concurrently
+            # by another request may be counted twice, repair_counters
+            # fixes that drift
+            counters.adjust_summary(user.pk, self.model,
+                                    len(found) - existing)
+        return [found[key] for key in wanted]
+
+
 class Tag(models.Model):
     '''Tag to be used for a recipe'''
     name = models.CharField(max_length=255)
@@ -69,6 +113,18 @@ class Tag(models.Model):
         on_delete=models.CASCADE
     )
 
+    # Number of recipes using it, maintained by core.counters
+    recipe_count = models.PositiveIntegerField(default=0)
+
+    # Names are unique per user ignoring case, see migration 0007
+    objects = NamedObjectManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'recipe_count', 'id'],
+                         name='core_tag_user_count'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -81,6 +137,18 @@ class Ingredient(models.Model):
         on_delete=models.CASCADE
     )
 
+    # Number of recipes using it, maintained by core.counters
+    recipe_count = models.PositiveIntegerField(default=0)
+
+    # Names are unique per user ignoring case, see migration 0007
+    objects = NamedObjectManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'recipe_count', 'id'],
+                         name='core_ingredient_user_count'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -100,6 +168,123 @@ class Recipe(models.Model):
     tags = models.ManyToManyField(Tag)
 
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    # Computed at upload by core.images so clients can lay out and
+    # preview images before fetching them
+    image_width = models.PositiveIntegerField(null=True, blank=True)
+    image_height = models.PositiveIntegerField(null=True, blank=True)
+    image_size = models.PositiveIntegerField(null=True, blank=True)
+    image_color = models.CharField(max_length=7, blank=True)
+    image_placeholder = models.TextField(blank=True)
+
+    class Meta:
+        # One index per ordering of the recipe list, see RecipeViewSet
+        indexes = [
+            models.Index(fields=['user', 'title', 'id'],
+                         name='core_recipe_user_title'),
+            models.Index(fields=['user', 'price', 'id'],
+                         name='core_recipe_user_price'),
+            models.Index(fields=['user', 'time_minutes', 'id'],
+                         name='core_recipe_user_time'),
+            models.Index(fields=['user', 'id'],
+                         name='core_recipe_user_id'),
+        ]
 
     def __str__(self):
         return self.title
+
+
+class UserSummary(models.Model):
+    '''Object counts of a user, maintained by core.counters'''
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='summary'
+    )
+    recipe_count = models.PositiveIntegerField(default=0)
+    tag_count = models.PositiveIntegerField(default=0)
+    ingredient_count = models.PositiveIntegerField(default=0)
+
+
+class RecipeSignature(models.Model):
+    '''MinHash signature of the tag and ingredient set of a recipe'''
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True
+    )
+    signature = models.BinaryField()
+
+
+class RecipeBucket(models.Model):
+    '''LSH bucket of a recipe, one per band of its signature'''
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE
+    )
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+    key = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'key'],
+                         name='core_bucket_user_key'),
+        ]
+
+
+class ThrottleBucket(models.Model):
+    '''Token bucket of a throttle, updated in place by core.throttling'''
+    key = models.CharField(max_length=255, primary_key=True)
+    tokens = models.FloatField()
+    capacity = models.FloatField()
+    rate = models.FloatField()
+    allowed = models.BooleanField()
+    updated = models.FloatField()
+    expires = models.FloatField(db_index=True)
+
+
+class Job(models.Model):
+    '''Unit of deferred work run by the run_jobs worker'''
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True
+    )
+    name = models.CharField(max_length=100)
+    payload = models.TextField(default='{}')
+    idempotency_key = models.CharField(
+        max_length=255, unique=True, null=True, blank=True
+    )
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=QUEUED
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    result = models.TextField(blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'],
+                         name='core_job_status_run_at'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
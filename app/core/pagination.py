@@ -0,0 +1,114 @@
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+COUNT_MODES = ('exact', 'capped', 'estimated', 'none')
+
+
+def estimate_count(queryset):
+    '''Return the row count the PostgreSQL planner expects, or None
+
+    For unfiltered querysets the planner uses the pg_class statistics.
+    '''
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def count_rows(queryset, mode, cap):
+    '''Count the rows of a queryset, returning (count, is_exact)
+
+    ``capped`` counts at most cap + 1 rows and returns cap when there are
+    more. ``estimated`` trusts the planner for large results only, small
+    estimates are cheap to count exactly. ``none`` returns no count.
+    '''
+    if mode == 'none':
+        return None, False
+    if mode == 'capped':
+        count = queryset.order_by().values('pk')[:cap + 1].count()
+        return (cap, False) if count > cap else (count, True)
+    if mode == 'estimated':
+        estimate = estimate_count(queryset)
+        if estimate is not None and estimate > cap:
+            return estimate, False
+    return queryset.count(), True
+
+
+class OptInCursorPagination(CursorPagination):
+    '''Cursor pagination used only when the client asks for pages
+
+    Requests without ``page_size`` or ``cursor`` get the complete list,
+    as before. Pages follow the ordering the view applied to the queryset,
+    its first field positions the cursor. ``?count=`` selects one of the
+    COUNT_MODES for the count of the whole list.
+    '''
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.page_size_query_param not in params \
+                and self.cursor_query_param not in params:
+            return None
+        self.count_mode = params.get(
+            self.count_query_param, settings.PAGINATION_COUNT_MODE
+        )
+        if self.count_mode not in COUNT_MODES:
+            raise ValidationError({self.count_query_param: [
+                'Count must be one of %s.' % ', '.join(COUNT_MODES)
+            ]})
+        self.full_queryset = queryset
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        return tuple(queryset.query.order_by)
+
+    def get_paginated_response(self, data):
+        count, exact = count_rows(
+            self.full_queryset, self.count_mode,
+            settings.PAGINATION_COUNT_CAP
+        )
+        if count is not None and not exact and self.count_mode == 'capped':
+            count = f'{count}+'
+        return Response(OrderedDict([
+            ('count', count),
+            ('count_exact', exact),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+
+class CountModePaginator(Paginator):
+    '''Paginator for admin changelists counting with ADMIN_COUNT_MODE
+
+    Changelists need a number, so ``none`` counts like ``capped``, and
+    pages past the cap are not linked.
+    '''
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        mode = settings.ADMIN_COUNT_MODE
+        count, _ = count_rows(
+            self.object_list, 'capped' if mode == 'none' else mode,
+            settings.ADMIN_COUNT_CAP
+        )
+        return count
@@ -0,0 +1,263 @@
+import contextlib
+import json
+import logging
+import math
+import threading
+import time
+from contextvars import ContextVar
+
+from django.db import connections
+from rest_framework.renderers import JSONRenderer
+
+logger = logging.getLogger('core.perf')
+
+_current = ContextVar('request_metrics', default=None)
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def percentile(values, percent):
+    '''Return the nearest-rank percentile of a list of values'''
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+class RequestMetrics:
+    '''Where the time of a single request goes'''
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.sections = {'serializer': 0.0, 'render': 0.0}
+        self._statements = {}
+        self._depth = 0
+
+    @property
+    def duplicate_queries(self):
+        '''Number of queries repeating an earlier statement and parameters'''
+        return self.queries - len(self._statements)
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        '''Database execute_wrapper counting and timing the queries'''
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            key = (sql, repr(params))
+            self._statements[key] = self._statements.get(key, 0) + 1
+
+    def server_timing(self, total):
+        '''Format the metrics as a Server-Timing header value'''
+        entries = [
+            'db;dur=%.1f;desc="%d queries"' % (
+                self.db_time * 1000, self.queries
+            )
+        ]
+        for name, duration in self.sections.items():
+            entries.append('%s;dur=%.1f' % (name, duration * 1000))
+        entries.append('total;dur=%.1f' % (total * 1000))
+        return ', '.join(entries)
+
+
+def start_request():
+    '''Start collecting metrics for the current request'''
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def end_request(token):
+    '''Stop collecting metrics for the current request'''
+    _current.reset(token)
+
+
+def current():
+    '''Return the metrics of the current request or None'''
+    return _current.get()
+
+
+@contextlib.contextmanager
+def collect(metrics):
+    '''Record the queries and sections of this thread into metrics
+
+    Database connections are per thread, so code running in worker threads
+    on behalf of a request uses this to report to the request's metrics.
+    '''
+    token = _current.set(metrics)
+    try:
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(metrics.execute_wrapper)
+                )
+            yield
+    finally:
+        _current.reset(token)
+
+
+def record(endpoint, method, status, metrics, total):
+    '''Add a finished request to the histograms and the log'''
+    registry.observe(endpoint, metrics, total)
+    logger.info(json.dumps({
+        'endpoint': endpoint,
+        'method': method,
+        'status': status,
+        'duration_ms': round(total * 1000, 1),
+        'queries': metrics.queries,
+        'duplicate_queries': metrics.duplicate_queries,
+        'db_ms': round(metrics.db_time * 1000, 1),
+        'serializer_ms': round(metrics.sections['serializer'] * 1000, 1),
+        'render_ms': round(metrics.sections['render'] * 1000, 1),
+    }))
+
+
+@contextlib.contextmanager
+def timed(section):
+    '''Add the time spent in the block to a section of the request'''
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.sections[section] = metrics.sections.get(section, 0) \
+            + time.perf_counter() - start
+
+
+class TimedSerializerMixin:
+    '''Record the time spent serializing objects
+
+    Only the outermost serializer is timed, so nested serializers are not
+    counted twice.
+    '''
+
+    def to_representation(self, instance):
+        metrics = _current.get()
+        if metrics is None or metrics._depth:
+            return super().to_representation(instance)
+        metrics._depth += 1
+        try:
+            with timed('serializer'):
+                return super().to_representation(instance)
+        finally:
+            metrics._depth -= 1
+
+
+class TimedJSONRenderer(JSONRenderer):
+    '''JSON renderer recording the time spent rendering'''
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed('render'):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+
+
+class Histogram:
+    '''Prometheus style cumulative histogram'''
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.total += 1
+        self.sum += value
+
+
+class Registry:
+    '''Per-endpoint histograms of the request metrics of this process'''
+
+    METRICS = {
+        'http_request_duration_seconds':
+            ('Time spent handling the request', TIME_BUCKETS),
+        'http_request_db_duration_seconds':
+            ('Time spent in database queries', TIME_BUCKETS),
+        'http_request_db_queries':
+            ('Database queries per request', COUNT_BUCKETS),
+        'http_request_db_duplicate_queries':
+            ('Repeated database queries per request', COUNT_BUCKETS),
+        'http_request_serializer_duration_seconds':
+            ('Time spent serializing', TIME_BUCKETS),
+        'http_request_render_duration_seconds':
+            ('Time spent rendering', TIME_BUCKETS),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, endpoint, metrics, total):
+        values = {
+            'http_request_duration_seconds': total,
+            'http_request_db_duration_seconds': metrics.db_time,
+            'http_request_db_queries': metrics.queries,
+            'http_request_db_duplicate_queries': metrics.duplicate_queries,
+            'http_request_serializer_duration_seconds':
+                metrics.sections['serializer'],
+            'http_request_render_duration_seconds':
+                metrics.sections['render'],
+        }
+        with self._lock:
+            for name, value in values.items():
+                key = (name, endpoint)
+                if key not in self._histograms:
+                    self._histograms[key] = Histogram(self.METRICS[name][1])
+                self._histograms[key].observe(value)
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def export(self):
+        '''Return the histograms in the Prometheus text format'''
+        lines = []
+        with self._lock:
+            for name, (help_text, _) in self.METRICS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for (metric, endpoint), histogram in sorted(
+                        self._histograms.items()):
+                    if metric != name:
+                        continue
+                    label = 'endpoint="%s"' % endpoint.replace('"', '\\"')
+                    for bound, count in zip(histogram.buckets,
+                                            histogram.counts):
+                        lines.append(
+                            f'{name}_bucket{{{label},le="{bound}"}} {count}'
+                        )
+                    lines.append(
+                        f'{name}_bucket{{{label},le="+Inf"}} '
+                        f'{histogram.total}'
+                    )
+                    lines.append(f'{name}_sum{{{label}}} {histogram.sum}')
+                    lines.append(f'{name}_count{{{label}}} {histogram.total}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def export_pool_stats(databases):
+    '''Return the connection pool gauges in the Prometheus text format'''
+    if not any(db.get('ENGINE') == 'core.backends.postgresql_pool'
+               for db in databases.values()):
+        return ''
+    from core.backends.postgresql_pool.base import get_pools
+
+    lines = []
+    for alias, pool in get_pools():
+        for name, value in pool.stats().items():
+            lines.append(f'db_pool_{name}{{alias="{alias}"}} {value}')
+    return '\n'.join(lines) + '\n' if lines else ''
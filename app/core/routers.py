@@ -0,0 +1,117 @@
+import contextlib
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.utils import DatabaseError
+
+_use_replicas = ContextVar('use_replicas', default=False)
+
+_lag_lock = threading.Lock()
+_lag = {}
+
+
+def pin_to_primary(user_id):
+    '''Route the reads of a user to the primary for a while after a write'''
+    if user_id is not None:
+        cache.set(f'replica-pin:{user_id}', True,
+                  settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user_id):
+    '''Return whether the reads of a user must go to the primary'''
+    return cache.get(f'replica-pin:{user_id}', False)
+
+
+def enable_replica_reads(user_id):
+    '''Allow the following reads to go to a replica, returning a token
+
+    Reads stay on the primary while the user is pinned to it, so users
+    always read their own writes.
+    '''
+    return _use_replicas.set(not is_pinned(user_id))
+
+
+def reset_replica_reads(token):
+    '''Undo a previous enable_replica_reads'''
+    _use_replicas.reset(token)
+
+
+@contextlib.contextmanager
+def replica_reads(user_id):
+    '''Allow the reads in this block to go to a replica'''
+    token = enable_replica_reads(user_id)
+    try:
+        yield
+    finally:
+        reset_replica_reads(token)
+
+
+def _measure_lag(alias):
+    '''Return the replication lag of a replica in seconds'''
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT CASE WHEN pg_last_wal_receive_lsn() '
+            '= pg_last_wal_replay_lsn() THEN 0 ELSE EXTRACT(EPOCH FROM '
+            'now() - pg_last_xact_replay_timestamp()) END'
+        )
+        lag = cursor.fetchone()[0]
+    return float(lag or 0)
+
+
+def replica_lag(alias):
+    '''Return the replication lag of a replica in seconds
+
+    The lag is measured at most every REPLICA_LAG_CHECK_INTERVAL seconds.
+    Unreachable replicas have an infinite lag.
+    '''
+    now = time.monotonic()
+    with _lag_lock:
+        measured = _lag.get(alias)
+    if measured is not None \
+            and now - measured[0] < settings.REPLICA_LAG_CHECK_INTERVAL:
+        return measured[1]
+    try:
+        lag = _measure_lag(alias)
+    except DatabaseError:
+        lag = float('inf')
+    with _lag_lock:
+        _lag[alias] = (now, lag)
+    return lag
+
+
+def healthy_replicas():
+    '''Return the replicas that are within the maximum replication lag'''
+    return [
+        alias for alias in settings.REPLICA_DATABASES
+        if replica_lag(alias) <= settings.REPLICA_MAX_LAG
+    ]
+
+
+class ReplicaRouter:
+    '''Send reads to a healthy replica inside replica_reads blocks'''
+
+    def db_for_read(self, model, **hints):
+        # The database cache holds the pins, it must never lag behind
+        if not _use_replicas.get() or model._meta.app_label == 'django_cache':
+            return None
+        replicas = healthy_replicas()
+        if not replicas:
+            return None
+        return random.choice(replicas)  # nosec
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.REPLICA_DATABASES
@@ -0,0 +1,139 @@
+from collections import Counter
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, \
+    pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from core import changefeed, counters, similarity
+from core.dataversion import bump_data_version
+from core.models import Tag, Ingredient, Recipe, User, UserSummary
+
+
+def _notify(instance, op):
+    '''Publish the change once the surrounding transaction commits'''
+    transaction.on_commit(partial(bump_data_version, instance.user_id))
+    transaction.on_commit(partial(
+        changefeed.publish,
+        instance.user_id,
+        instance._meta.model_name,
+        instance.pk,
+        op
+    ))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=Recipe)
+def notify_saved(sender, instance, created, **kwargs):
+    '''Notify the change feed of created or updated objects'''
+    _notify(instance, 'created' if created else 'updated')
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+def notify_deleted(sender, instance, **kwargs):
+    '''Notify the change feed of deleted objects'''
+    _notify(instance, 'deleted')
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def notify_relations_changed(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    '''Notify the change feed of recipes with changed tags or ingredients'''
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        _notify(instance, 'updated')
+    else:
+        transaction.on_commit(partial(bump_data_version, instance.user_id))
+        for pk in pk_set or ():
+            transaction.on_commit(partial(
+                changefeed.publish, instance.user_id, 'recipe', pk, 'updated'
+            ))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def update_similarity(sender, instance, action, reverse, pk_set, **kwargs):
+    '''Keep the similarity index of recipes with changed relations'''
+    if reverse and action == 'pre_clear':
+        instance._cleared_recipe_ids = list(
+            instance.recipe_set.values_list('pk', flat=True)
+        )
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        recipe_ids = [instance.pk]
+    elif action == 'post_clear':
+        recipe_ids = getattr(instance, '_cleared_recipe_ids', ())
+    else:
+        recipe_ids = pk_set or ()
+    similarity.update_recipes(recipe_ids)
+
+
+@receiver(post_save, sender=User)
+def create_summary(sender, instance, created, **kwargs):
+    '''Give new users an empty summary row'''
+    if created:
+        UserSummary.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=Recipe)
+def count_created(sender, instance, created, **kwargs):
+    '''Count new objects in the summary of their user'''
+    if created:
+        counters.adjust_summary(instance.user_id, sender, 1)
+
+
+@receiver(pre_delete, sender=Recipe)
+def collect_counted(sender, instance, **kwargs):
+    '''Remember the tags and ingredients of a recipe about to go'''
+    instance._counted = {
+        model: counters.linked(model, [instance.pk])
+        for model in counters.RELATIONS
+    }
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+def count_deleted(sender, instance, **kwargs):
+    '''Uncount deleted objects'''
+    for model, links in getattr(instance, '_counted', {}).items():
+        counters.adjust_recipe_counts(
+            model, {pk: -count for pk, count in links.items()}
+        )
+    counters.adjust_summary(instance.user_id, sender, -1)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def count_relations(sender, instance, action, reverse, model, pk_set,
+                    **kwargs):
+    '''Update the recipe_count of tags or ingredients added or removed
+
+    pk_set of post_add only holds the links actually inserted, removals
+    and clears look up the links that exist first.
+    '''
+    if reverse:
+        counted, recipe_ids, ids = type(instance), pk_set, {instance.pk}
+    else:
+        counted, recipe_ids, ids = model, {instance.pk}, pk_set
+    if action == 'post_add':
+        counters.adjust_recipe_counts(counted, Counter(
+            pk for pk in ids for _ in recipe_ids
+        ))
+    elif action in ('pre_remove', 'pre_clear'):
+        # pk_set is None for clears, so every link of instance is counted
+        instance._removed_links = counters.linked(counted, recipe_ids, ids)
+    elif action in ('post_remove', 'post_clear'):
+        links = instance.__dict__.pop('_removed_links', {})
+        counters.adjust_recipe_counts(
+            counted, {pk: -count for pk, count in links.items()}
+        )
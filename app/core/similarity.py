@@ -0,0 +1,152 @@
+import hashlib
+import random
+import struct
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import Count
+
+from core.models import Recipe, RecipeSignature, RecipeBucket
+
+# Recipes get a MinHash signature of their tag and ingredient set. Equal
+# hashes in two signatures estimate the Jaccard similarity of the sets.
+# Signatures are cut into bands stored as LSH bucket keys, so candidates
+# are found with an index lookup instead of comparing every recipe.
+PRIME = (1 << 61) - 1
+
+
+@lru_cache(maxsize=None)
+def _permutations(count, seed):
+    rng = random.Random(seed)
+    return [(rng.randrange(1, PRIME), rng.randrange(0, PRIME))
+            for _ in range(count)]
+
+
+def _hash(token):
+    return int.from_bytes(
+        hashlib.blake2b(token.encode(), digest_size=8).digest(), 'big'
+    )
+
+
+def signature(features):
+    '''Return the MinHash signature of a set of feature strings'''
+    hashes = [_hash(feature) for feature in features]
+    if not hashes:
+        return None
+    return [
+        min((a * value + b) % PRIME for value in hashes)
+        for a, b in _permutations(
+            settings.SIMILARITY_BANDS * settings.SIMILARITY_ROWS,
+            settings.SIMILARITY_SEED
+        )
+    ]
+
+
+def bucket_keys(sig):
+    '''Return the LSH bucket key of every band of a signature'''
+    rows = settings.SIMILARITY_ROWS
+    keys = []
+    for band in range(settings.SIMILARITY_BANDS):
+        values = sig[band * rows:(band + 1) * rows]
+        digest = hashlib.blake2b(
+            struct.pack(f'<H{rows}Q', band, *values), digest_size=8
+        ).digest()
+        keys.append(int.from_bytes(digest, 'big', signed=True))
+    return keys
+
+
+def pack(sig):
+    return struct.pack(f'<{len(sig)}Q', *sig)
+
+
+def unpack(data):
+    data = bytes(data)
+    return struct.unpack(f'<{len(data) // 8}Q', data)
+
+
+def estimate(sig1, sig2):
+    '''Estimate the Jaccard similarity of two signatures'''
+    return sum(1 for a, b in zip(sig1, sig2) if a == b) / len(sig1)
+
+
+def recipe_features(recipe_ids):
+    '''Return the tag and ingredient features of recipes, by recipe id'''
+    features = {recipe_id: set() for recipe_id in recipe_ids}
+    for prefix, through, field in (
+        ('t', Recipe.tags.through, 'tag_id'),
+        ('i', Recipe.ingredients.through, 'ingredient_id'),
+    ):
+        rows = through.objects.filter(recipe_id__in=recipe_ids) \
+            .values_list('recipe_id', field)
+        for recipe_id, pk in rows:
+            features[recipe_id].add(f'{prefix}{pk}')
+    return features
+
+
+def update_recipes(recipe_ids):
+    '''Recompute the signatures and buckets of recipes'''
+    recipe_ids = list(set(recipe_ids))
+    if not recipe_ids:
+        return
+    owners = dict(Recipe.objects.filter(pk__in=recipe_ids)
+                  .values_list('pk', 'user_id'))
+    signatures, buckets = [], []
+    for recipe_id, features in recipe_features(list(owners)).items():
+        sig = signature(features)
+        if sig is None:
+            continue
+        signatures.append(RecipeSignature(recipe_id=recipe_id,
+                                          signature=pack(sig)))
+        buckets.extend(
+            RecipeBucket(user_id=owners[recipe_id], recipe_id=recipe_id,
+                         key=key)
+            for key in bucket_keys(sig)
+        )
+    RecipeSignature.objects.filter(recipe_id__in=recipe_ids).delete()
+    RecipeBucket.objects.filter(recipe_id__in=recipe_ids).delete()
+    RecipeSignature.objects.bulk_create(signatures)
+    RecipeBucket.objects.bulk_create(buckets)
+
+
+def similar(recipe, limit):
+    '''Return (recipe id, estimated similarity) pairs, most similar first
+
+    Only recipes of the same user sharing at least one bucket are
+    considered, the SIMILARITY_MAX_CANDIDATES with the most shared
+    buckets are ranked by their estimated similarity.
+    '''
+    own = RecipeSignature.objects.filter(recipe=recipe).first()
+    if own is None:
+        return []
+    own = unpack(own.signature)
+    candidates = RecipeBucket.objects.filter(
+        user_id=recipe.user_id, key__in=bucket_keys(own)
+    ).exclude(recipe=recipe).values('recipe_id') \
+        .annotate(hits=Count('id')).order_by('-hits', 'recipe_id') \
+        .values_list('recipe_id', flat=True)
+    candidates = list(candidates[:settings.SIMILARITY_MAX_CANDIDATES])
+    scores = [
+        (recipe_id, estimate(own, unpack(sig)))
+        for recipe_id, sig in RecipeSignature.objects
+        .filter(recipe_id__in=candidates)
+        .values_list('recipe_id', 'signature')
+    ]
+    scores.sort(key=lambda score: (-score[1], score[0]))
+    return scores[:limit]
+
+
+def exact_similar(recipe, limit):
+    '''Return the most similar recipes by comparing every recipe
+
+    This is the quadratic baseline the index is measured against.
+    '''
+    ids = list(Recipe.objects.filter(user_id=recipe.user_id)
+               .values_list('pk', flat=True))
+    features = recipe_features(ids)
+    own = features.pop(recipe.pk)
+    scores = [
+        (recipe_id, len(own & other) / len(own | other))
+        for recipe_id, other in features.items() if own & other
+    ]
+    scores.sort(key=lambda score: (-score[1], score[0]))
+    return scores[:limit]
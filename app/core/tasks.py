@@ -0,0 +1,42 @@
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+
+from core import deletion, images, jobs, similarity
+from core.models import Recipe
+
+
+@jobs.register('delete_files')
+def delete_files(payload):
+    '''Delete media files that no recipe references anymore'''
+    names = deletion.unreferenced_files(payload['names'])
+    deletion.delete_files(names)
+    return {'deleted': len(names)}
+
+
+@jobs.register('purge_user')
+def purge_user(payload):
+    '''Delete a user and all of its data'''
+    user = get_user_model().objects.filter(pk=payload['user_id']).first()
+    if user is None:
+        # Already purged by an earlier attempt
+        return {'recipes': 0, 'tags': 0, 'ingredients': 0}
+    return deletion.purge_user(user, payload.get('batch_size', 1000))
+
+
+@jobs.register('image_metadata')
+def image_metadata(payload):
+    '''Compute the metadata of an image too large to decode in a request'''
+    recipes = Recipe.objects.filter(image=payload['name'])
+    if not recipes.exists():
+        # Replaced or deleted in the meantime
+        return {'updated': 0}
+    with default_storage.open(payload['name']) as file:
+        values = images.metadata(file)
+    return {'updated': recipes.update(**values)}
+
+
+@jobs.register('update_similarity')
+def update_similarity(payload):
+    '''Recompute the similarity index of recipes'''
+    similarity.update_recipes(payload['recipe_ids'])
+    return {'recipes': len(payload['recipe_ids'])}
@@ -1,7 +1,11 @@
+from django.db import connection
 from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
+from core.models import Recipe, Tag
+
 
 class AdminSiteTests(TestCase):
 
@@ -40,3 +44,46 @@ class AdminSiteTests(TestCase):
         res = self.client.get(url)
 
         self.assertEqual(res.status_code, 200)
+
+    def test_recipes_listed(self):
+        '''Test that the recipe changelist renders with its paginator'''
+        Recipe.objects.create(user=self.user, title='Nasi goreng',
+                              time_minutes=10, price=5)
+        url = reverse('admin:core_recipe_changelist')
+        res = self.client.get(url)
+
+        self.assertContains(res, 'Nasi goreng')
+
+    def test_recipe_changelist_constant_queries(self):
+        '''Test that the recipe changelist does not query per row'''
+        def changelist_queries(count):
+            Recipe.objects.bulk_create([
+                Recipe(user=self.user, title=f'Recipe {i}',
+                       time_minutes=10, price=5)
+                for i in range(count)
+            ])
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse('admin:core_recipe_changelist'))
+            return len(queries)
+
+        self.assertEqual(changelist_queries(2), changelist_queries(20))
+
+    def test_search_users(self):
+        '''Test that users are searched by e-mail prefix'''
+        url = reverse('admin:core_user_changelist')
+        res = self.client.get(url, {'q': 'test@'})
+
+        self.assertContains(res, self.user.email)
+        self.assertNotContains(res, 'admin@apparanto.com</a>')
+
+    def test_recipe_change_page_uses_autocomplete(self):
+        '''Test that the recipe form does not render every tag'''
+        recipe = Recipe.objects.create(user=self.user, title='Nasi goreng',
+                                       time_minutes=10, price=5)
+        Tag.objects.create(user=self.user, name='Unrelated tag')
+        url = reverse('admin:core_recipe_change', args=[recipe.id])
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertNotContains(res, 'Unrelated tag')
+        self.assertContains(res, 'admin-autocomplete')
@@ -0,0 +1,123 @@
+import asyncio
+import json
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from core import changefeed
+from core.changefeed import ChangeFeedBroker
+from core.deletion import delete_recipe_attr
+from core.models import Tag, Recipe
+from recipe.asgi import change_feed
+
+
+def run(coroutine):
+    return asyncio.new_event_loop().run_until_complete(coroutine)
+
+
+class ChangeFeedBrokerTests(TestCase):
+
+    def test_dispatch_reaches_only_user_subscriptions(self):
+        '''Test that events are delivered to the subscribers of the user'''
+        broker = ChangeFeedBroker()
+
+        async def scenario():
+            loop = asyncio.get_running_loop()
+            mine = broker.subscribe(1, loop)
+            other = broker.subscribe(2, loop)
+            broker.dispatch(json.dumps({'user': 1, 'op': 'created'}))
+            await asyncio.sleep(0)
+            return mine.drain(), other.drain()
+
+        mine, other = run(scenario())
+        self.assertEqual(mine, [{'user': 1, 'op': 'created'}])
+        self.assertEqual(other, [])
+
+    @override_settings(CHANGEFEED_QUEUE_SIZE=2)
+    def test_overflow_collapses_into_resync(self):
+        '''Test that a full queue is replaced by a single resync event'''
+        broker = ChangeFeedBroker()
+
+        async def scenario():
+            subscription = broker.subscribe(1, asyncio.get_running_loop())
+            for i in range(3):
+                broker.dispatch(json.dumps({'user': 1, 'id': i}))
+            await asyncio.sleep(0)
+            return subscription.drain()
+
+        self.assertEqual(run(scenario()), [{'user': 1, 'op': 'resync'}])
+
+    @patch('core.changefeed._send')
+    def test_large_batch_becomes_resync(self, send):
+        '''Test that a batch too large for a notification is a resync'''
+        changefeed.publish_batch(1, 'recipe', [1, 2], 'updated')
+        changefeed.publish_batch(1, 'recipe', range(10000), 'updated')
+
+        self.assertEqual(json.loads(send.call_args_list[0][0][0]), {
+            'user': 1, 'model': 'recipe', 'ids': [1, 2], 'op': 'updated'
+        })
+        self.assertEqual(json.loads(send.call_args_list[1][0][0]),
+                         {'user': 1, 'op': 'resync'})
+
+    def test_change_feed_requires_authentication(self):
+        '''Test that the change feed rejects anonymous clients'''
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {'type': 'http', 'path': '/api/recipe/changes/',
+                 'headers': [], 'query_string': b''}
+        run(change_feed(scope, None, send))
+
+        self.assertEqual(messages[0]['status'], 401)
+
+
+class ChangeFeedSignalTests(TransactionTestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@apparanto.com',
+            'password 1234'
+        )
+
+    @patch('core.changefeed.publish')
+    def test_writes_are_published_after_commit(self, publish):
+        '''Test that recipe and tag writes are published'''
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=10, price=5
+        )
+        recipe.tags.add(tag)
+        recipe_id = recipe.id
+        recipe.delete()
+
+        publish.assert_any_call(self.user.id, 'tag', tag.id, 'created')
+        publish.assert_any_call(self.user.id, 'recipe', recipe_id, 'created')
+        publish.assert_any_call(self.user.id, 'recipe', recipe_id, 'updated')
+        publish.assert_any_call(self.user.id, 'recipe', recipe_id, 'deleted')
+
+    @patch('core.changefeed.publish_batch')
+    @patch('core.changefeed.publish')
+    def test_deleted_tag_is_published_once(self, publish, publish_batch):
+        '''Test that deleting a tag sends one event for its recipes'''
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipes = [
+            Recipe.objects.create(
+                user=self.user, title=f'Curry {i}', time_minutes=10, price=5
+            ) for i in range(3)
+        ]
+        for recipe in recipes:
+            recipe.tags.add(tag)
+        publish.reset_mock()
+        tag_id = tag.id
+
+        delete_recipe_attr(tag)
+
+        publish_batch.assert_called_once_with(
+            self.user.id, 'recipe', [recipe.id for recipe in recipes],
+            'updated'
+        )
+        publish.assert_called_once_with(self.user.id, 'tag', tag_id,
+                                        'deleted')
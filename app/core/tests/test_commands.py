@@ -1,25 +1,53 @@
 from unittest.mock import patch
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
 from django.test import TestCase
 
+PROBE = 'core.management.commands.wait_for_db.Command.probe'
+
 
 class CommandTests(TestCase):
 
     def test_wait_for_db_ready(self):
         '''Test waiting for db when db is available'''
-
-        db_connection_method = 'django.db.utils.ConnectionHandler.__getitem__'
-        with patch(db_connection_method) as get_item:
-            get_item.return_value = True
+        with patch(PROBE) as probe:
             call_command('wait_for_db')
-            self.assertEqual(get_item.call_count, 1)
+            self.assertEqual(probe.call_count, 1)
+            probe.assert_called_with('default')
+
+    def test_wait_for_db_probes_database(self):
+        '''Test that waiting for db actually queries the database'''
+        call_command('wait_for_db', timeout=0)
 
     @patch('time.sleep', return_value=True)
     def test_wait_for_db(self, ts):
         '''Test waiting for db'''
-        db_connection_method = 'django.db.utils.ConnectionHandler.__getitem__'
-        with patch(db_connection_method) as get_item:
-            get_item.side_effect = [OperationalError] * 5 + [True]
+        with patch(PROBE) as probe:
+            probe.side_effect = [OperationalError] * 5 + [True]
             call_command('wait_for_db')
-            self.assertEqual(get_item.call_count, 6)
+            self.assertEqual(probe.call_count, 6)
+
+    @patch('time.sleep', return_value=True)
+    def test_wait_for_db_backs_off(self, ts):
+        '''Test that the delay between attempts grows up to the maximum'''
+        with patch(PROBE) as probe, patch('random.uniform', return_value=1):
+            probe.side_effect = [OperationalError] * 5 + [True]
+            call_command('wait_for_db', base_delay=1, max_delay=4)
+
+        delays = [c[0][0] for c in ts.call_args_list]
+        self.assertEqual(delays, [1, 2, 4, 4, 4])
+
+    @patch('time.sleep', return_value=True)
+    @patch('time.monotonic', side_effect=range(0, 1000, 10))
+    def test_wait_for_db_timeout(self, monotonic, ts):
+        '''Test that waiting for db gives up after the timeout'''
+        with patch(PROBE, side_effect=OperationalError):
+            with self.assertRaises(CommandError):
+                call_command('wait_for_db', timeout=30)
+
+    def test_wait_for_db_database_option(self):
+        '''Test waiting for another database alias'''
+        with patch(PROBE) as probe:
+            call_command('wait_for_db', database='replica')
+            probe.assert_called_with('replica')
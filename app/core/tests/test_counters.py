@@ -0,0 +1,126 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from core.cloning import clone_recipes
+from core.models import Tag, Ingredient, Recipe, UserSummary
+
+
+class CounterTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@apparanto.com', 'password 1234'
+        )
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.ingredient = Ingredient.objects.create(user=self.user,
+                                                    name='Rice')
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=10, price=5
+        )
+
+    def assertCounts(self, tag, ingredient):
+        self.tag.refresh_from_db()
+        self.ingredient.refresh_from_db()
+        self.assertEqual(self.tag.recipe_count, tag)
+        self.assertEqual(self.ingredient.recipe_count, ingredient)
+
+    def test_counts_follow_links(self):
+        '''Test that adding, removing and clearing links updates counts'''
+        self.recipe.tags.add(self.tag)
+        self.recipe.ingredients.add(self.ingredient)
+        self.assertCounts(1, 1)
+
+        self.tag.recipe_set.add(Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=10, price=5
+        ))
+        self.recipe.ingredients.remove(self.ingredient)
+        self.assertCounts(2, 0)
+
+        self.tag.recipe_set.clear()
+        self.assertCounts(0, 0)
+
+    def test_counts_are_incremented_in_place(self):
+        '''Test that writes adjust counters instead of counting links'''
+        Tag.objects.filter(pk=self.tag.pk).update(recipe_count=5)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.recipe.tags.add(self.tag)
+
+        self.assertCounts(6, 0)
+        self.assertFalse([query for query in queries
+                          if 'COUNT(' in query['sql'].upper()])
+
+    def test_removing_unlinked_objects(self):
+        '''Test that removing links that do not exist changes nothing'''
+        other = Tag.objects.create(user=self.user, name='Spicy')
+        self.recipe.tags.add(self.tag)
+
+        self.recipe.tags.remove(self.tag, other)
+        self.recipe.tags.remove(self.tag)
+        other.recipe_set.remove(self.recipe)
+
+        self.assertCounts(0, 0)
+        other.refresh_from_db()
+        self.assertEqual(other.recipe_count, 0)
+
+    def test_objects_created_by_name_are_counted(self):
+        '''Test that tags created by a bulk insert reach the summary'''
+        Tag.objects.get_or_create_by_names(self.user,
+                                           ['vegan', 'Spicy', 'Sweet'])
+
+        self.assertEqual(
+            UserSummary.objects.get(user=self.user).tag_count, 3
+        )
+
+    def test_counts_after_recipe_delete(self):
+        '''Test that deleting a recipe decrements the counts'''
+        self.recipe.tags.add(self.tag)
+        self.recipe.ingredients.add(self.ingredient)
+
+        self.recipe.delete()
+
+        self.assertCounts(0, 0)
+
+    def test_counts_after_clone(self):
+        '''Test that cloned recipes are counted'''
+        self.recipe.tags.add(self.tag)
+        self.recipe.ingredients.add(self.ingredient)
+
+        clone_recipes(self.user, [self.recipe.pk])
+
+        self.assertCounts(2, 2)
+        self.assertEqual(
+            UserSummary.objects.get(user=self.user).recipe_count, 2
+        )
+
+    def test_user_summary(self):
+        '''Test that the summary of a user counts its objects'''
+        Tag.objects.create(user=self.user, name='Spicy')
+        summary = UserSummary.objects.get(user=self.user)
+        self.assertEqual(
+            (summary.recipe_count, summary.tag_count,
+             summary.ingredient_count),
+            (1, 2, 1)
+        )
+
+        self.recipe.delete()
+
+        summary.refresh_from_db()
+        self.assertEqual(summary.recipe_count, 0)
+
+    def test_repair_counters(self):
+        '''Test that the repair command recomputes drifted counters'''
+        self.recipe.tags.add(self.tag)
+        Tag.objects.update(recipe_count=7)
+        UserSummary.objects.all().delete()
+
+        call_command('repair_counters', batch_size=1, stdout=StringIO())
+
+        self.assertCounts(1, 0)
+        summary = UserSummary.objects.get(user=self.user)
+        self.assertEqual((summary.recipe_count, summary.tag_count), (1, 1))
@@ -0,0 +1,59 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TransactionTestCase
+
+from core.dataversion import data_version
+from core.deletion import purge_user
+from core.models import Tag, Recipe
+
+
+class DataVersionTests(TransactionTestCase):
+
+    def test_version_changes_with_data(self):
+        '''Test that writes to the data of a user change its version'''
+        user = get_user_model().objects.create_user(
+            'test@apparanto.com',
+            'password 1234'
+        )
+        other = get_user_model().objects.create_user(
+            'other@apparanto.com',
+            'password 1234'
+        )
+        recipe = Recipe.objects.create(user=user, title='Soup',
+                                       time_minutes=5, price=5)
+        version = data_version(user.pk)
+        other_version = data_version(other.pk)
+
+        recipe.tags.add(Tag.objects.create(user=user, name='Vegan'))
+
+        self.assertNotEqual(data_version(user.pk), version)
+        self.assertEqual(data_version(other.pk), other_version)
+
+    def test_version_changes_on_purge(self):
+        '''Test that purging a user, e.g. from a job worker, bumps it'''
+        user = get_user_model().objects.create_user(
+            'test@apparanto.com',
+            'password 1234'
+        )
+        Recipe.objects.create(user=user, title='Soup', time_minutes=5,
+                              price=5)
+        version = data_version(user.pk)
+
+        purge_user(user)
+
+        self.assertNotEqual(data_version(user.pk), version)
+
+    def test_version_is_shared_between_processes(self):
+        '''Test that the version is stored in the database cache table'''
+        user = get_user_model().objects.create_user(
+            'test@apparanto.com',
+            'password 1234'
+        )
+        version = data_version(user.pk)
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT cache_key FROM django_cache '
+                           'WHERE cache_key = %s',
+                           [f':1:data-version:{user.pk}'])
+            self.assertIsNotNone(cursor.fetchone())
+        self.assertEqual(data_version(user.pk), version)
@@ -0,0 +1,95 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+
+from core import deletion
+from core.models import Tag, Ingredient, Recipe
+
+
+def create_user_data(email, recipes=3):
+    '''Create a user with tagged recipes'''
+    user = get_user_model().objects.create_user(email, 'password 1234')
+    tag = Tag.objects.create(user=user, name='Vegan')
+    ingredient = Ingredient.objects.create(user=user, name='Rice')
+    for i in range(recipes):
+        recipe = Recipe.objects.create(
+            user=user, title=f'Recipe {i}', time_minutes=10, price=5
+        )
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+    return user
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class DeletionTests(TestCase):
+
+    def test_purge_user(self):
+        '''Test that a user and all of its data are deleted'''
+        user = create_user_data('test@apparanto.com', recipes=5)
+        other = create_user_data('other@apparanto.com')
+
+        counts = deletion.purge_user(user, batch_size=2)
+
+        self.assertEqual(counts,
+                         {'recipes': 5, 'tags': 1, 'ingredients': 1})
+        self.assertFalse(get_user_model().objects.filter(pk=user.pk).exists())
+        self.assertEqual(Recipe.objects.count(), 3)
+        self.assertEqual(Tag.objects.get().user, other)
+        self.assertEqual(Recipe.tags.through.objects.count(), 3)
+        self.assertEqual(Recipe.ingredients.through.objects.count(), 3)
+
+    def test_purge_user_keeps_counters(self):
+        '''Test that purging decrements the counters of shared tags'''
+        user = create_user_data('test@apparanto.com', recipes=2)
+        other = create_user_data('other@apparanto.com', recipes=1)
+        tag = Tag.objects.get(user=other)
+        for recipe in Recipe.objects.filter(user=user):
+            recipe.tags.add(tag)
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 3)
+
+        deletion.purge_user(user)
+
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 1)
+
+    def test_purge_user_command(self):
+        '''Test the purge_user management command'''
+        create_user_data('test@apparanto.com')
+        out = StringIO()
+
+        call_command('purge_user', 'test@apparanto.com', stdout=out)
+
+        self.assertIn('3 recipes', out.getvalue())
+        self.assertEqual(get_user_model().objects.count(), 0)
+
+    def test_purge_unknown_user(self):
+        '''Test that purging an unknown user fails'''
+        with self.assertRaises(CommandError):
+            call_command('purge_user', 'nobody@apparanto.com')
+
+    def test_delete_files(self):
+        '''Test that the files of deleted recipes are removed'''
+        name = default_storage.save('uploads/recipe/x.jpg', ContentFile(b'x'))
+
+        deletion.delete_files([name])
+
+        self.assertFalse(os.path.exists(default_storage.path(name)))
+
+    def test_shared_files_are_kept(self):
+        '''Test that files still used by another recipe are not deleted'''
+        user = create_user_data('user@apparanto.com', recipes=2)
+        Recipe.objects.filter(user=user).update(image='uploads/recipe/a.jpg')
+
+        self.assertEqual(
+            deletion.unreferenced_files(['uploads/recipe/a.jpg',
+                                         'uploads/recipe/b.jpg']),
+            ['uploads/recipe/b.jpg']
+        )
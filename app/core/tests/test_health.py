@@ -0,0 +1,42 @@
+import tempfile
+from unittest.mock import Mock, patch
+
+from django.db.utils import OperationalError
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+
+
+@override_settings(MEDIA_ROOT=tempfile.gettempdir())
+class HealthEndpointTests(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+
+    def test_healthz(self):
+        '''Test that the liveness endpoint answers without a database'''
+        with self.assertNumQueries(0):
+            res = self.client.get(reverse('healthz'))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), {'status': 'ok'})
+
+    def test_readyz(self):
+        '''Test that the readiness endpoint checks the backing services'''
+        res = self.client.get(reverse('readyz'))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['checks'], {
+            'database': 'ok',
+            'cache': 'ok',
+            'storage': 'ok'
+        })
+
+    def test_readyz_database_down(self):
+        '''Test that the readiness endpoint fails without a database'''
+        check = Mock(side_effect=OperationalError)
+        with patch.dict('core.views.READINESS_CHECKS', database=check):
+            res = self.client.get(reverse('readyz'))
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.json()['checks']['database'],
+                         'error: OperationalError')
@@ -0,0 +1,164 @@
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import checks, idempotency
+from core.models import Recipe
+
+RECIPES_URL = reverse('recipe:recipe-list')
+CREATE_USER_URL = reverse('user:create')
+PAYLOAD = {'title': 'Soup', 'time_minutes': 5, 'price': '5.00',
+           'tags': [], 'ingredients': []}
+
+
+class IdempotencyTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@apparanto.com',
+            'password 1234'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, url, data, key, **kwargs):
+        kwargs.setdefault('format', 'json')
+        return self.client.post(url, data, HTTP_IDEMPOTENCY_KEY=key,
+                                **kwargs)
+
+    def test_retry_replays_response(self):
+        '''Test that a retried POST returns the first response'''
+        res1 = self.post(RECIPES_URL, PAYLOAD, 'key-1')
+        res2 = self.post(RECIPES_URL, PAYLOAD, 'key-1')
+
+        self.assertEqual(res1.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res2.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res2.data, res1.data)
+        self.assertEqual(res2['Idempotent-Replayed'], 'true')
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_requests_without_key_are_not_deduplicated(self):
+        '''Test that POSTs without a key all execute'''
+        self.client.post(RECIPES_URL, PAYLOAD, format='json')
+        self.client.post(RECIPES_URL, PAYLOAD, format='json')
+
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    def test_key_reused_for_other_body(self):
+        '''Test that reusing a key with another body is rejected'''
+        self.post(RECIPES_URL, PAYLOAD, 'key-1')
+        res = self.post(RECIPES_URL, dict(PAYLOAD, title='Stew'), 'key-1')
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_client_errors_are_not_stored(self):
+        '''Test that a key can be retried after a rejected request'''
+        res1 = self.post(RECIPES_URL, dict(PAYLOAD, price='free'), 'key-1')
+        res2 = self.post(RECIPES_URL, PAYLOAD, 'key-1')
+
+        self.assertEqual(res1.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res2.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', res2)
+
+    def test_list_body(self):
+        '''Test that bodies which are not objects can be fingerprinted'''
+        url = reverse('recipe:recipe-batch')
+
+        res = self.post(url, [1, 2], 'key-1')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_concurrent_duplicate(self):
+        '''Test that a duplicate of a running request gets a conflict'''
+        record_key = idempotency.store._key(self.user.pk, 'key-1')
+        cache.add(f'{record_key}:lock', 'x', 60)
+
+        res = self.post(RECIPES_URL, PAYLOAD, 'key-1')
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Recipe.objects.count(), 0)
+
+    def test_lock_is_shared_between_processes(self):
+        '''Test that the lock of a running request is in the cache table'''
+        record_key = idempotency.store.begin(self.user.pk, 'key-1', 'x')
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT cache_key FROM django_cache')
+            keys = [row[0] for row in cursor.fetchall()]
+
+        self.assertIn(f':1:{record_key}:lock', keys)
+        with self.assertRaises(idempotency.IdempotencyConflict):
+            idempotency.store.begin(self.user.pk, 'key-1', 'x')
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+    }})
+    def test_process_cache_is_reported(self):
+        '''Test that a per-process cache fails the shared cache check'''
+        messages = checks.shared_cache_check(None)
+
+        self.assertEqual([message.id for message in messages],
+                         ['core.W001'])
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+        }}):
+            self.assertEqual(checks.shared_cache_check(None), [])
+
+    def test_keys_are_scoped_to_the_user(self):
+        '''Test that users do not see each other's stored responses'''
+        self.post(RECIPES_URL, PAYLOAD, 'key-1')
+        other = get_user_model().objects.create_user(
+            'other@apparanto.com',
+            'password 1234'
+        )
+        self.client.force_authenticate(other)
+
+        res = self.post(RECIPES_URL, PAYLOAD, 'key-1')
+
+        self.assertNotIn('Idempotent-Replayed', res)
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    def test_upload_image_retry(self):
+        '''Test that a retried image upload is not processed again'''
+        recipe = Recipe.objects.create(user=self.user, title='Soup',
+                                       time_minutes=5, price=5)
+        url = reverse('recipe:recipe-upload_image', args=[recipe.id])
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            Image.new('RGB', (20, 20)).save(ntf, format='JPEG')
+            ntf.seek(0)
+            res1 = self.post(url, {'image': ntf}, 'key-1',
+                             format='multipart')
+            ntf.seek(0)
+            res2 = self.post(url, {'image': ntf}, 'key-1',
+                             format='multipart')
+
+        recipe.refresh_from_db()
+        self.addCleanup(recipe.image.delete)
+        self.assertEqual(res1.status_code, status.HTTP_200_OK)
+        self.assertEqual(res2['Idempotent-Replayed'], 'true')
+        self.assertEqual(res2.data['image'], res1.data['image'])
+
+    def test_create_user_retry(self):
+        '''Test that a retried sign up does not fail as a duplicate'''
+        self.client.force_authenticate(None)
+        payload = {'email': 'new@apparanto.com', 'password': 'test1234',
+                   'name': 'New'}
+
+        res1 = self.post(CREATE_USER_URL, payload, 'key-1')
+        res2 = self.post(CREATE_USER_URL, payload, 'key-1')
+
+        self.assertEqual(res1.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res2.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res2['Idempotent-Replayed'], 'true')
@@ -0,0 +1,114 @@
+import base64
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, \
+    override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APIClient
+
+from core import images, jobs
+from core.models import Job, Recipe
+
+
+def image_file(size, color, format='JPEG'):
+    file = ContentFile(b'', name='test.jpg')
+    Image.new('RGB', size, color).save(file, format=format)
+    file.seek(0)
+    return file
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ImageMetadataTests(TestCase):
+
+    def test_metadata(self):
+        '''Test the metadata computed from an image'''
+        image = Image.new('RGB', (300, 100), (0, 0, 255))
+        image.paste((255, 255, 255), (0, 0, 100, 100))
+        file = ContentFile(b'', name='test.png')
+        image.save(file, format='PNG')
+
+        values = images.metadata(file)
+
+        self.assertEqual(values['image_width'], 300)
+        self.assertEqual(values['image_height'], 100)
+        self.assertEqual(values['image_size'], file.size)
+        self.assertEqual(values['image_color'], '#0000ff')
+        self.assertLess(len(values['image_placeholder']), 1000)
+
+    def test_metadata_follows_exif_orientation(self):
+        '''Test that rotated photos are measured and drawn upright'''
+        image = Image.new('RGB', (300, 100), (0, 0, 255))
+        exif = Image.Exif()
+        exif[images.EXIF_ORIENTATION] = 6
+        file = ContentFile(b'', name='test.jpg')
+        image.save(file, format='JPEG', exif=exif.tobytes())
+
+        values = images.metadata(file)
+
+        self.assertEqual((values['image_width'], values['image_height']),
+                         (100, 300))
+        placeholder = Image.open(ContentFile(base64.b64decode(
+            values['image_placeholder'].split(',')[1]
+        )))
+        self.assertLess(placeholder.width, placeholder.height)
+
+    def test_index_images(self):
+        '''Test computing the metadata of existing images'''
+        user = get_user_model().objects.create_user(
+            'test@apparanto.com', 'password 1234'
+        )
+        name = default_storage.save('uploads/recipe/old.jpg',
+                                    image_file((10, 30), (0, 255, 0)))
+        for title in ('Curry', 'Curry copy'):
+            Recipe.objects.create(user=user, title=title, time_minutes=10,
+                                  price=5, image=name)
+        Recipe.objects.create(user=user, title='Broken', time_minutes=10,
+                              price=5, image='uploads/recipe/missing.jpg')
+        err = StringIO()
+
+        call_command('index_images', stdout=StringIO(), stderr=err)
+
+        self.assertEqual(
+            set(Recipe.objects.filter(image=name)
+                .values_list('image_width', 'image_height')),
+            {(10, 30)}
+        )
+        self.assertIn('missing.jpg', err.getvalue())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class DeferredImageMetadataTests(TransactionTestCase):
+    '''The job is queued once the upload is committed'''
+
+    def test_large_images_are_left_to_a_job(self):
+        '''Test that large images other than JPEG are not decoded inline'''
+        user = get_user_model().objects.create_user(
+            'test@apparanto.com', 'password 1234'
+        )
+        recipe = Recipe.objects.create(user=user, title='Curry',
+                                       time_minutes=10, price=5)
+        client = APIClient()
+        client.force_authenticate(user)
+        url = reverse('recipe:recipe-upload_image', args=[recipe.id])
+
+        with override_settings(IMAGE_INLINE_MAX_PIXELS=100):
+            res = client.post(url, {
+                'image': image_file((20, 20), (255, 0, 0), format='PNG')
+            }, format='multipart')
+
+        self.addCleanup(lambda: Recipe.objects.get().image.delete())
+        self.assertEqual(res.data['image_meta']['width'], 20)
+        self.assertEqual(res.data['image_meta']['placeholder'], '')
+        self.assertEqual(Job.objects.get().name, 'image_metadata')
+
+        jobs.run_pending()
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_color, '#ff0000')
+        self.assertTrue(recipe.image_placeholder)
@@ -0,0 +1,179 @@
+import os
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core import deletion, jobs
+from core.models import Job, Recipe
+
+calls = []
+
+
+@jobs.register('test_echo')
+def echo(payload):
+    calls.append(payload)
+    return {'echo': payload['value']}
+
+
+@jobs.register('test_slow')
+def slow(payload):
+    time.sleep(payload['seconds'])
+
+
+@jobs.register('test_fail')
+def fail(payload):
+    raise RuntimeError('boom')
+
+
+class JobTests(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_run_job(self):
+        '''Test that a queued job runs and stores its result'''
+        job = jobs.enqueue('test_echo', {'value': 1})
+
+        self.assertEqual(jobs.run_pending(), 1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.result, '{"echo": 1}')
+        self.assertEqual(calls, [{'value': 1}])
+
+    def test_enqueue_unknown_job(self):
+        '''Test that only registered jobs can be queued'''
+        with self.assertRaises(ValueError):
+            jobs.enqueue('unknown')
+
+    def test_idempotency_key(self):
+        '''Test that a job is queued once per idempotency key'''
+        job1 = jobs.enqueue('test_echo', {'value': 1}, idempotency_key='a')
+        job2 = jobs.enqueue('test_echo', {'value': 2}, idempotency_key='a')
+
+        self.assertEqual(job1.pk, job2.pk)
+        jobs.run_pending()
+        self.assertEqual(calls, [{'value': 1}])
+
+    def test_delayed_job(self):
+        '''Test that jobs do not run before they are due'''
+        jobs.enqueue('test_echo', {'value': 1}, delay=60)
+
+        self.assertEqual(jobs.run_pending(), 0)
+
+    @override_settings(JOB_RETRY_BASE_DELAY=10)
+    def test_retry_with_backoff(self):
+        '''Test that failed jobs are retried later, then marked failed'''
+        job = jobs.enqueue('test_fail', max_attempts=2)
+
+        with self.assertLogs('core.jobs', 'ERROR'):
+            self.assertEqual(jobs.run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertIn('boom', job.error)
+        self.assertGreater(job.run_at,
+                           timezone.now() + timedelta(seconds=4))
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('core.jobs', 'ERROR'):
+            jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    def test_claim_once(self):
+        '''Test that a claimed job is not handed to another worker'''
+        jobs.enqueue('test_echo', {'value': 1})
+
+        self.assertIsNotNone(jobs.claim('worker-1'))
+        self.assertIsNone(jobs.claim('worker-2'))
+
+    @override_settings(JOB_LOCK_TIMEOUT=60)
+    def test_stale_lock_is_released(self):
+        '''Test that jobs of a dead worker are claimed again'''
+        job = jobs.enqueue('test_echo', {'value': 1})
+        jobs.claim('worker-1')
+        Job.objects.filter(pk=job.pk).update(
+            locked_at=timezone.now() - timedelta(seconds=120)
+        )
+
+        job = jobs.claim('worker-2')
+
+        self.assertEqual(job.locked_by, 'worker-2')
+        self.assertEqual(job.attempts, 2)
+
+    @override_settings(JOB_LOCK_TIMEOUT=60)
+    def test_stale_lock_counts_as_attempt(self):
+        '''Test that a job whose worker keeps dying eventually fails'''
+        job = jobs.enqueue('test_echo', {'value': 1}, max_attempts=1)
+        jobs.claim('worker-1')
+        Job.objects.filter(pk=job.pk).update(
+            locked_at=timezone.now() - timedelta(seconds=120)
+        )
+
+        self.assertIsNone(jobs.claim('worker-2'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIn('stopped responding', job.error)
+
+    def test_heartbeat_refreshes_lock(self):
+        '''Test that a heartbeat only refreshes the lock of its worker'''
+        job = jobs.enqueue('test_echo', {'value': 1})
+        job = jobs.claim('worker-1')
+        old = timezone.now() - timedelta(seconds=120)
+        Job.objects.filter(pk=job.pk).update(locked_at=old)
+
+        self.assertEqual(jobs.heartbeat(job), 1)
+        job.refresh_from_db()
+        self.assertGreater(job.locked_at, old)
+        job.locked_by = 'worker-2'
+        self.assertEqual(jobs.heartbeat(job), 0)
+
+    @override_settings(JOB_HEARTBEAT_INTERVAL=0.01)
+    def test_running_job_sends_heartbeats(self):
+        '''Test that long running jobs keep their lock alive'''
+        jobs.enqueue('test_slow', {'seconds': 0.1})
+
+        with patch('core.jobs.heartbeat') as heartbeat:
+            jobs.run(jobs.claim('worker-1'))
+
+        self.assertGreater(heartbeat.call_count, 1)
+
+    def test_run_jobs_command(self):
+        '''Test that the worker command drains the queue with --once'''
+        jobs.enqueue('test_echo', {'value': 1})
+        jobs.enqueue('test_echo', {'value': 2})
+        out = StringIO()
+
+        with patch('time.sleep') as sleep:
+            call_command('run_jobs', '--once', stdout=out)
+
+        self.assertIn('Ran 2 jobs', out.getvalue())
+        sleep.assert_not_called()
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_delete_files_job(self):
+        '''Test that file cleanup runs as a job and keeps shared files'''
+        user = get_user_model().objects.create_user(
+            'test@apparanto.com', 'password 1234'
+        )
+        shared = default_storage.save('uploads/a.jpg', ContentFile(b'a'))
+        unused = default_storage.save('uploads/b.jpg', ContentFile(b'b'))
+        Recipe.objects.create(user=user, title='Soup', time_minutes=5,
+                              price=5, image=shared)
+
+        deletion.delete_files_later([shared, unused])
+        jobs.run_pending()
+
+        self.assertTrue(os.path.exists(default_storage.path(shared)))
+        self.assertFalse(os.path.exists(default_storage.path(unused)))
@@ -0,0 +1,92 @@
+import tempfile
+from urllib.parse import parse_qsl, urlsplit
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+
+from app.settings import parse_signing_keys
+from core import media
+
+KEYS = [('new', 'new secret'), ('old', 'old secret')]
+
+
+def params(url):
+    return dict(parse_qsl(urlsplit(url).query))
+
+
+@override_settings(MEDIA_SIGNING_KEYS=KEYS, MEDIA_URL_TTL=3600,
+                   MEDIA_URL_BUCKET=900)
+class SignedMediaTests(TestCase):
+
+    def test_signed_url(self):
+        '''Test that signed URLs verify until they expire'''
+        url = media.signed_url('uploads/recipe/a.jpg', now=1000)
+
+        self.assertTrue(url.startswith('/media/uploads/recipe/a.jpg?'))
+        self.assertEqual(params(url)['key'], 'new')
+        self.assertEqual(params(url)['expires'], '5400')
+        self.assertTrue(media.verify('uploads/recipe/a.jpg', params(url),
+                                     now=5400))
+        self.assertFalse(media.verify('uploads/recipe/a.jpg', params(url),
+                                      now=5401))
+        self.assertFalse(media.verify('uploads/recipe/b.jpg', params(url),
+                                      now=1000))
+
+    def test_urls_stable_within_bucket(self):
+        '''Test that URLs signed close together are identical'''
+        self.assertEqual(media.signed_url('a.jpg', now=1000),
+                         media.signed_url('a.jpg', now=1800))
+        self.assertNotEqual(media.signed_url('a.jpg', now=1000),
+                            media.signed_url('a.jpg', now=1801))
+
+    def test_key_rotation(self):
+        '''Test that URLs signed with a retired key fail once it is gone'''
+        with override_settings(MEDIA_SIGNING_KEYS=KEYS[1:]):
+            url = media.signed_url('a.jpg', now=1000)
+
+        self.assertTrue(media.verify('a.jpg', params(url), now=1000))
+        with override_settings(MEDIA_SIGNING_KEYS=KEYS[:1]):
+            self.assertFalse(media.verify('a.jpg', params(url), now=1000))
+
+    def test_invalid_params(self):
+        '''Test that malformed signatures are rejected'''
+        for query in ({}, {'key': 'new', 'expires': 'soon'},
+                      {'key': 'new', 'expires': '9999999999',
+                       'signature': 'forged'},
+                      {'key': 'new', 'expires': '9999999999',
+                       'signature': '\u00e9'}):
+            self.assertFalse(media.verify('a.jpg', query, now=1000))
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_media_view(self):
+        '''Test that media files are only served with a valid signature'''
+        name = default_storage.save('uploads/recipe/a.jpg',
+                                    ContentFile(b'image'))
+        url = media.signed_url(name)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(url)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(b''.join(res.streaming_content), b'image')
+        self.assertIn('private', res['Cache-Control'])
+        self.assertEqual(self.client.get('/media/' + name).status_code, 403)
+        forged = url.replace('signature=', 'signature=%C3%A9')
+        self.assertEqual(self.client.get(forged).status_code, 403)
+
+
+class SigningKeysSettingTests(TestCase):
+
+    def test_parse_signing_keys(self):
+        '''Test that the keys are parsed in order'''
+        self.assertEqual(parse_signing_keys('new:a:b, old:c'),
+                         [('new', 'a:b'), ('old', 'c')])
+
+    def test_invalid_signing_keys(self):
+        '''Test that malformed keys are rejected with a clear message'''
+        for value in ['secret', 'new:', ':secret', 'new:a,b', 'a:1,a:2',
+                      'new:a,']:
+            with self.assertRaises(ImproperlyConfigured, msg=value):
+                parse_signing_keys(value)
@@ -0,0 +1,66 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from core.pagination import CountModePaginator, count_rows
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class CountTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@apparanto.com',
+            'password 1234'
+        )
+        Recipe.objects.bulk_create([
+            Recipe(user=self.user, title=f'Recipe {i}', time_minutes=5,
+                   price=5)
+            for i in range(5)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_count_modes(self):
+        '''Test the exact, capped, estimated and none count modes'''
+        recipes = Recipe.objects.all()
+
+        self.assertEqual(count_rows(recipes, 'exact', 3), (5, True))
+        self.assertEqual(count_rows(recipes, 'capped', 3), (3, False))
+        self.assertEqual(count_rows(recipes, 'capped', 10), (5, True))
+        self.assertEqual(count_rows(recipes, 'none', 3), (None, False))
+        # Without planner estimates the count is exact
+        self.assertEqual(count_rows(recipes, 'estimated', 3), (5, True))
+
+    @override_settings(PAGINATION_COUNT_CAP=3)
+    def test_paginated_list_counts(self):
+        '''Test the count of paginated recipe lists'''
+        res = self.client.get(RECIPES_URL, {'page_size': 2})
+        self.assertEqual(res.data['count'], '3+')
+        self.assertFalse(res.data['count_exact'])
+
+        res = self.client.get(RECIPES_URL, {'page_size': 2,
+                                            'count': 'exact'})
+        self.assertEqual(res.data['count'], 5)
+        self.assertTrue(res.data['count_exact'])
+
+        res = self.client.get(RECIPES_URL, {'page_size': 2,
+                                            'count': 'none'})
+        self.assertIsNone(res.data['count'])
+
+        res = self.client.get(RECIPES_URL, {'page_size': 2,
+                                            'count': 'all'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(ADMIN_COUNT_MODE='none', ADMIN_COUNT_CAP=3)
+    def test_admin_paginator(self):
+        '''Test that admin changelists count with the admin mode'''
+        paginator = CountModePaginator(Recipe.objects.order_by('id'), 2)
+
+        self.assertEqual(paginator.count, 3)
+        self.assertEqual(paginator.num_pages, 2)
@@ -0,0 +1,73 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import perf
+from core.models import Recipe
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class PerformanceMiddlewareTests(TestCase):
+
+    def setUp(self):
+        perf.registry.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@apparanto.com',
+            'password 1234'
+        )
+        self.client.force_authenticate(self.user)
+        Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=10, price=5
+        )
+
+    @override_settings(PERF_SAMPLE_RATE=1)
+    def test_server_timing_header(self):
+        '''Test that sampled requests report their timings'''
+        res = self.client.get(RECIPES_URL)
+
+        timing = res['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries"')
+        for section in ('serializer', 'render', 'total'):
+            self.assertIn(f'{section};dur=', timing)
+
+    @override_settings(PERF_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_instrumented(self):
+        '''Test that requests outside the sample are left alone'''
+        res = self.client.get(RECIPES_URL)
+
+        self.assertFalse(res.has_header('Server-Timing'))
+
+    @override_settings(PERF_SAMPLE_RATE=1)
+    def test_metrics_endpoint(self):
+        '''Test that per-endpoint histograms are exported'''
+        self.client.get(RECIPES_URL)
+
+        res = self.client.get(reverse('metrics'))
+
+        self.assertEqual(res.status_code, 200)
+        body = res.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn(
+            'http_request_db_queries_count{endpoint="recipe:recipe-list"} 1',
+            body
+        )
+
+
+class RequestMetricsTests(TestCase):
+
+    def test_duplicate_queries(self):
+        '''Test that repeated statements are detected'''
+        metrics = perf.RequestMetrics()
+
+        def execute(sql, params, many, context):
+            return None
+
+        for params in ([1], [1], [2]):
+            metrics.execute_wrapper(execute, 'SELECT %s', params, False, {})
+
+        self.assertEqual(metrics.queries, 3)
+        self.assertEqual(metrics.duplicate_queries, 1)
@@ -0,0 +1,108 @@
+import json
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from core.management.commands import compare_servers
+from core.models import Tag, Ingredient, Recipe, Job
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class PerfCommandTests(TestCase):
+
+    def seed(self, **options):
+        defaults = {
+            'users': 2,
+            'recipes_per_user': 3,
+            'distribution': 'fixed',
+            'tags_per_user': 4,
+            'ingredients_per_user': 5,
+            'tags_per_recipe': 2,
+            'ingredients_per_recipe': 3,
+            'image_ratio': 0.5,
+            'stdout': StringIO(),
+        }
+        defaults.update(options)
+        call_command('seed_perf_data', **defaults)
+
+    def test_seed_perf_data(self):
+        '''Test that the requested distribution of data is generated'''
+        self.seed()
+
+        self.assertEqual(get_user_model().objects.count(), 2)
+        self.assertEqual(Tag.objects.count(), 8)
+        self.assertEqual(Ingredient.objects.count(), 10)
+        self.assertEqual(Recipe.objects.count(), 6)
+        for recipe in Recipe.objects.all():
+            self.assertEqual(recipe.tags.count(), 2)
+            self.assertEqual(recipe.ingredients.count(), 3)
+            self.assertEqual(recipe.tags.exclude(user=recipe.user).count(), 0)
+        for tag in Tag.objects.all():
+            self.assertEqual(tag.recipe_count, tag.recipe_set.count())
+        self.assertEqual(
+            [user.summary.recipe_count
+             for user in get_user_model().objects.all()],
+            [3, 3]
+        )
+
+    def test_seed_perf_data_skips_existing_users(self):
+        '''Test that seeding twice does not duplicate the data'''
+        self.seed()
+        self.seed()
+
+        self.assertEqual(Recipe.objects.count(), 6)
+
+    def test_benchmark_api(self):
+        '''Test that every route is benchmarked and cleaned up after'''
+        self.seed(users=1)
+        out = StringIO()
+
+        call_command('benchmark_api', iterations=2, stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertIn('GET recipe:recipe-list', report['results'])
+        self.assertIn('POST recipe:recipe-upload_image', report['results'])
+        for name in ['GET recipe:recipe-batch', 'POST recipe:recipe-clone',
+                     'POST recipe:recipe-bulk_clone',
+                     'GET recipe:recipe-similar',
+                     'GET recipe:recipe-shopping_list', 'DELETE user:me',
+                     'GET job:job-status']:
+            self.assertIn(name, report['results'])
+        for name, result in report['results'].items():
+            self.assertEqual(result['errors'], 0, name)
+            self.assertIsNotNone(result['p99_ms'])
+        self.assertEqual(Recipe.objects.count(), 3)
+        self.assertEqual(get_user_model().objects.count(), 1)
+        self.assertEqual(Job.objects.count(), 0)
+
+    def test_compare_servers(self):
+        '''Test that both interfaces are served and benchmarked'''
+        result = {'p50_ms': 1, 'p95_ms': 2, 'throughput_rps': 3,
+                  'errors': 0}
+
+        def benchmark(name, **options):
+            self.assertEqual(name, 'benchmark_api')
+            self.assertEqual(options['url'], 'http://127.0.0.1:8100')
+            with open(options['output'], 'w') as output:
+                json.dump({'results': {'GET recipe:tag-list': result}},
+                          output)
+
+        out = StringIO()
+        with patch.object(compare_servers.subprocess, 'Popen') as popen, \
+                patch.object(compare_servers, 'wait_for_port',
+                             return_value=True), \
+                patch.object(compare_servers, 'call_command', benchmark):
+            call_command('compare_servers', stdout=out)
+
+        commands = [call[0][0] for call in popen.call_args_list]
+        self.assertEqual(commands[0][-3:],
+                         ['--interface', 'wsgi', 'app.wsgi:application'])
+        self.assertEqual(commands[1][-1], 'app.asgi:application')
+        env = popen.call_args[1]['env']
+        self.assertEqual(env['THROTTLE_USER_RATE'], '1000000/min')
+        self.assertEqual(popen.return_value.terminate.call_count, 2)
+        self.assertIn('GET recipe:tag-list', out.getvalue())
@@ -0,0 +1,81 @@
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from core.backends.pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+
+    def test_connections_are_reused(self):
+        '''Test that a returned connection is handed out again'''
+        pool = ConnectionPool(FakeConnection, max_size=2)
+        conn = pool.getconn()
+        pool.putconn(conn)
+
+        self.assertIs(pool.getconn(), conn)
+        self.assertEqual(pool.stats()['connections_opened'], 1)
+
+    def test_min_size_opens_connections_upfront(self):
+        '''Test that the pool is filled up to its minimum size'''
+        pool = ConnectionPool(FakeConnection, min_size=2, max_size=4)
+
+        stats = pool.stats()
+        self.assertEqual(stats['size'], 2)
+        self.assertEqual(stats['idle'], 2)
+
+    def test_timeout_when_exhausted(self):
+        '''Test that checking out of an exhausted pool times out'''
+        pool = ConnectionPool(FakeConnection, max_size=1, timeout=0.01)
+        pool.getconn()
+
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def test_failed_ping_discards_connection(self):
+        '''Test that idle connections failing the pre-ping are replaced'''
+        def ping(conn):
+            if conn.closed:
+                raise RuntimeError('gone')
+
+        pool = ConnectionPool(FakeConnection, max_size=1, ping=ping)
+        conn = pool.getconn()
+        pool.putconn(conn)
+        conn.closed = True
+
+        self.assertIsNot(pool.getconn(), conn)
+        self.assertEqual(pool.stats()['connections_discarded'], 1)
+
+    @patch('time.monotonic')
+    def test_expired_connections_are_recycled(self, monotonic):
+        '''Test that connections past their lifetime are closed'''
+        monotonic.return_value = 0
+        pool = ConnectionPool(FakeConnection, max_lifetime=60)
+        conn = pool.getconn()
+        monotonic.return_value = 61
+        pool.putconn(conn)
+
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()['size'], 0)
+
+    def test_failed_reset_discards_connection(self):
+        '''Test that connections which can not be reset are not reused'''
+        def reset(conn):
+            raise RuntimeError('broken')
+
+        pool = ConnectionPool(FakeConnection, reset=reset)
+        conn = pool.getconn()
+        pool.putconn(conn)
+
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()['idle'], 0)
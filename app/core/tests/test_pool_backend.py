@@ -0,0 +1,89 @@
+from django.test import SimpleTestCase
+from psycopg2 import ProgrammingError, extensions
+
+from core.backends.pool import ConnectionPool
+from core.backends.postgresql_pool.base import _ping, _reset
+
+
+class TransactionalCursor:
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def execute(self, sql):
+        if not self.conn.autocommit:
+            self.conn.status = extensions.TRANSACTION_STATUS_INTRANS
+
+
+class TransactionalConnection:
+    '''Connection tracking its transaction state the way psycopg2 does
+
+    New connections are not in autocommit mode, so any query opens a
+    transaction, and the autocommit mode can not change inside one.
+    '''
+
+    def __init__(self):
+        self.closed = False
+        self._autocommit = False
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    @property
+    def autocommit(self):
+        return self._autocommit
+
+    @autocommit.setter
+    def autocommit(self, value):
+        if self.status != extensions.TRANSACTION_STATUS_IDLE:
+            raise ProgrammingError(
+                'set_session cannot be used inside a transaction'
+            )
+        self._autocommit = value
+
+    def cursor(self):
+        return TransactionalCursor(self)
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = True
+
+
+class PoolBackendTests(SimpleTestCase):
+
+    def make_pool(self, **kwargs):
+        return ConnectionPool(TransactionalConnection, ping=_ping,
+                              reset=_reset, **kwargs)
+
+    def test_prewarmed_connection_leaves_ping_idle(self):
+        '''Test that a pre-pinged new connection accepts autocommit'''
+        pool = self.make_pool(min_size=1, max_size=1)
+
+        conn = pool.getconn()
+        conn.autocommit = True
+
+        self.assertEqual(conn.status, extensions.TRANSACTION_STATUS_IDLE)
+
+    def test_connection_returned_in_transaction(self):
+        '''Test that a connection left inside a transaction is reset'''
+        pool = self.make_pool(max_size=1)
+        conn = pool.getconn()
+        conn.autocommit = False
+        conn.cursor().execute('INSERT ...')
+
+        pool.putconn(conn)
+        reused = pool.getconn()
+
+        self.assertIs(reused, conn)
+        self.assertTrue(reused.autocommit)
+        self.assertEqual(reused.status, extensions.TRANSACTION_STATUS_IDLE)
+        reused.autocommit = True
@@ -0,0 +1,134 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.backends.db import BaseDatabaseCache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core import routers
+from core.models import Recipe
+
+TAGS_URL = reverse('recipe:tag-list')
+
+
+@override_settings(REPLICA_DATABASES=['replica_0', 'replica_1'],
+                   REPLICA_MAX_LAG=2, REPLICA_LAG_CHECK_INTERVAL=60)
+class ReplicaRouterTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        routers._lag.clear()
+        self.router = routers.ReplicaRouter()
+
+    @patch('core.routers._measure_lag', return_value=0)
+    def test_reads_use_primary_by_default(self, measure_lag):
+        '''Test that reads outside replica blocks go to the primary'''
+        self.assertIsNone(self.router.db_for_read(Recipe))
+
+    @patch('core.routers._measure_lag', return_value=0)
+    def test_reads_use_replica_in_block(self, measure_lag):
+        '''Test that reads in a replica block go to a replica'''
+        with routers.replica_reads(1):
+            alias = self.router.db_for_read(Recipe)
+
+        self.assertIn(alias, ['replica_0', 'replica_1'])
+        self.assertEqual(self.router.db_for_write(Recipe), 'default')
+
+    @patch('core.routers._measure_lag', return_value=0)
+    def test_pinned_user_reads_from_primary(self, measure_lag):
+        '''Test that a user reads from the primary right after a write'''
+        routers.pin_to_primary(1)
+
+        with routers.replica_reads(1):
+            self.assertIsNone(self.router.db_for_read(Recipe))
+        with routers.replica_reads(2):
+            self.assertIsNotNone(self.router.db_for_read(Recipe))
+
+    def test_lagging_replica_is_skipped(self):
+        '''Test that replicas behind the maximum lag get no reads'''
+        lags = {'replica_0': 30, 'replica_1': 0.5}
+        with patch('core.routers._measure_lag', side_effect=lags.get):
+            with routers.replica_reads(1):
+                aliases = {self.router.db_for_read(Recipe) for _ in range(10)}
+
+        self.assertEqual(aliases, {'replica_1'})
+
+    def test_lag_is_measured_once_per_interval(self):
+        '''Test that the replica lag measurement is cached'''
+        with patch('core.routers._measure_lag', return_value=0) as measure:
+            routers.replica_lag('replica_0')
+            routers.replica_lag('replica_0')
+
+        self.assertEqual(measure.call_count, 1)
+
+    def test_no_migrations_on_replicas(self):
+        '''Test that migrations only run on the primary'''
+        self.assertTrue(self.router.allow_migrate('default', 'core'))
+        self.assertFalse(self.router.allow_migrate('replica_0', 'core'))
+
+    @patch('core.routers._measure_lag', return_value=0)
+    def test_cache_reads_use_primary(self, measure_lag):
+        '''Test that the database cache, holding the pins, never lags'''
+        cache_model = BaseDatabaseCache('django_cache', {}).cache_model_class
+
+        with routers.replica_reads(1):
+            self.assertIsNone(self.router.db_for_read(cache_model))
+
+
+@override_settings(REPLICA_DATABASES=['replica_0'])
+class ReplicaReadViewTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@apparanto.com', 'password 1234'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.routed = []
+
+    def get_tags(self):
+        '''List the tags, recording where the router sends the reads
+
+        The reads still run on the primary, no replica exists in tests.
+        '''
+        route = routers.ReplicaRouter.db_for_read
+
+        def record(router, model, **hints):
+            if model._meta.app_label == 'core':
+                self.routed.append(route(router, model, **hints))
+
+        with patch('core.routers.healthy_replicas',
+                   return_value=['replica_0']), \
+                patch.object(routers.ReplicaRouter, 'db_for_read',
+                             autospec=True, side_effect=record):
+            return self.client.get(TAGS_URL)
+
+    def test_reads_go_to_replica(self):
+        '''Test that list requests are routed to a replica'''
+        self.get_tags()
+
+        self.assertEqual(self.routed, ['replica_0'])
+
+    def test_read_after_write_goes_to_primary(self):
+        '''Test that a user reads from the primary right after a POST'''
+        self.client.post(TAGS_URL, {'name': 'Vegan'})
+
+        res = self.get_tags()
+
+        self.assertEqual([tag['name'] for tag in res.data], ['Vegan'])
+        self.assertTrue(self.routed)
+        self.assertEqual(set(self.routed), {None})
+
+    def test_pin_is_shared_between_processes(self):
+        '''Test that the pin is stored in the database cache table'''
+        self.client.post(TAGS_URL, {'name': 'Vegan'})
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT cache_key FROM django_cache')
+            keys = [row[0] for row in cursor.fetchall()]
+
+        self.assertIn(f':1:replica-pin:{self.user.pk}', keys)
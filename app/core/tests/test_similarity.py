@@ -0,0 +1,114 @@
+import json
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from core import jobs, similarity
+from core.cloning import clone_recipes
+from core.deletion import delete_recipe_attr
+from core.models import Tag, Ingredient, Recipe, RecipeBucket, \
+    RecipeSignature
+
+
+class SimilarityTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@apparanto.com',
+            'password 1234'
+        )
+        self.tags = [Tag.objects.create(user=self.user, name=f'Tag {i}')
+                     for i in range(10)]
+
+    def recipe(self, tags, title='Recipe'):
+        recipe = Recipe.objects.create(user=self.user, title=title,
+                                       time_minutes=5, price=5)
+        recipe.tags.set([self.tags[i] for i in tags])
+        return recipe
+
+    def test_estimate(self):
+        '''Test that signatures estimate the Jaccard similarity'''
+        features1 = {f'f{i}' for i in range(100)}
+        features2 = {f'f{i}' for i in range(50, 150)}
+
+        estimate = similarity.estimate(similarity.signature(features1),
+                                       similarity.signature(features2))
+
+        self.assertAlmostEqual(estimate, 1 / 3, delta=0.15)
+        self.assertIsNone(similarity.signature(set()))
+
+    def test_index_follows_relations(self):
+        '''Test that the index is maintained when relations change'''
+        recipe = self.recipe([0, 1, 2])
+
+        self.assertTrue(RecipeSignature.objects.filter(recipe=recipe)
+                        .exists())
+        self.assertEqual(RecipeBucket.objects.filter(recipe=recipe).count(),
+                         16)
+
+        recipe.tags.clear()
+        self.assertFalse(RecipeBucket.objects.filter(recipe=recipe)
+                         .exists())
+
+    def test_similar(self):
+        '''Test that similar recipes are ranked by similarity'''
+        recipe = self.recipe([0, 1, 2, 3])
+        same = self.recipe([0, 1, 2, 3])
+        close = self.recipe([0, 1, 2, 4])
+        self.recipe([5, 6, 7, 8])
+
+        found = similarity.similar(recipe, 10)
+
+        self.assertEqual(found[0], (same.id, 1.0))
+        self.assertEqual(found[1][0], close.id)
+        self.assertEqual(len(found), 2)
+        self.assertEqual(
+            [pk for pk, _ in similarity.exact_similar(recipe, 10)],
+            [same.id, close.id]
+        )
+
+    def test_reverse_relation_changes(self):
+        '''Test that changes from the tag side update the index'''
+        recipe = self.recipe([0, 1])
+        before = RecipeSignature.objects.get(recipe=recipe).signature
+
+        self.tags[2].recipe_set.add(recipe)
+
+        after = RecipeSignature.objects.get(recipe=recipe).signature
+        self.assertNotEqual(bytes(before), bytes(after))
+
+    def test_clone_and_delete_keep_index(self):
+        '''Test that clones are indexed and deleted tags unindexed'''
+        recipe = self.recipe([0, 1])
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Rice')
+        )
+
+        clone_id = clone_recipes(self.user, [recipe.id])[recipe.id]
+        self.assertEqual(similarity.similar(recipe, 10), [(clone_id, 1.0)])
+
+        before = RecipeSignature.objects.get(recipe=recipe).signature
+        delete_recipe_attr(self.tags[0])
+        jobs.run_pending()
+        after = RecipeSignature.objects.get(recipe=recipe).signature
+        self.assertNotEqual(bytes(before), bytes(after))
+
+    def test_commands(self):
+        '''Test rebuilding the index and benchmarking it'''
+        self.recipe([0, 1, 2])
+        self.recipe([0, 1, 3])
+        RecipeSignature.objects.all().delete()
+        RecipeBucket.objects.all().delete()
+        out = StringIO()
+
+        call_command('index_similarity', stdout=out)
+        self.assertIn('Indexed 2 recipes', out.getvalue())
+
+        out = StringIO()
+        call_command('benchmark_similarity', '--email', self.user.email,
+                     stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['samples'], 2)
+        self.assertEqual(report['recall_mean'], 1)
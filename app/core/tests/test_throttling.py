@@ -0,0 +1,150 @@
+import tempfile
+import time
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, ThrottleBucket
+from core.throttling import TokenBucketStore
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def rates(**overrides):
+    '''Return REST_FRAMEWORK settings with some throttle rates replaced'''
+    config = dict(settings.REST_FRAMEWORK)
+    config['DEFAULT_THROTTLE_RATES'] = dict(
+        config['DEFAULT_THROTTLE_RATES'], **overrides
+    )
+    return config
+
+
+class TokenBucketStoreTests(TestCase):
+
+    def setUp(self):
+        self.store = TokenBucketStore()
+        self.now = time.time()
+
+    def test_bucket_allows_bursts_then_denies(self):
+        '''Test that a bucket allows its capacity and then denies'''
+        with patch('time.time', return_value=self.now):
+            results = [self.store.consume('k', 3, 1)['allowed']
+                       for _ in range(4)]
+
+        self.assertEqual(results, [True, True, True, False])
+
+    def test_bucket_refills_over_time(self):
+        '''Test that tokens come back at the refill rate'''
+        with patch('time.time', return_value=self.now):
+            for _ in range(3):
+                self.store.consume('k', 3, 1)
+            denied = self.store.consume('k', 3, 1)
+        with patch('time.time', return_value=self.now + 2):
+            allowed = self.store.consume('k', 3, 1)
+
+        self.assertEqual(denied['retry_after'], 1)
+        self.assertTrue(allowed['allowed'])
+        self.assertEqual(allowed['remaining'], 1)
+
+    def test_bucket_is_one_row(self):
+        '''Test that a bucket is kept in a single row'''
+        self.store.consume('k', 3, 1)
+        # The savepoint guards the transaction of the test case
+        with self.assertNumQueries(3):
+            self.store.consume('k', 3, 1)
+
+        bucket = ThrottleBucket.objects.get()
+        self.assertEqual(bucket.key, 'k')
+        self.assertAlmostEqual(bucket.tokens, 1, places=2)
+
+    def test_expired_buckets_are_pruned(self):
+        '''Test that buckets refilled long ago are deleted now and then'''
+        with patch('time.time', return_value=self.now - 10):
+            self.store.consume('old', 3, 1)
+        self.store.PRUNE_PROBABILITY = 1
+
+        self.store.consume('new', 3, 1)
+
+        self.assertEqual(
+            list(ThrottleBucket.objects.values_list('key', flat=True)),
+            ['new']
+        )
+
+    @patch('core.throttling._upsert_sql')
+    def test_falls_back_to_process_when_database_fails(self, upsert_sql):
+        '''Test that buckets are kept in process when the database fails'''
+        upsert_sql.return_value = 'SELECT * FROM missing_table'
+
+        with patch('time.time', return_value=1000):
+            results = [self.store.consume('k', 2, 1)['allowed']
+                       for _ in range(3)]
+
+        self.assertEqual(results, [True, True, False])
+        self.assertFalse(ThrottleBucket.objects.exists())
+
+
+class ThrottleApiTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@apparanto.com',
+            'password 1234'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_rate_limit_headers(self):
+        '''Test that responses report the most restrictive budget'''
+        with override_settings(REST_FRAMEWORK=rates(recipes='5/min')):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res['RateLimit-Limit'], '5')
+        self.assertEqual(res['RateLimit-Remaining'], '4')
+
+    def test_endpoint_budget_exhausted(self):
+        '''Test that a client is throttled after its endpoint budget'''
+        with override_settings(REST_FRAMEWORK=rates(recipes='2/min')):
+            statuses = [self.client.get(RECIPES_URL).status_code
+                        for _ in range(3)]
+            tags = self.client.get(reverse('recipe:tag-list'))
+
+        self.assertEqual(statuses[-1], status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(tags.status_code, status.HTTP_200_OK)
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_upload_budget_is_separate(self):
+        '''Test that image uploads have their own budget'''
+        recipe = Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=10, price=5
+        )
+        url = reverse('recipe:recipe-upload_image', args=[recipe.id])
+        with override_settings(REST_FRAMEWORK=rates(uploads='1/hour')):
+            codes = []
+            for _ in range(2):
+                with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+                    Image.new('RGB', (10, 10)).save(ntf, format='JPEG')
+                    ntf.seek(0)
+                    codes.append(self.client.post(
+                        url, {'image': ntf}, format='multipart'
+                    ).status_code)
+            listing = self.client.get(RECIPES_URL)
+
+        self.assertEqual(codes, [200, 429])
+        self.assertEqual(listing.status_code, status.HTTP_200_OK)
+
+    def test_token_budget(self):
+        '''Test that token requests are throttled per client address'''
+        client = APIClient()
+        payload = {'email': 'test@apparanto.com', 'password': 'wrong'}
+        with override_settings(REST_FRAMEWORK=rates(token='2/min')):
+            codes = [client.post(reverse('user:token'), payload).status_code
+                     for _ in range(3)]
+
+        self.assertEqual(codes, [400, 400, 429])
@@ -0,0 +1,125 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import LiveServerTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.management.commands.replay_traffic import Command as Replay
+from core.middleware import body_shape
+from core.models import Recipe
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def capture_file():
+    handle, path = tempfile.mkstemp(suffix='.jsonl')
+    os.close(handle)
+    return path
+
+
+def read_records(path):
+    with open(path) as capture:
+        return [json.loads(line) for line in capture]
+
+
+class TrafficCaptureTests(TestCase):
+
+    def setUp(self):
+        self.path = capture_file()
+        self.user = get_user_model().objects.create_user(
+            'test@apparanto.com',
+            'password 1234'
+        )
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_body_shape(self):
+        '''Test that body shapes keep the structure but not the values'''
+        shape = body_shape({'title': 'Curry', 'tags': [1, 2], 'link': None})
+
+        self.assertEqual(shape, {
+            'title': 'str', 'tags': ['int', 'int'], 'link': 'null'
+        })
+
+    def test_requests_are_captured_sanitized(self):
+        '''Test that captured records hold no credentials or values'''
+        with override_settings(TRAFFIC_CAPTURE_FILE=self.path):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            client.post(RECIPES_URL, {
+                'title': 'Secret sauce', 'time_minutes': 5, 'price': '1.00',
+                'tags': [], 'ingredients': []
+            }, format='json')
+            client.get(RECIPES_URL, {'token': 'abc', 'tags': '1'})
+
+        create, listing = read_records(self.path)
+        self.assertEqual(create['method'], 'POST')
+        self.assertEqual(create['endpoint'], 'recipe:recipe-list')
+        self.assertEqual(create['subject'], self.user.pk)
+        self.assertEqual(create['status'], 201)
+        self.assertEqual(create['body']['title'], 'str')
+        self.assertNotIn('Secret sauce', json.dumps(create))
+        self.assertEqual(listing['query'], {'token': '***', 'tags': '1'})
+
+    def test_replayed_paths_are_quoted(self):
+        '''Test that decoded paths are quoted again for the request line'''
+        target, _, _ = Replay().prepare({
+            'path': '/api/recipe/tags/caf\u00e9 au lait/',
+            'query': {'q': 'a b'}, 'subject': None,
+        }, {})
+
+        self.assertEqual(target,
+                         '/api/recipe/tags/caf%C3%A9%20au%20lait/?q=a+b')
+
+    def test_capture_disabled_by_default(self):
+        '''Test that nothing is captured without a capture file'''
+        with override_settings(TRAFFIC_CAPTURE_FILE=None):
+            APIClient().get(RECIPES_URL)
+
+        self.assertEqual(read_records(self.path), [])
+
+
+class TrafficReplayTests(LiveServerTestCase):
+
+    def setUp(self):
+        self.path = capture_file()
+        self.user = get_user_model().objects.create_user(
+            'test@apparanto.com',
+            'password 1234'
+        )
+        Token.objects.create(user=self.user)
+        Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=10, price=5
+        )
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_replay_captured_traffic(self):
+        '''Test that captured requests are replayed with the user tokens'''
+        with override_settings(TRAFFIC_CAPTURE_FILE=self.path):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            for _ in range(3):
+                client.get(RECIPES_URL)
+            client.post(RECIPES_URL, {'title': 'x'}, format='json')
+            APIClient().get(RECIPES_URL)
+        out = StringIO()
+
+        call_command('replay_traffic', self.path, url=self.live_server_url,
+                     speedup=0, stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['requests'], 4)
+        listing = report['endpoints']['GET recipe:recipe-list']
+        self.assertEqual(listing['requests'], 4)
+        self.assertEqual(listing['errors'], 1)
+        self.assertIsNotNone(listing['p95_ms'])
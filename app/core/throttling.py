@@ -0,0 +1,182 @@
+import contextlib
+import math
+import random
+import threading
+import time
+
+from django.db import connections, router, transaction
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from core.models import ThrottleBucket
+
+
+def _upsert_sql(connection):
+    '''Return the statement taking a token from a ThrottleBucket row
+
+    The refill, the take and the write happen in a single INSERT ... ON
+    CONFLICT DO UPDATE, so concurrent requests never wait on each other
+    and can not both spend the last token.
+    '''
+    qn = connection.ops.quote_name
+    table = qn(ThrottleBucket._meta.db_table)
+    key, tokens, capacity, rate, allowed, updated, expires = map(qn, [
+        'key', 'tokens', 'capacity', 'rate', 'allowed', 'updated', 'expires'
+    ])
+    elapsed = (f'CASE WHEN excluded.{updated} > {table}.{updated} '
+               f'THEN excluded.{updated} - {table}.{updated} ELSE 0 END')
+    level = f'{table}.{tokens} + ({elapsed}) * excluded.{rate}'
+    refilled = (f'CASE WHEN {level} > excluded.{capacity} '
+                f'THEN excluded.{capacity} ELSE {level} END')
+    return (
+        f'INSERT INTO {table} ({key}, {tokens}, {capacity}, {rate}, '
+        f'{allowed}, {updated}, {expires}) '
+        f'VALUES (%s, %s, %s, %s, %s, %s, %s) '
+        f'ON CONFLICT ({key}) DO UPDATE SET '
+        f'{tokens} = CASE WHEN {refilled} >= 1 '
+        f'THEN {refilled} - 1 ELSE {refilled} END, '
+        f'{allowed} = {refilled} >= 1, '
+        f'{capacity} = excluded.{capacity}, {rate} = excluded.{rate}, '
+        f'{updated} = excluded.{updated}, {expires} = excluded.{expires} '
+        f'RETURNING {tokens}, {allowed}'
+    )  # nosec
+
+
+class TokenBucketStore:
+    '''Token buckets kept in ThrottleBucket rows of the primary database
+
+    Every request takes its token with one atomic statement, the buckets
+    live outside of the cache so they never evict other cache entries.
+    Only when the database fails is the bucket kept in this process.
+    '''
+    # Share of requests that also delete the buckets refilled long ago
+    PRUNE_PROBABILITY = 0.001
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = {}
+
+    def _take(self, state, capacity, rate, now):
+        tokens, updated = state if state else (capacity, now)
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        return allowed, (tokens, now)
+
+    def _result(self, allowed, state, capacity, rate):
+        tokens = state[0]
+        return {
+            'allowed': allowed,
+            'limit': capacity,
+            'remaining': int(tokens),
+            'reset': math.ceil((capacity - tokens) / rate),
+            'retry_after': 0 if allowed else math.ceil((1 - tokens) / rate),
+        }
+
+    def _consume_shared(self, key, capacity, rate):
+        alias = router.db_for_write(ThrottleBucket)
+        connection = connections[alias]
+        now = time.time()
+        expires = now + capacity / rate
+        # Values of a new bucket, which starts full
+        allowed = capacity >= 1
+        tokens = capacity - 1 if allowed else capacity
+        # A failed statement must not abort the transaction of the caller
+        block = transaction.atomic(using=alias) \
+            if connection.in_atomic_block else contextlib.nullcontext()
+        with block, connection.cursor() as cursor:
+            cursor.execute(_upsert_sql(connection), [
+                key, tokens, capacity, rate, allowed, now, expires
+            ])
+            tokens, allowed = cursor.fetchone()
+        if random.random() < self.PRUNE_PROBABILITY:  # nosec
+            ThrottleBucket.objects.filter(expires__lt=now).delete()
+        return bool(allowed), (tokens, now)
+
+    def _consume_local(self, key, capacity, rate):
+        with self._lock:
+            allowed, state = self._take(
+                self._local.get(key), capacity, rate, time.time()
+            )
+            self._local[key] = state
+        return allowed, state
+
+    def consume(self, key, capacity, rate):
+        '''Take a token from a bucket refilling at rate tokens per second'''
+        try:
+            outcome = self._consume_shared(key, capacity, rate)
+        except Exception:
+            outcome = self._consume_local(key, capacity, rate)
+        return self._result(outcome[0], outcome[1], capacity, rate)
+
+
+store = TokenBucketStore()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    '''Throttle with a bursty token bucket per user, or per client address
+
+    A rate of ``N/period`` in ``DEFAULT_THROTTLE_RATES`` allows bursts of
+    N requests, refilled evenly over the period.
+    '''
+    scope = None
+    durations = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+    def get_scope(self, request, view):
+        return self.scope
+
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user-{request.user.pk}'
+        return f'addr-{self.get_ident(request)}'
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(request, view)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope) \
+            if scope else None
+        if rate is None:
+            return True
+        count, period = rate.split('/')
+        capacity = int(count)
+        refill = capacity / self.durations[period[0]]
+
+        key = f'throttle:{scope}:{self.get_ident_key(request)}'
+        self.result = store.consume(key, capacity, refill)
+        current = getattr(request, 'rate_limit', None)
+        if current is None or self.result['remaining'] \
+                < current['remaining'] or not self.result['allowed']:
+            request.rate_limit = self.result
+        return self.result['allowed']
+
+    def wait(self):
+        return self.result['retry_after']
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    '''Overall budget of every user, or client address when anonymous'''
+
+    def get_scope(self, request, view):
+        return 'user' if request.user.is_authenticated else 'anon'
+
+
+class ScopedTokenBucketThrottle(TokenBucketThrottle):
+    '''Budget per endpoint class, named by the throttle_scope of the view'''
+
+    def get_scope(self, request, view):
+        return getattr(view, 'throttle_scope', None)
+
+
+class RateLimitHeadersMixin:
+    '''Report the most restrictive throttle in RateLimit-* headers'''
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        rate_limit = getattr(request, 'rate_limit', None)
+        if rate_limit is not None:
+            response['RateLimit-Limit'] = rate_limit['limit']
+            response['RateLimit-Remaining'] = rate_limit['remaining']
+            response['RateLimit-Reset'] = rate_limit['reset']
+        return response
@@ -0,0 +1,88 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_safe
+from django.views.static import serve
+
+from core import media as signed_media, perf
+
+
+def _check_database():
+    with connections['default'].cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+
+def _check_cache():
+    cache.set('readyz', 1, 10)
+    if cache.get('readyz') != 1:
+        raise RuntimeError('cache did not return the stored value')
+
+
+def _check_storage():
+    if not default_storage.exists(''):
+        raise RuntimeError('storage root does not exist')
+
+
+READINESS_CHECKS = {
+    'database': _check_database,
+    'cache': _check_cache,
+    'storage': _check_storage,
+}
+
+
+@never_cache
+@require_safe
+def healthz(request):
+    '''Liveness probe, answered without touching any backing service'''
+    return JsonResponse({'status': 'ok'})
+
+
+@never_cache
+@require_safe
+def readyz(request):
+    '''Readiness probe, checking the database, cache and media storage'''
+    checks = {}
+    for name, check in READINESS_CHECKS.items():
+        try:
+            check()
+            checks[name] = 'ok'
+        except Exception as exc:
+            checks[name] = 'error: %s' % exc.__class__.__name__
+    ready = all(result == 'ok' for result in checks.values())
+    return JsonResponse(
+        {'status': 'ok' if ready else 'unavailable', 'checks': checks},
+        status=200 if ready else 503
+    )
+
+
+@never_cache
+@require_safe
+def metrics(request):
+    '''Per-endpoint request histograms in the Prometheus text format'''
+    return HttpResponse(
+        perf.registry.export() + perf.export_pool_stats(settings.DATABASES),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
+@require_safe
+def media(request, path):
+    '''Serve a media file to holders of a valid signed URL
+
+    The signature is checked without touching the database, see
+    core.media.
+    '''
+    if not signed_media.verify(path, request.GET):
+        return HttpResponseForbidden()
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    patch_cache_control(
+        response, private=True,
+        max_age=max(int(request.GET['expires']) - int(time.time()), 0)
+    )
+    return response
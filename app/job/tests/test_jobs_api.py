@@ -0,0 +1,82 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import jobs
+from core.models import Job
+
+
+JOBS_URL = reverse('job:job-list')
+
+
+def detail_url(job_id):
+    '''Return job detail url'''
+    return reverse('job:job-detail', args=[job_id])
+
+
+class PublicJobsApiTests(TestCase):
+    '''Test the publicly available jobs API'''
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_login_required(self):
+        '''Test that login is required to see jobs'''
+        res = self.client.get(JOBS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateJobsApiTests(TestCase):
+    '''Test the authorized user jobs API'''
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@apparanto.com',
+            'password 1234'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_jobs_limited_to_user(self):
+        '''Test that only the jobs of the user are returned'''
+        other = get_user_model().objects.create_user(
+            'other@apparanto.com',
+            'password 1234'
+        )
+        Job.objects.create(user=other, name='purge_user')
+        job = Job.objects.create(user=self.user, name='delete_files',
+                                 status=Job.SUCCEEDED,
+                                 result='{"deleted": 1}')
+
+        res = self.client.get(JOBS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+        self.assertEqual(res.data[0]['id'], job.id)
+        self.assertEqual(res.data[0]['status'], Job.SUCCEEDED)
+        self.assertEqual(res.data[0]['result'], {'deleted': 1})
+
+    def test_retrieve_job(self):
+        '''Test retrieving the status of a job'''
+        job = Job.objects.create(user=self.user, name='purge_user')
+
+        res = self.client.get(detail_url(job.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['status'], Job.QUEUED)
+        self.assertIsNone(res.data['result'])
+
+    def test_invalid_status_token(self):
+        '''Test that forged job status tokens are rejected'''
+        job = jobs.enqueue('purge_user', {'user_id': 0})
+        token = jobs.status_token(job)
+        forged = token[:-1] + ('y' if token.endswith('x') else 'x')
+        url = reverse('job:job-status', args=[forged])
+
+        res = APIClient().get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
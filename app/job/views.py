@@ -0,0 +1,42 @@
+from rest_framework import generics, viewsets
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import AllowAny, IsAuthenticated
+
+from core import jobs
+from core.models import Job
+from core.throttling import RateLimitHeadersMixin
+from job import serializers
+
+
+class JobViewSet(RateLimitHeadersMixin, viewsets.ReadOnlyModelViewSet):
+    '''Report the status of the background jobs of the user'''
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    serializer_class = serializers.JobSerializer
+    queryset = Job.objects.all()
+
+    def get_queryset(self):
+        '''Retrieve the jobs belonging to the user, newest first'''
+        queryset = self.queryset.filter(user=self.request.user)
+        status = self.request.query_params.get('status')
+        if status:
+            queryset = queryset.filter(status=status)
+        return queryset.order_by('-created_at', '-id')
+
+
+class JobStatusView(RateLimitHeadersMixin, generics.RetrieveAPIView):
+    '''Report the status of a job to holders of its status token
+
+    Used for jobs that outlive the credentials of their user, such as the
+    purge of a deleted account.
+    '''
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+    serializer_class = serializers.JobSerializer
+
+    def get_object(self):
+        try:
+            return jobs.job_for_token(self.kwargs['token'])
+        except Job.DoesNotExist:
+            raise NotFound()
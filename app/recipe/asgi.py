@@ -0,0 +1,245 @@
+import asyncio
+import io
+import json
+import random
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404
+from rest_framework.exceptions import NotFound, Throttled, ValidationError
+from rest_framework.request import Request
+
+from core import perf
+from core.asgi import authenticate, database_sync_to_async, get_header, \
+    get_query_params, send_body, send_json, wait_for_disconnect
+from core.changefeed import broker
+from core.middleware import capture_traffic, sanitize_query
+from core.perf import TimedJSONRenderer
+from core.routers import replica_reads
+from recipe import views
+
+VIEWSETS = {
+    'tags': views.TagViewSet,
+    'ingredients': views.IngredientViewSet,
+    'recipes': views.RecipeViewSet,
+}
+
+_db_semaphore = None
+
+
+def _format_event(event):
+    '''Format a change event as a server-sent event'''
+    return ('event: %s\ndata: %s\n\n' % (
+        event['op'], json.dumps(event)
+    )).encode('utf-8')
+
+
+async def _stream(subscription, receive, send):
+    '''Push events as server-sent events until the client disconnects'''
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]
+    })
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        while True:
+            getter = asyncio.ensure_future(subscription.queue.get())
+            done, _ = await asyncio.wait(
+                {getter, disconnected},
+                timeout=settings.CHANGEFEED_HEARTBEAT,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if getter not in done:
+                getter.cancel()
+            if disconnected in done:
+                return
+            chunk = _format_event(getter.result()) \
+                if getter in done else b': heartbeat\n\n'
+            await send({
+                'type': 'http.response.body',
+                'body': chunk,
+                'more_body': True
+            })
+    finally:
+        disconnected.cancel()
+
+
+async def _long_poll(subscription, timeout, send):
+    '''Answer with the events arriving within the timeout, if any'''
+    event = await subscription.get(timeout)
+    events = [] if event is None else [event] + subscription.drain()
+    await send_json(send, 200, {'events': events})
+
+
+async def change_feed(scope, receive, send):
+    '''Stream the Recipe, Tag and Ingredient changes of the user
+
+    Clients receive server-sent events by default, or a single JSON
+    response with ``?mode=poll`` for long polling.
+    '''
+    user = await authenticate(scope, query_token=True)
+    if user is None:
+        await send_json(
+            send, 401,
+            {'detail': 'Authentication credentials were not provided.'},
+            headers=[(b'www-authenticate', b'Token')]
+        )
+        return
+
+    params = get_query_params(scope)
+    subscription = broker.subscribe(user.id, asyncio.get_running_loop())
+    try:
+        if params.get('mode') == 'poll':
+            try:
+                timeout = float(params.get('timeout', ''))
+            except ValueError:
+                timeout = settings.CHANGEFEED_POLL_TIMEOUT
+            timeout = min(max(timeout, 0), settings.CHANGEFEED_POLL_TIMEOUT)
+            await _long_poll(subscription, timeout, send)
+        else:
+            await _stream(subscription, receive, send)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def accepts_json_read(scope):
+    '''Return whether a request can be answered by the async read path'''
+    accept = get_header(scope, 'accept') or ''
+    return scope['method'] == 'GET' and 'text/html' not in accept
+
+
+@database_sync_to_async
+def _read(viewset_class, scope, user, pk):
+    '''Run the list or retrieve query of a viewset and render it as JSON
+
+    Returns the body and the rate limit state of the request.
+    '''
+    request = Request(ASGIRequest(scope, io.BytesIO()), authenticators=())
+    request.user = user
+    action = 'list' if pk is None else 'retrieve'
+    view = viewset_class(
+        action=action,
+        request=request,
+        args=(),
+        kwargs={} if pk is None else {'pk': pk},
+        format_kwarg=None
+    )
+    view.check_throttles(request)
+    rate_limit = getattr(request, 'rate_limit', None)
+    with replica_reads(user.pk):
+        if pk is not None:
+            data = view.get_serializer(view.get_object()).data
+        else:
+            queryset = view.filter_queryset(view.get_queryset())
+            page = view.paginate_queryset(queryset)
+            if page is not None:
+                serializer = view.get_serializer(page, many=True)
+                data = view.get_paginated_response(serializer.data).data
+            else:
+                data = view.get_serializer(queryset, many=True).data
+    return TimedJSONRenderer().render(data), rate_limit
+
+
+async def _respond(scope, collection, pk):
+    '''Return the status, body and headers answering a read request
+
+    The authenticated user, or None, is returned too.
+    '''
+    # The token lookup queries the database too
+    async with _db_semaphore:
+        user = await authenticate(scope)
+        if user is None:
+            return 401, {
+                'detail': 'Authentication credentials were not provided.'
+            }, [(b'www-authenticate', b'Token')], None
+        try:
+            body, rate_limit = await _read(
+                VIEWSETS[collection], scope, user, pk
+            )
+        except (Http404, NotFound):
+            return 404, {'detail': 'Not found.'}, [], user
+        except ValidationError as exc:
+            return 400, exc.detail, [], user
+        except Throttled as exc:
+            return 429, {'detail': str(exc.detail)}, [
+                (b'retry-after', str(exc.wait).encode('latin1'))
+            ], user
+
+    headers = []
+    if rate_limit is not None:
+        headers = [
+            (b'ratelimit-' + name.encode('latin1'),
+             str(rate_limit[name]).encode('latin1'))
+            for name in ('limit', 'remaining', 'reset')
+        ]
+    return 200, body, headers, user
+
+
+def _capture(scope, endpoint, user, status, start):
+    '''Record the request like TrafficCaptureMiddleware, bypassed here'''
+    capture_traffic({
+        'ts': round(start, 3),
+        'method': scope['method'],
+        'path': scope['path'],
+        'endpoint': endpoint,
+        'query': sanitize_query(get_query_params(scope)),
+        'content_type': get_header(scope, 'content-type') or '',
+        'body': None,
+        'subject': user.pk if user is not None else None,
+        'status': status,
+        'duration_ms': round((time.time() - start) * 1000, 1),
+    })
+
+
+def endpoint_name(collection, pk):
+    '''Return the URL name of the viewset route serving a read'''
+    model = VIEWSETS[collection].queryset.model
+    suffix = 'list' if pk is None else 'detail'
+    return f'recipe:{model._meta.object_name.lower()}-{suffix}'
+
+
+async def read_endpoint(scope, receive, send, collection, pk=None):
+    '''Serve the list and retrieve actions of the recipe viewsets
+
+    The ORM work is offloaded to worker threads, with at most
+    ``ASGI_DB_CONCURRENCY`` requests querying the database at once, so
+    waiting requests hold no thread. This path bypasses the Django
+    middleware, so requests are instrumented and captured here like in
+    PerformanceMiddleware and TrafficCaptureMiddleware.
+    '''
+    global _db_semaphore
+
+    if _db_semaphore is None:
+        _db_semaphore = asyncio.Semaphore(settings.ASGI_DB_CONCURRENCY)
+    endpoint = endpoint_name(collection, pk)
+    start = time.time()
+    if random.random() >= settings.PERF_SAMPLE_RATE:  # nosec
+        status, body, headers, user = await _respond(scope, collection, pk)
+    else:
+        metrics, token = perf.start_request()
+        timer = time.perf_counter()
+        try:
+            status, body, headers, user = await _respond(
+                scope, collection, pk
+            )
+        finally:
+            perf.end_request(token)
+        total = time.perf_counter() - timer
+        headers.append((b'server-timing',
+                        metrics.server_timing(total).encode('latin1')))
+        perf.record(endpoint, scope['method'], status, metrics, total)
+    if settings.TRAFFIC_CAPTURE_FILE:
+        await sync_to_async(_capture, thread_sensitive=False)(
+            scope, endpoint, user, status, start
+        )
+
+    if not isinstance(body, bytes):
+        body = json.dumps(body).encode('utf-8')
+    await send_body(send, status, body, headers)
@@ -1,44 +1,257 @@
+from functools import partial
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import models, transaction
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
 
+from core import images, jobs, media
 from core.models import Tag, Ingredient, Recipe
+from core.perf import TimedSerializerMixin
+
+
+def parse_field_list(request, param):
+    '''Return the set of names in a comma separated GET parameter or None'''
+    if request is None or request.method != 'GET':
+        return None
+    value = request.query_params.get(param)
+    if not value:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class SignedImageField(serializers.ImageField):
+    '''Image field rendered as a signed, expiring URL, see core.media'''
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        url = media.signed_url(value.name)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+class ImageMetadataField(serializers.Field):
+    '''Read-only summary of the image metadata columns of a recipe'''
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        if recipe.image_width is None:
+            return None
+        return {
+            'width': recipe.image_width,
+            'height': recipe.image_height,
+            'size': recipe.image_size,
+            'color': recipe.image_color,
+            'placeholder': recipe.image_placeholder,
+        }
+
+
+class ImageMetadataMixin:
+    '''Render signed image URLs and compute the image metadata of recipes
+    when an image is written, queueing a job for images too large to decode
+    in the request'''
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        models.ImageField: SignedImageField,
+    }
+
+    def _with_image_metadata(self, validated_data):
+        if 'image' in validated_data:
+            validated_data.update(images.metadata(
+                validated_data['image'], settings.IMAGE_INLINE_MAX_PIXELS
+            ))
+        return validated_data
+
+    def save(self, **kwargs):
+        instance = super().save(**kwargs)
+        if 'image' in self.validated_data and instance.image \
+                and not instance.image_placeholder:
+            name = instance.image.name
+            transaction.on_commit(partial(
+                jobs.enqueue, 'image_metadata', {'name': name},
+                idempotency_key=f'image_metadata:{name}'
+            ))
+        return instance
+
+
+class UserManyRelatedField(serializers.ManyRelatedField):
+    '''List of related objects of the user, resolved with a single query'''
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        child = self.child_relation
+        queryset = child.get_queryset()
+        keys, errors = [], []
+        for item in data:
+            try:
+                keys.append(queryset.model._meta.pk.to_python(item))
+            except (DjangoValidationError, TypeError):
+                errors.append(child.error_messages['incorrect_type'].format(
+                    data_type=type(item).__name__
+                ))
+        keys = list(dict.fromkeys(keys))
+        objects = queryset.in_bulk(keys)
+        errors.extend(
+            child.error_messages['does_not_exist'].format(pk_value=key)
+            for key in keys if key not in objects
+        )
+        if errors:
+            raise serializers.ValidationError(errors)
+        return [objects[key] for key in keys]
+
+
+class UserPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    '''Primary key of an object belonging to the requesting user
 
+    With many=True all the submitted keys are looked up in one query and
+    every invalid key is reported at once.
+    '''
 
-class TagSerializer(serializers.ModelSerializer):
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return UserManyRelatedField(**list_kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = self.context.get('request')
+        if request is None or not request.user.is_authenticated:
+            return queryset.none()
+        return queryset.filter(user=request.user)
+
+
+class TagSerializer(TimedSerializerMixin,
+                    serializers.ModelSerializer):
     '''Serializer for tag objects'''
 
     class Meta:
         model = Tag
-        fields = ('id', 'name')
-        read_only_fields = ('id',)
+        fields = ('id', 'name', 'recipe_count')
+        read_only_fields = ('id', 'recipe_count')
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin,
+                           serializers.ModelSerializer):
     '''Serializer for ingredient objects'''
 
     class Meta:
         model = Ingredient
-        fields = ('id', 'name')
-        read_only_fields = ('id',)
+        fields = ('id', 'name', 'recipe_count')
+        read_only_fields = ('id', 'recipe_count')
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(TimedSerializerMixin, ImageMetadataMixin,
+                       serializers.ModelSerializer):
     '''Serializer for recipe objects'''
-    ingredients = serializers.PrimaryKeyRelatedField(
+    ingredients = UserPrimaryKeyRelatedField(
         many=True,
+        required=False,
         queryset=Ingredient.objects.all()
     )
 
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = UserPrimaryKeyRelatedField(
         many=True,
+        required=False,
         queryset=Tag.objects.all()
     )
 
+    ingredient_names = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        write_only=True,
+        required=False
+    )
+
+    tag_names = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        write_only=True,
+        required=False
+    )
+
+    image_meta = ImageMetadataField()
+
+    NAMED_FIELDS = (
+        ('tags', 'tag_names', Tag),
+        ('ingredients', 'ingredient_names', Ingredient),
+    )
+
+    EXPANDABLE = {
+        'tags': TagSerializer,
+        'ingredients': IngredientSerializer,
+    }
+
     class Meta:
         model = Recipe
         fields = ('id', 'title', 'ingredients', 'tags',
-                  'time_minutes', 'price', 'link', 'image')
+                  'ingredient_names', 'tag_names',
+                  'time_minutes', 'price', 'link', 'image', 'image_meta')
         read_only_fields = ('id',)
 
+    def __init__(self, *args, **kwargs):
+        '''Apply the ?fields= and ?expand= parameters of GET requests'''
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        expand = parse_field_list(request, 'expand') or set()
+        self._check_known('expand', expand, self.EXPANDABLE)
+        for name in expand:
+            self.fields[name] = self.EXPANDABLE[name](
+                many=True, read_only=True
+            )
+        fields = parse_field_list(request, 'fields')
+        if fields:
+            self._check_known('fields', fields, self.fields)
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+
+    @staticmethod
+    def _check_known(param, names, known):
+        '''Reject the names of a GET parameter that are not in known'''
+        unknown = names - set(known)
+        if unknown:
+            raise serializers.ValidationError({param: [
+                'Unknown fields: %s.' % ', '.join(sorted(unknown))
+            ]})
+
+    def _resolve_names(self, validated_data):
+        '''Add the objects named in tag_names and ingredient_names
+
+        Objects the user does not have yet are created.
+        '''
+        user = self.context['request'].user
+        for field, names_field, model in self.NAMED_FIELDS:
+            names = validated_data.pop(names_field, None)
+            if names is None:
+                continue
+            objects = model.objects.get_or_create_by_names(user, names)
+            validated_data[field] = list(dict.fromkeys(
+                validated_data.get(field, []) + objects
+            ))
+        return validated_data
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            return super().create(self._resolve_names(
+                self._with_image_metadata(validated_data)
+            ))
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            return super().update(instance, self._resolve_names(
+                self._with_image_metadata(validated_data)
+            ))
+
 
 class RecipeDetailSerializer(RecipeSerializer):
     '''Detail serializer for a recipe object'''
@@ -46,10 +259,17 @@ class RecipeDetailSerializer(RecipeSerializer):
     tags = TagSerializer(many=True, read_only=True)
 
 
-class RecipeImageSerializer(serializers.ModelSerializer):
+class RecipeImageSerializer(TimedSerializerMixin, ImageMetadataMixin,
+                            serializers.ModelSerializer):
     '''Serializer for uploading images to recipe objects'''
+    image_meta = ImageMetadataField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'image')
+        fields = ('id', 'image', 'image_meta')
         read_only_fields = ('id', )
+
+    def update(self, instance, validated_data):
+        return super().update(
+            instance, self._with_image_metadata(validated_data)
+        )
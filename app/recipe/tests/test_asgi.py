@@ -0,0 +1,186 @@
+import asyncio
+import json
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TransactionTestCase, override_settings
+
+from rest_framework.authtoken.models import Token
+
+from app.asgi import application
+from core import perf
+from recipe import asgi
+from core.models import Recipe, Tag
+from recipe.serializers import RecipeDetailSerializer, TagSerializer
+
+
+def asgi_get(path, token=None, query_string=b''):
+    '''Perform a GET request against the ASGI application'''
+    status, _, data = asgi_response(path, token, query_string)
+    return status, data
+
+
+def asgi_response(path, token=None, query_string=b''):
+    '''Return the status, headers and data of an ASGI GET request'''
+    headers = [(b'accept', b'application/json')]
+    if token:
+        headers.append((b'authorization', f'Token {token}'.encode()))
+    scope = {
+        'type': 'http',
+        'method': 'GET',
+        'path': path,
+        'query_string': query_string,
+        'headers': headers,
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.new_event_loop().run_until_complete(
+        application(scope, receive, send)
+    )
+    body = b''.join(m.get('body', b'') for m in messages[1:])
+    headers = {key.decode(): value.decode()
+               for key, value in messages[0]['headers']}
+    return messages[0]['status'], headers, json.loads(body)
+
+
+class AsyncReadEndpointTests(TransactionTestCase):
+    '''Test the async read endpoints of the ASGI application'''
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@apparanto.com',
+            'password 1234'
+        )
+        self.token = Token.objects.create(user=self.user).key
+
+    def test_login_required(self):
+        '''Test that the async read endpoints require a token'''
+        status, _ = asgi_get('/api/recipe/tags/')
+
+        self.assertEqual(status, 401)
+
+    def test_list_tags(self):
+        '''Test listing the tags of the user'''
+        Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=self.user, name='Dessert')
+
+        status, data = asgi_get('/api/recipe/tags/', self.token)
+
+        tags = Tag.objects.all().order_by('-name')
+        self.assertEqual(status, 200)
+        self.assertEqual(data, TagSerializer(tags, many=True).data)
+
+    def test_retrieve_recipe(self):
+        '''Test retrieving a recipe detail'''
+        recipe = Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=10, price=5
+        )
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+
+        status, data = asgi_get(f'/api/recipe/recipes/{recipe.id}/',
+                                self.token)
+
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            json.dumps(data),
+            json.dumps(RecipeDetailSerializer(recipe).data)
+        )
+
+    def test_retrieve_recipe_of_other_user(self):
+        '''Test that recipes of other users are not found'''
+        other = get_user_model().objects.create_user(
+            'other@apparanto.com',
+            'password 1234'
+        )
+        recipe = Recipe.objects.create(
+            user=other, title='Curry', time_minutes=10, price=5
+        )
+
+        status, _ = asgi_get(f'/api/recipe/recipes/{recipe.id}/', self.token)
+
+        self.assertEqual(status, 404)
+
+    def test_unknown_fields(self):
+        '''Test that ?fields= with unknown names is rejected'''
+        status, data = asgi_get('/api/recipe/recipes/', self.token,
+                                query_string=b'fields=id,secret')
+
+        self.assertEqual(status, 400)
+        self.assertEqual(data, {'fields': ['Unknown fields: secret.']})
+
+    def test_query_token_only_for_change_feed(self):
+        '''Test that read endpoints do not take the token from the URL'''
+        query = f'token={self.token}'.encode()
+
+        status, _ = asgi_get('/api/recipe/tags/', query_string=query)
+        self.assertEqual(status, 401)
+
+        status, data = asgi_get('/api/recipe/changes/',
+                                query_string=query + b'&mode=poll&timeout=0')
+        self.assertEqual((status, data), (200, {'events': []}))
+
+    def test_token_lookup_is_limited(self):
+        '''Test that the token lookup runs inside the database semaphore'''
+        locked = []
+        authenticate = asgi.authenticate
+
+        async def check(scope):
+            locked.append(asgi._db_semaphore.locked())
+            return await authenticate(scope)
+
+        with patch.object(asgi, '_db_semaphore', asyncio.Semaphore(1)), \
+                patch.object(asgi, 'authenticate', check):
+            status, _ = asgi_get('/api/recipe/tags/', self.token)
+
+        self.assertEqual(status, 200)
+        self.assertEqual(locked, [True])
+
+    @override_settings(PERF_SAMPLE_RATE=1)
+    def test_reads_are_instrumented(self):
+        '''Test that native reads report timings like the middleware'''
+        perf.registry.clear()
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        status, headers, _ = asgi_response('/api/recipe/tags/', self.token)
+
+        self.assertEqual(status, 200)
+        # Token, two throttles, replica pin and tags
+        self.assertIn('desc="5 queries"', headers['server-timing'])
+        for section in ('serializer', 'render', 'total'):
+            self.assertIn(f'{section};dur=', headers['server-timing'])
+        self.assertIn('http_request_db_queries_count'
+                      '{endpoint="recipe:tag-list"} 1',
+                      perf.registry.export())
+
+    @override_settings(PERF_SAMPLE_RATE=0)
+    def test_unsampled_reads_are_not_instrumented(self):
+        '''Test that reads outside the sample are left alone'''
+        _, headers, _ = asgi_response('/api/recipe/tags/', self.token)
+
+        self.assertNotIn('server-timing', headers)
+
+    def test_reads_are_captured(self):
+        '''Test that native reads end up in the traffic capture'''
+        handle, path = tempfile.mkstemp(suffix='.jsonl')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+
+        with override_settings(TRAFFIC_CAPTURE_FILE=path):
+            asgi_get('/api/recipe/recipes/', self.token,
+                     query_string=b'token=abc&tags=1')
+
+        with open(path) as capture:
+            record = json.loads(capture.read())
+        self.assertEqual(record['method'], 'GET')
+        self.assertEqual(record['endpoint'], 'recipe:recipe-list')
+        self.assertEqual(record['subject'], self.user.pk)
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['query'], {'token': '***', 'tags': '1'})
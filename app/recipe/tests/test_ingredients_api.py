@@ -5,7 +5,7 @@ from django.test import TestCase
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Ingredient
+from core.models import Ingredient, Recipe
 from recipe.serializers import IngredientSerializer
 
 INGREDIENTS_URL = reverse('recipe:ingredient-list')
@@ -88,3 +88,23 @@ class PrivateIngredientsApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
         ingredient_count = Ingredient.objects.count()
         self.assertEqual(ingredient_count, 0)
+
+    def test_assigned_only_by_recipe_count(self):
+        '''Test listing the used ingredients, most used first'''
+        rice = Ingredient.objects.create(user=self.user, name='Rice')
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        Ingredient.objects.create(user=self.user, name='Kale')
+        for title in ('Curry', 'Soup'):
+            recipe = Recipe.objects.create(
+                user=self.user, title=title, time_minutes=10, price=5
+            )
+            recipe.ingredients.add(salt)
+        recipe.ingredients.add(rice)
+
+        res = self.client.get(INGREDIENTS_URL, {
+            'assigned_only': 1, 'ordering': '-recipe_count'
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['name'] for item in res.data],
+                         ['Salt', 'Rice'])
@@ -1,19 +1,35 @@
 from django.contrib.auth import get_user_model
 from django.urls import reverse
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework import status
 from rest_framework.test import APIClient
+from rest_framework.views import APIView
 
 import tempfile
 import os
+from unittest.mock import patch
 
 from PIL import Image
 
+from core import routers
 from core.models import Recipe, Tag, Ingredient
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
 
 RECIPES_URL = reverse('recipe:recipe-list')
+BATCH_URL = reverse('recipe:recipe-batch')
+CLONE_URL = reverse('recipe:recipe-bulk_clone')
+SHOPPING_LIST_URL = reverse('recipe:recipe-shopping_list')
+
+# Query counts are about the view, not about the shared database cache
+# or the throttle buckets
+LOCAL_CACHE = override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+}})
+NO_THROTTLES = patch.object(APIView, 'get_throttles', lambda self: [])
 
 
 def image_upload_url(recipe_id):
@@ -21,6 +37,11 @@ def image_upload_url(recipe_id):
     return reverse('recipe:recipe-upload_image', args=[recipe_id])
 
 
+def clone_url(recipe_id):
+    '''Return url for cloning a recipe'''
+    return reverse('recipe:recipe-clone', args=[recipe_id])
+
+
 def test_tag(user, name='Test tag'):
     '''Create a test tag'''
     return Tag.objects.create(user=user, name=name)
@@ -128,10 +149,10 @@ class PrivateRecipesApiTest(TestCase):
         recipe = test_recipe(user=self.user)
 
         recipe.tags.add(test_tag(user=self.user))
-        recipe.tags.add(test_tag(user=self.user))
+        recipe.tags.add(test_tag(user=self.user, name='Vegan'))
 
         recipe.ingredients.add(test_ingredient(user=self.user))
-        recipe.ingredients.add(test_ingredient(user=self.user))
+        recipe.ingredients.add(test_ingredient(user=self.user, name='Rice'))
 
         url = recipe_detail_url(recipe.id)
         res = self.client.get(url)
@@ -154,10 +175,21 @@ class PrivateRecipesApiTest(TestCase):
         for key in payload.keys():
             self.assertEqual(payload[key], getattr(recipe, key))
 
+    def test_create_recipe_pins_user_to_primary(self):
+        '''Test that a write routes the next reads of the user to primary'''
+        payload = {
+            'title': 'Chocolate cheesecake',
+            'time_minutes': 30,
+            'price': 3.50
+        }
+        self.client.post(RECIPES_URL, payload)
+
+        self.assertTrue(routers.is_pinned(self.user.pk))
+
     def test_create_recipe_with_tags(self):
         '''Test creating a recipe with tags'''
-        tag1 = test_tag(user=self.user)
-        tag2 = test_tag(user=self.user)
+        tag1 = test_tag(user=self.user, name='Vegan')
+        tag2 = test_tag(user=self.user, name='Dessert')
 
         payload = {
             'title': 'Avocado lime cheesecake',
@@ -177,8 +209,8 @@ class PrivateRecipesApiTest(TestCase):
 
     def test_create_recipe_with_ingredients(self):
         '''Test creating a recipe with ingredients'''
-        ingredient1 = test_ingredient(user=self.user)
-        ingredient2 = test_ingredient(user=self.user)
+        ingredient1 = test_ingredient(user=self.user, name='Prawns')
+        ingredient2 = test_ingredient(user=self.user, name='Ginger')
 
         payload = {
             'title': 'Thai prawn red curry',
@@ -196,6 +228,60 @@ class PrivateRecipesApiTest(TestCase):
         self.assertIn(ingredient1, ingredients)
         self.assertIn(ingredient2, ingredients)
 
+    def test_create_recipe_with_invalid_tags(self):
+        '''Test that every foreign or unknown tag is reported at once'''
+        tag = test_tag(user=self.user)
+        other = test_tag(user=get_user_model().objects.create_user(
+            'other@apparanto.com',
+            'password 1234'
+        ))
+
+        res = self.client.post(RECIPES_URL, {
+            'title': 'Curry', 'time_minutes': 20, 'price': 6.50,
+            'tags': [tag.id, other.id, 999, 'abc'], 'ingredients': []
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(res.data['tags']), 3)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_create_recipe_tags_constant_queries(self):
+        '''Test that tags are validated with one query however many'''
+        def create(count):
+            tags = [test_tag(user=self.user, name=f'Tag {count}.{i}').id
+                    for i in range(count)]
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.post(RECIPES_URL, {
+                    'title': 'Curry', 'time_minutes': 20, 'price': 6.50,
+                    'tags': tags, 'ingredients': []
+                }, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return len(queries)
+
+        self.assertEqual(create(2), create(20))
+
+    def test_create_recipe_with_names(self):
+        '''Test that tags and ingredients can be given by name'''
+        tag = test_tag(user=self.user, name='Vegan')
+
+        res = self.client.post(RECIPES_URL, {
+            'title': 'Curry', 'time_minutes': 20, 'price': 6.50,
+            'tag_names': ['vegan', 'Spicy', 'spicy'],
+            'ingredient_names': ['Tofu']
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(
+            sorted(recipe.tags.values_list('name', flat=True)),
+            ['Spicy', 'Vegan']
+        )
+        self.assertIn(tag, recipe.tags.all())
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(recipe.ingredients.get().name, 'Tofu')
+        self.assertNotIn('tag_names', res.data)
+
     def test_update_recipe_partial(self):
         '''Test updating a recipe with PATCH'''
         recipe = test_recipe(user=self.user)
@@ -308,6 +394,308 @@ class PrivateRecipesApiTest(TestCase):
         self.assertIn(serializer2.data, res.data)
         self.assertNotIn(serializer3.data, res.data)
 
+    def test_filter_recipes_by_time_and_price(self):
+        '''Test the range filters on time and price'''
+        quick = test_recipe(user=self.user, title='Quick', time_minutes=10,
+                            price=8)
+        test_recipe(user=self.user, title='Slow', time_minutes=90, price=8)
+        test_recipe(user=self.user, title='Pricey', time_minutes=10,
+                    price=30)
+
+        res = self.client.get(RECIPES_URL, {
+            'max_time': 30, 'min_price': '5', 'max_price': '10.00'
+        })
+
+        self.assertEqual([recipe['id'] for recipe in res.data], [quick.id])
+
+        res = self.client.get(RECIPES_URL, {'max_price': 'cheap'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_order_recipes(self):
+        '''Test ordering recipes with the allowed orderings only'''
+        recipe1 = test_recipe(user=self.user, title='A', price=3)
+        recipe2 = test_recipe(user=self.user, title='B', price=1)
+        recipe3 = test_recipe(user=self.user, title='C', price=2)
+
+        res = self.client.get(RECIPES_URL, {'ordering': 'price'})
+        self.assertEqual([recipe['id'] for recipe in res.data],
+                         [recipe2.id, recipe3.id, recipe1.id])
+
+        res = self.client.get(RECIPES_URL, {'ordering': '-id'})
+        self.assertEqual([recipe['id'] for recipe in res.data],
+                         [recipe3.id, recipe2.id, recipe1.id])
+
+        res = self.client.get(RECIPES_URL, {'ordering': 'user'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_paginate_recipes_with_cursor(self):
+        '''Test that recipes are paginated when a page size is given'''
+        for i in range(5):
+            test_recipe(user=self.user, title='Curry', time_minutes=i)
+
+        seen = []
+        res = self.client.get(RECIPES_URL, {
+            'page_size': 2, 'ordering': 'time_minutes', 'fields': 'id'
+        })
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            seen += [recipe['id'] for recipe in res.data['results']]
+            if not res.data['next']:
+                break
+            res = self.client.get(res.data['next'])
+
+        self.assertEqual(seen, list(
+            Recipe.objects.order_by('time_minutes', 'id')
+            .values_list('id', flat=True)
+        ))
+
+    def test_list_recipes_sparse_fields(self):
+        '''Test that ?fields= limits the fields of the listed recipes'''
+        test_recipe(user=self.user, title='Nasi goreng', price=8.50)
+
+        res = self.client.get(RECIPES_URL, {'fields': 'id,title,price'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(res.data[0]), {'id', 'title', 'price'})
+        self.assertEqual(res.data[0]['title'], 'Nasi goreng')
+
+    def test_list_recipes_unknown_fields(self):
+        '''Test that ?fields= with unknown names is rejected'''
+        recipe = test_recipe(user=self.user)
+
+        res = self.client.get(RECIPES_URL, {'fields': 'id,user,secret'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['fields'],
+                         ['Unknown fields: secret, user.'])
+
+        res = self.client.get(recipe_detail_url(recipe.id),
+                              {'fields': 'titel'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_recipes_expand(self):
+        '''Test that ?expand= nests tags and ingredients in the list'''
+        recipe = test_recipe(user=self.user)
+        recipe.tags.add(test_tag(user=self.user, name='Vegan'))
+
+        res = self.client.get(RECIPES_URL, {'expand': 'tags'})
+
+        self.assertEqual(res.data[0]['tags'][0]['name'], 'Vegan')
+        self.assertEqual(res.data[0]['ingredients'], [])
+
+    def test_list_recipes_unknown_expand(self):
+        '''Test that ?expand= with unknown names is rejected'''
+        test_recipe(user=self.user)
+
+        res = self.client.get(RECIPES_URL, {'expand': 'tags,user'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['expand'], ['Unknown fields: user.'])
+
+    def test_retrieve_recipe_sparse_fields(self):
+        '''Test that ?fields= applies to recipe details too'''
+        recipe = test_recipe(user=self.user)
+        recipe.tags.add(test_tag(user=self.user))
+
+        res = self.client.get(recipe_detail_url(recipe.id),
+                              {'fields': 'id,tags'})
+
+        self.assertEqual(set(res.data), {'id', 'tags'})
+        self.assertEqual(res.data['tags'][0]['name'], 'Test tag')
+
+    @LOCAL_CACHE
+    @NO_THROTTLES
+    def test_list_recipes_constant_queries(self):
+        '''Test that listing recipes does not query per recipe'''
+        for i in range(3):
+            recipe = test_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tags.add(test_tag(user=self.user, name=f'Tag {i}'))
+            recipe.ingredients.add(
+                test_ingredient(user=self.user, name=f'Ingredient {i}')
+            )
+
+        # The recipes and one query per prefetched relation
+        with self.assertNumQueries(3):
+            self.client.get(RECIPES_URL)
+        with self.assertNumQueries(1):
+            self.client.get(RECIPES_URL, {'fields': 'id,title'})
+
+    @LOCAL_CACHE
+    @NO_THROTTLES
+    def test_batch_retrieve_recipes(self):
+        '''Test retrieving recipe details by ID in request order'''
+        recipe1 = test_recipe(user=self.user, title='Nasi goreng')
+        recipe2 = test_recipe(user=self.user, title='Bami goreng')
+        recipe2.tags.add(test_tag(user=self.user))
+        other = test_recipe(user=get_user_model().objects.create_user(
+            'other@apparanto.com',
+            'password 1234'
+        ))
+
+        with self.assertNumQueries(3):
+            res = self.client.get(BATCH_URL, {
+                'ids': f'{recipe2.id},{other.id},{recipe1.id},999'
+            })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [
+            RecipeDetailSerializer(recipe2).data,
+            RecipeDetailSerializer(recipe1).data
+        ])
+        self.assertEqual(res.data['missing'], [other.id, 999])
+
+    def test_batch_retrieve_recipes_post(self):
+        '''Test retrieving recipe details with IDs in a POST body'''
+        recipe = test_recipe(user=self.user)
+        cache.clear()
+
+        res = self.client.post(BATCH_URL, {'ids': [recipe.id]},
+                               format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'][0]['id'], recipe.id)
+        self.assertFalse(routers.is_pinned(self.user.pk))
+
+    def test_batch_retrieve_invalid_ids(self):
+        '''Test that invalid or too many IDs are rejected'''
+        res = self.client.get(BATCH_URL, {'ids': '1,abc'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.post(BATCH_URL, {'ids': list(range(1000))},
+                               format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        for ids in ([1.7], [True], ['1'], [None], 1, None):
+            res = self.client.post(BATCH_URL, {'ids': ids}, format='json')
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST,
+                             ids)
+
+    def test_batch_retrieve_list_body(self):
+        '''Test that a body that is not an object is rejected'''
+        res = self.client.post(BATCH_URL, [1, 2], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('non_field_errors', res.data)
+
+    def test_clone_recipe(self):
+        '''Test copying a recipe with its tags and ingredients'''
+        recipe = test_recipe(user=self.user, image='uploads/recipe/a.jpg')
+        recipe.tags.add(test_tag(user=self.user))
+        recipe.ingredients.add(test_ingredient(user=self.user))
+
+        res = self.client.post(clone_url(recipe.id), {'title': 'Copy'},
+                               format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        clone = Recipe.objects.get(id=res.data['id'])
+        self.assertNotEqual(clone.id, recipe.id)
+        self.assertEqual(clone.title, 'Copy')
+        self.assertEqual(clone.price, recipe.price)
+        self.assertEqual(clone.image.name, recipe.image.name)
+        self.assertEqual(list(clone.tags.all()), list(recipe.tags.all()))
+        self.assertEqual(list(clone.ingredients.all()),
+                         list(recipe.ingredients.all()))
+
+    def test_clone_recipe_of_other_user(self):
+        '''Test that recipes of other users cannot be copied'''
+        other = test_recipe(user=get_user_model().objects.create_user(
+            'other@apparanto.com',
+            'password 1234'
+        ))
+
+        res = self.client.post(clone_url(other.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_bulk_clone_recipes(self):
+        '''Test copying several recipes in request order'''
+        recipe1 = test_recipe(user=self.user, title='Nasi goreng')
+        recipe2 = test_recipe(user=self.user, title='Bami goreng')
+        recipe1.tags.add(test_tag(user=self.user))
+        recipe2.tags.add(test_tag(user=self.user, name='Spicy'))
+
+        res = self.client.post(
+            CLONE_URL, {'ids': [recipe2.id, recipe1.id, 999]}, format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([recipe['title'] for recipe in res.data['results']],
+                         ['Bami goreng', 'Nasi goreng'])
+        self.assertEqual(res.data['missing'], [999])
+        clone = Recipe.objects.get(id=res.data['results'][0]['id'])
+        self.assertEqual(list(clone.tags.values_list('name', flat=True)),
+                         ['Spicy'])
+
+    def test_bulk_clone_invalid_body(self):
+        '''Test that bulk clones need an object with integer IDs'''
+        recipe = test_recipe(user=self.user)
+
+        for body in ([recipe.id], {'ids': [float(recipe.id)]},
+                     {'ids': [True]}):
+            res = self.client.post(CLONE_URL, body, format='json')
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST,
+                             body)
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_similar_recipes(self):
+        '''Test listing the recipes most similar to a recipe'''
+        tags = [test_tag(user=self.user, name=name)
+                for name in ('Vegan', 'Curry', 'Spicy')]
+        recipe = test_recipe(user=self.user, title='Red curry')
+        recipe.tags.set(tags)
+        close = test_recipe(user=self.user, title='Green curry')
+        close.tags.set(tags[:2])
+        test_recipe(user=self.user, title='Pancakes')
+
+        res = self.client.get(
+            reverse('recipe:recipe-similar', args=[recipe.id])
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['title'] for r in res.data], ['Green curry'])
+        self.assertIn('similarity', res.data[0])
+
+    @LOCAL_CACHE
+    @NO_THROTTLES
+    def test_shopping_list(self):
+        '''Test merging the ingredients of several recipes'''
+        rice = test_ingredient(user=self.user, name='Rice')
+        egg = test_ingredient(user=self.user, name='Egg')
+        recipe1 = test_recipe(user=self.user, price=5.50, time_minutes=10)
+        recipe1.ingredients.set([rice, egg])
+        recipe2 = test_recipe(user=self.user, price=2.25, time_minutes=20)
+        recipe2.ingredients.set([rice])
+        test_recipe(user=self.user).ingredients.set([egg])
+        cache.clear()
+
+        with self.assertNumQueries(1):
+            res = self.client.get(SHOPPING_LIST_URL, {
+                'ids': f'{recipe1.id},{recipe2.id},999'
+            })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {
+            'ingredients': [
+                {'id': egg.id, 'name': 'Egg', 'count': 1},
+                {'id': rice.id, 'name': 'Rice', 'count': 2},
+            ],
+            'total_price': '7.75',
+            'total_time_minutes': 30,
+            'recipes': [recipe1.id, recipe2.id],
+            'missing': [999],
+        })
+        with self.assertNumQueries(0):
+            cached = self.client.post(SHOPPING_LIST_URL, {
+                'ids': [recipe2.id, recipe1.id, 999]
+            }, format='json')
+        self.assertEqual(cached.data['ingredients'],
+                         res.data['ingredients'])
+        self.assertEqual(cached.data['recipes'], [recipe2.id, recipe1.id])
+
+        res = self.client.post(SHOPPING_LIST_URL, [recipe1.id],
+                               format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
 
 class RecipeImageUploadTests(TestCase):
     '''Tests for the recipe image upload feature'''
@@ -335,6 +723,7 @@ class RecipeImageUploadTests(TestCase):
             res = self.client.post(url, {'image': ntf}, format='multipart')
             self.assertEqual(res.status_code, status.HTTP_200_OK)
             self.assertIn('image', res.data)
+            self.assertIn('signature=', res.data['image'])
 
             self.recipe.refresh_from_db()
             self.assertTrue(os.path.exists(self.recipe.image.path))
@@ -345,3 +734,23 @@ class RecipeImageUploadTests(TestCase):
         res = self.client.post(url, {'image': 'notimage'}, format='multipart')
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_image_metadata(self):
+        '''Test that uploads store the metadata of the image'''
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.png') as ntf:
+            Image.new('RGB', (40, 20), (255, 0, 0)).save(ntf, format='PNG')
+            size = ntf.tell()
+            ntf.seek(0)
+
+            res = self.client.post(url, {'image': ntf}, format='multipart')
+
+        meta = res.data['image_meta']
+        self.assertEqual((meta['width'], meta['height'], meta['size']),
+                         (40, 20, size))
+        self.assertEqual(meta['color'], '#ff0000')
+        self.assertTrue(meta['placeholder'].startswith(
+            'data:image/jpeg;base64,'
+        ))
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.data[0]['image_meta'], meta)
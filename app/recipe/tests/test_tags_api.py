@@ -5,7 +5,7 @@ from django.test import TestCase
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Tag
+from core.models import Tag, Recipe
 
 from recipe.serializers import TagSerializer
 
@@ -90,6 +90,15 @@ class PrivateTagsApiTests(TestCase):
         tag_count = Tag.objects.count()
         self.assertEqual(tag_count, 0)
 
+    def test_create_duplicate_tag(self):
+        '''Test that tag names are unique per user, ignoring case'''
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.post(TAGS_URL, {'name': 'vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Tag.objects.count(), 1)
+
     def test_delete_tag(self):
         tag = Tag.objects.create(user=self.user, name='Test tag')
 
@@ -100,3 +109,57 @@ class PrivateTagsApiTests(TestCase):
 
         tags = Tag.objects.all()
         self.assertEqual(tags.count(), 0)
+
+    def test_delete_tag_used_by_recipes(self):
+        '''Test deleting a tag detaches it from its recipes'''
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=10, price=5
+        )
+        recipe.tags.add(tag)
+
+        res = self.client.delete(reverse('recipe:tag-detail', args=[tag.id]))
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(recipe.tags.count(), 0)
+        self.assertTrue(Recipe.objects.filter(pk=recipe.pk).exists())
+
+    def test_order_by_recipe_count(self):
+        '''Test ordering tags by the number of recipes using them'''
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Dessert')
+        tag3 = Tag.objects.create(user=self.user, name='Spicy')
+        for title in ('Curry', 'Soup'):
+            recipe = Recipe.objects.create(
+                user=self.user, title=title, time_minutes=10, price=5
+            )
+            recipe.tags.add(tag2)
+        recipe.tags.add(tag1)
+
+        res = self.client.get(TAGS_URL, {'ordering': '-recipe_count'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([tag['id'] for tag in res.data],
+                         [tag2.id, tag1.id, tag3.id])
+        self.assertEqual([tag['recipe_count'] for tag in res.data],
+                         [2, 1, 0])
+
+    def test_assigned_only(self):
+        '''Test listing only the tags assigned to recipes'''
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=self.user, name='Dessert')
+        recipe = Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=10, price=5
+        )
+        recipe.tags.add(tag)
+
+        res = self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        self.assertEqual([item['id'] for item in res.data], [tag.id])
+
+    def test_invalid_listing_params(self):
+        '''Test that unknown orderings and filters are rejected'''
+        for params in ({'ordering': 'user'}, {'assigned_only': 'yes'}):
+            res = self.client.get(TAGS_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
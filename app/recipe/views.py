@@ -1,28 +1,112 @@
+import hashlib
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
 from rest_framework import viewsets, mixins, status
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
+from core import images, routers, similarity
+from core.cloning import clone_recipes
+from core.dataversion import data_version
+from core.deletion import delete_recipe_attr
+from core.idempotency import IdempotencyMixin
+from core.pagination import OptInCursorPagination
 from core.models import Tag, Ingredient, Recipe
+from core.throttling import RateLimitHeadersMixin
 from recipe import serializers
 
 
-class BaseRecipeAttrViewSet(viewsets.GenericViewSet,
+class ReplicaReadMixin:
+    '''Serve reads from a replica and pin users after writes
+
+    Reads are the safe requests and the actions in read_only_actions.
+    '''
+    read_only_actions = ()
+    _replica_token = None
+
+    def _is_read(self, request):
+        return request.method in SAFE_METHODS \
+            or self.action in self.read_only_actions
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self._is_read(request):
+            self._replica_token = routers.enable_replica_reads(
+                request.user.pk
+            )
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self._replica_token is not None:
+            routers.reset_replica_reads(self._replica_token)
+            self._replica_token = None
+        elif not self._is_read(request) \
+                and status.is_success(response.status_code):
+            routers.pin_to_primary(request.user.pk)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class BaseRecipeAttrViewSet(IdempotencyMixin,
+                            RateLimitHeadersMixin,
+                            ReplicaReadMixin,
+                            viewsets.GenericViewSet,
                             mixins.ListModelMixin,
                             mixins.CreateModelMixin,
                             mixins.DestroyModelMixin):
     '''Base viewset for model recipe attribute class'''
     authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    throttle_scope = 'recipe_attrs'
+
+    ORDERINGS = {
+        'name': ('name', 'id'),
+        '-name': ('-name', '-id'),
+        'recipe_count': ('recipe_count', 'id'),
+        '-recipe_count': ('-recipe_count', '-id'),
+    }
+    DEFAULT_ORDERING = '-name'
 
     def get_queryset(self):
-        '''Retrieve all the recipe attributes belonging to the user'''
-        return self.queryset.filter(user=self.request.user).order_by('-name')
+        '''Retrieve all the recipe attributes belonging to the user
+
+        ``?assigned_only=1`` skips the ones no recipe uses, both that and
+        ``?ordering=`` read the maintained recipe_count.
+        '''
+        params = self.request.query_params
+        queryset = self.queryset.filter(user=self.request.user)
+        try:
+            assigned_only = bool(int(params.get('assigned_only', 0)))
+        except ValueError:
+            raise ValidationError({'assigned_only': ['Use 0 or 1.']})
+        if assigned_only:
+            queryset = queryset.filter(recipe_count__gt=0)
+        ordering = params.get('ordering', self.DEFAULT_ORDERING)
+        if ordering not in self.ORDERINGS:
+            raise ValidationError({'ordering': [
+                'Ordering must be one of %s.' % ', '.join(self.ORDERINGS)
+            ]})
+        return queryset.order_by(*self.ORDERINGS[ordering])
 
     def perform_create(self, serializer):
         '''Create a new recipe attribute object'''
-        serializer.save(user=self.request.user)
+        try:
+            with transaction.atomic():
+                serializer.save(user=self.request.user)
+        except IntegrityError:
+            raise ValidationError(
+                {'name': ['An object with this name already exists.']}
+            )
+
+    def perform_destroy(self, instance):
+        '''Delete a recipe attribute without loading its recipes'''
+        delete_recipe_attr(instance)
 
 
 class TagViewSet(BaseRecipeAttrViewSet):
@@ -39,13 +123,41 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
     queryset = Ingredient.objects.all()
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(IdempotencyMixin,
+                    RateLimitHeadersMixin,
+                    ReplicaReadMixin,
+                    viewsets.ModelViewSet):
     '''Manage recipes in the database'''
     authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    throttle_scope = 'recipes'
 
     serializer_class = serializers.RecipeSerializer
     queryset = Recipe.objects.all()
+    pagination_class = OptInCursorPagination
+
+    read_only_actions = ('batch', 'shopping_list')
+
+    RECIPE_COLUMNS = ('title', 'time_minutes', 'price', 'link', 'image')
+
+    # Every ordering has a matching (user, column, id) index
+    ORDERINGS = {
+        'title': ('title', 'id'),
+        '-title': ('-title', '-id'),
+        'price': ('price', 'id'),
+        '-price': ('-price', '-id'),
+        'time_minutes': ('time_minutes', 'id'),
+        '-time_minutes': ('-time_minutes', '-id'),
+        'id': ('id',),
+        '-id': ('-id',),
+    }
+    DEFAULT_ORDERING = '-title'
+
+    RANGE_FILTERS = (
+        ('max_time', 'time_minutes__lte', int),
+        ('min_price', 'price__gte', Decimal),
+        ('max_price', 'price__lte', Decimal),
+    )
 
     def _params_to_int(self, query_string):
         '''Convert a list of string IDs to a list of integers'''
@@ -63,11 +175,44 @@ class RecipeViewSet(viewsets.ModelViewSet):
             ingredient_ids = self._params_to_int(ingredients)
             queryset = queryset.filter(ingredients__id__in=ingredient_ids)
 
-        return queryset.filter(user=self.request.user).order_by('-title')
+        params = self.request.query_params
+        for param, lookup, convert in self.RANGE_FILTERS:
+            if params.get(param):
+                try:
+                    value = convert(params[param])
+                except (ValueError, InvalidOperation):
+                    raise ValidationError(
+                        {param: ['A valid number is required.']}
+                    )
+                queryset = queryset.filter(**{lookup: value})
+        ordering = params.get('ordering', self.DEFAULT_ORDERING)
+        if ordering not in self.ORDERINGS:
+            raise ValidationError({'ordering': [
+                'Ordering must be one of %s.' % ', '.join(self.ORDERINGS)
+            ]})
+
+        queryset = queryset.filter(user=self.request.user) \
+            .order_by(*self.ORDERINGS[ordering])
+        if self.action in ('list', 'retrieve', 'batch', 'clone',
+                           'bulk_clone', 'similar'):
+            queryset = self._adapt_to_fields(queryset)
+        return queryset
+
+    def _adapt_to_fields(self, queryset):
+        '''Load only the columns and relations the response renders'''
+        fields = serializers.parse_field_list(self.request, 'fields') \
+            or set(self.get_serializer_class().Meta.fields)
+        # The ordering column positions pagination cursors
+        fields |= {name.lstrip('-') for name in queryset.query.order_by}
+        columns = [name for name in self.RECIPE_COLUMNS if name in fields]
+        if 'image_meta' in fields:
+            columns += images.METADATA_FIELDS
+        related = [name for name in ('tags', 'ingredients') if name in fields]
+        return queryset.only('id', *columns).prefetch_related(*related)
 
     def get_serializer_class(self):
         '''Return the the serializer appropriate for the request'''
-        if self.action == 'retrieve':
+        if self.action in ('retrieve', 'batch'):
             return serializers.RecipeDetailSerializer
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
@@ -79,7 +224,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
     @action(methods=['POST'], detail=True,
-            url_path='upload-image', url_name='upload_image')
+            url_path='upload-image', url_name='upload_image',
+            throttle_scope='uploads')
     def upload_image(self, request, pk=None):
         '''Handle image upload to a recipe'''
         recipe = self.get_object()
@@ -97,3 +243,205 @@ class RecipeViewSet(viewsets.ModelViewSet):
             serializer.errors,
             status=status.HTTP_400_BAD_REQUEST
         )
+
+    def _parse_ids(self, ids):
+        '''Return a list of unique recipe IDs, or a 400 error response'''
+        try:
+            if isinstance(ids, str):
+                ids = self._params_to_int(ids) if ids else []
+            elif not isinstance(ids, list) or not all(
+                    isinstance(recipe_id, int)
+                    and not isinstance(recipe_id, bool)
+                    for recipe_id in ids):
+                raise TypeError
+        except (TypeError, ValueError):
+            return None, Response(
+                {'ids': ['A list of integer IDs is required.']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        ids = list(dict.fromkeys(ids))
+        if len(ids) > settings.RECIPE_BATCH_MAX_IDS:
+            return None, Response(
+                {'ids': ['At most %d IDs are allowed.'
+                         % settings.RECIPE_BATCH_MAX_IDS]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return ids, None
+
+    def _request_ids(self, request):
+        '''Return the recipe IDs of a request, or a 400 error response
+
+        POST bodies carry an ``ids`` list, GET requests ``?ids=1,2,3``.
+        '''
+        if request.method != 'POST':
+            return self._parse_ids(request.query_params.get('ids', ''))
+        if not isinstance(request.data, dict):
+            return None, Response(
+                {api_settings.NON_FIELD_ERRORS_KEY: [
+                    'Expected an object with an ids list.'
+                ]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return self._parse_ids(request.data.get('ids'))
+
+    @action(methods=['GET', 'POST'], detail=False,
+            url_path='batch', url_name='batch')
+    def batch(self, request):
+        '''Retrieve the details of several recipes in request order
+
+        The IDs are passed as ``?ids=1,2,3`` or, for long lists, as an
+        ``ids`` list in a POST body. IDs that do not exist or belong to
+        another user are reported as missing.
+        '''
+        ids, error = self._request_ids(request)
+        if error is not None:
+            return error
+
+        recipes = {
+            recipe.id: recipe
+            for recipe in self.get_queryset().filter(id__in=ids)
+        }
+        found = [recipes[recipe_id] for recipe_id in ids
+                 if recipe_id in recipes]
+        serializer = self.get_serializer(found, many=True)
+        return Response({
+            'results': serializer.data,
+            'missing': [recipe_id for recipe_id in ids
+                        if recipe_id not in recipes]
+        })
+
+    def _cloned(self, mapping):
+        '''Return the clones of a clone_recipes mapping in source order'''
+        clones = self.get_queryset().filter(id__in=mapping.values())
+        clones = {recipe.id: recipe for recipe in clones}
+        return [clones[new_id] for new_id in mapping.values()]
+
+    @action(methods=['POST'], detail=True,
+            url_path='clone', url_name='clone')
+    def clone(self, request, pk=None):
+        '''Copy a recipe with its tags and ingredients
+
+        The copy shares the image of the original. An optional ``title``
+        replaces the title of the copy.
+        '''
+        recipe = self.get_object()
+        title = request.data.get('title')
+        if title is not None and (
+                not isinstance(title, str) or not title.strip()
+                or len(title) > Recipe._meta.get_field('title').max_length):
+            return Response(
+                {'title': ['A valid title is required.']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        mapping = clone_recipes(request.user, [recipe.pk], title)
+        serializer = self.get_serializer(self._cloned(mapping)[0])
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(methods=['POST'], detail=False,
+            url_path='clone', url_name='bulk_clone')
+    def bulk_clone(self, request):
+        '''Copy several recipes given as an ``ids`` list
+
+        IDs that do not exist or belong to another user are reported as
+        missing, the copies are returned in request order.
+        '''
+        ids, error = self._request_ids(request)
+        if error is not None:
+            return error
+        mapping = clone_recipes(request.user, ids)
+        serializer = self.get_serializer(self._cloned(mapping), many=True)
+        return Response({
+            'results': serializer.data,
+            'missing': [recipe_id for recipe_id in ids
+                        if recipe_id not in mapping]
+        }, status=status.HTTP_201_CREATED)
+
+    @action(methods=['GET'], detail=True,
+            url_path='similar', url_name='similar')
+    def similar(self, request, pk=None):
+        '''List the recipes sharing the most tags and ingredients
+
+        Similarity is the Jaccard index of the tag and ingredient sets,
+        estimated from MinHash signatures. ``?limit=`` caps the results.
+        '''
+        recipe = self.get_object()
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return Response(
+                {'limit': ['A valid integer is required.']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = max(1, min(limit, settings.SIMILARITY_MAX_RESULTS))
+        scores = similarity.similar(recipe, limit)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _ in scores]
+        )
+        results = []
+        for recipe_id, score in scores:
+            if recipe_id in recipes:
+                data = self.get_serializer(recipes[recipe_id]).data
+                results.append(dict(data, similarity=round(score, 3)))
+        return Response(results)
+
+    def _shopping_list(self, ids):
+        '''Return the merged ingredients and totals of recipes
+
+        A single query joins the recipes to their ingredients. Totals are
+        per recipe and counts per ingredient, so the rows are grouped here
+        rather than by two GROUP BY queries.
+        '''
+        rows = self.queryset.filter(user=self.request.user, id__in=ids) \
+            .values_list('id', 'price', 'time_minutes',
+                         'ingredients__id', 'ingredients__name')
+        found = {}
+        counts = {}
+        for pk, price, minutes, ingredient_id, name in rows:
+            found[pk] = (price, minutes)
+            if ingredient_id is not None:
+                key = (name, ingredient_id)
+                counts[key] = counts.get(key, 0) + 1
+        total_price = sum((price for price, _ in found.values()),
+                          Decimal('0'))
+        return {
+            'ingredients': [
+                {'id': ingredient_id, 'name': name, 'count': count}
+                for (name, ingredient_id), count in sorted(counts.items())
+            ],
+            'total_price': str(total_price.quantize(Decimal('0.01'))),
+            'total_time_minutes': sum(
+                minutes for _, minutes in found.values()
+            ),
+            'recipes': sorted(found),
+        }
+
+    @action(methods=['GET', 'POST'], detail=False,
+            url_path='shopping-list', url_name='shopping_list')
+    def shopping_list(self, request):
+        '''Merge the ingredients of several recipes into a shopping list
+
+        Every ingredient is listed once, with the number of recipes using
+        it, next to the total price and time of the recipes. The IDs are
+        passed like for the batch action. Lists are cached until the data
+        of the user changes.
+        '''
+        ids, error = self._request_ids(request)
+        if error is not None:
+            return error
+        digest = hashlib.sha256(
+            ','.join(map(str, sorted(ids))).encode()
+        ).hexdigest()
+        key = 'shopping-list:%s:%s:%s' % (
+            request.user.pk, data_version(request.user.pk), digest
+        )
+        data = cache.get(key)
+        if data is None:
+            data = self._shopping_list(ids)
+            cache.set(key, data, settings.SHOPPING_LIST_CACHE_TTL)
+        # The entry is shared by every order of the same IDs
+        found = set(data['recipes'])
+        return Response(dict(
+            data,
+            recipes=[pk for pk in ids if pk in found],
+            missing=[pk for pk in ids if pk not in found],
+        ))
@@ -5,6 +5,9 @@ from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from core import jobs
+from core.models import Job
+
 
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
@@ -156,3 +159,25 @@ class PrivateUserApiTest(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(self.user.name, payload['name'])
         self.user.check_password(payload['password'])
+
+    def test_delete_user(self):
+        '''Test that deleting the user deactivates it and queues a purge'''
+        res = self.client.delete(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        job = Job.objects.get(pk=res.data['job'])
+        self.assertEqual(job.name, 'purge_user')
+
+        jobs.run_pending()
+
+        self.assertFalse(
+            get_user_model().objects.filter(pk=self.user.pk).exists()
+        )
+
+        # The status URL works without the token of the deleted user
+        status_res = APIClient().get(res['Location'])
+        self.assertEqual(status_res.status_code, status.HTTP_200_OK)
+        self.assertEqual(status_res.data['id'], job.pk)
+        self.assertEqual(status_res.data['status'], Job.SUCCEEDED)
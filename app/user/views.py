@@ -1,22 +1,32 @@
-from rest_framework import generics, authentication, permissions
+from django.db import transaction
+from django.urls import reverse
+from rest_framework import generics, authentication, permissions, status
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
 
+from core import jobs
+from core.idempotency import IdempotencyMixin
+from core.throttling import RateLimitHeadersMixin
 from .serializers import UserSerializer, AuthTokenSerializer
 
 
-class CreateUserView(generics.CreateAPIView):
+class CreateUserView(IdempotencyMixin, RateLimitHeadersMixin,
+                     generics.CreateAPIView):
     '''Create a new user in the system'''
     serializer_class = UserSerializer
 
 
-class CreateTokenView(ObtainAuthToken):
+class CreateTokenView(RateLimitHeadersMixin, ObtainAuthToken):
     '''Create a new auth token for user'''
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    throttle_scope = 'token'
 
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+class ManageUserView(RateLimitHeadersMixin,
+                     generics.RetrieveUpdateDestroyAPIView):
     '''Manage authenticated user'''
     serializer_class = UserSerializer
     authentication_classes = (authentication.TokenAuthentication,)
@@ -25,3 +35,18 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
     def get_object(self):
         '''Retrieve and return authenticated user'''
         return self.request.user
+
+    def destroy(self, request, *args, **kwargs):
+        '''Deactivate the user and purge its data in a background job'''
+        user = self.get_object()
+        with transaction.atomic():
+            user.is_active = False
+            user.save(update_fields=['is_active'])
+            job = jobs.enqueue(
+                'purge_user', {'user_id': user.pk}, user=user,
+                idempotency_key=f'purge_user:{user.pk}'
+            )
+        # The token of the user stops working, the status URL does not
+        location = reverse('job:job-status', args=[jobs.status_token(job)])
+        return Response({'job': job.pk}, status=status.HTTP_202_ACCEPTED,
+                        headers={'Location': location})